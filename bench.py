@@ -0,0 +1,201 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from main import (LineSimulation, Carrier, RecipeTemplate, WorkOrderStream, EventLog, LogMode, SimulationStats, RECIPE_TEMPLATES,
+                  bathData, manipData, recipe_template1, recipe_template2, recipe_template3, recipe_template4)
+"""
+Benchmark of the line simulator on fixed, reproducible scenarios.
+Every scenario is simulated with both the stepping and the event driven engine, reporting
+simulated seconds per wall second, peak traced memory and the time split between the simulation phases.
+Results are stored as JSON, so runs made on different commits can be compared (see compare_results).
+
+The greedy dispatcher can deadlock once the line entry is saturated, therefore the large scenarios
+release carriers at a fixed interval (streamed work orders) which lets every carrier leave the line.
+"""
+
+"""
+Scenario definitions, each builder returns (bath_data, manip_data, work_order) for a fresh LineSimulation.
+"""
+def example_scenario():
+    # the 5-carrier work order of main.py
+    order = [recipe_template1, recipe_template4, recipe_template2, recipe_template3, recipe_template1]
+    return bathData, manipData, [Carrier(template.create_instance()) for template in order]
+
+
+def mixed_order_scenario(carriers=1000, release_interval=150, seed=0):
+    # the 24 bath line processing a long work order of randomly mixed recipes
+    rnd = random.Random(seed)
+    names = sorted(RECIPE_TEMPLATES)
+    records = [(rnd.choice(names), index * release_interval) for index in range(carriers)]
+    return bathData, manipData, WorkOrderStream(records, RECIPE_TEMPLATES)
+
+
+def synthetic_line(bath_count=60, manip_count=12, recipe_count=6, seed=0):
+    """
+    Generates a long line split into evenly sized manipulator zones, neighbouring zones share two baths.
+    Recipes pass every zone, optionally bathing in the zone's own baths, and hand the carrier over in one of the shared baths.
+    :return: bath_data, manip_data and dictionary of recipe name -> RecipeTemplate
+    """
+    rnd = random.Random(seed)
+    bath_data = [("Entry", 0, False)]
+    bath_data += [(f"Synthetic bath {index}", index * 2500, True) for index in range(1, bath_count - 1)]
+    bath_data.append(("Exit", (bath_count - 1) * 2500, False))
+
+    zone = (bath_count + manip_count - 2) // manip_count
+    manip_data = []
+    for k in range(manip_count):
+        low = max(0, k * zone - 1)
+        high = bath_count - 1 if k == manip_count - 1 else (k + 1) * zone
+        manip_data.append((list(range(low, high + 1)), 0 if k == 0 else low + 1))
+
+    templates = {}
+    for index in range(recipe_count):
+        steps = [(0, 0)]
+        for k, (reach, _) in enumerate(manip_data):
+            if rnd.random() < 0.5:
+                steps.append((rnd.randint(k * zone + 1, (k + 1) * zone - 2), rnd.randint(5, 60)))
+            if k < manip_count - 1:
+                steps.append((rnd.choice(reach[-2:]), rnd.randint(1, 20)))
+        steps.append((bath_count - 1, 0))
+        templates[f"Synthetic{index}"] = RecipeTemplate(f"Synthetic{index}", steps)
+    return bath_data, manip_data, templates
+
+
+def synthetic_scenario(carriers=200, release_interval=300, seed=0):
+    # a generated 60 bath line serviced by 12 manipulators
+    bath_data, manip_data, templates = synthetic_line(seed=seed)
+    rnd = random.Random(seed)
+    names = sorted(templates)
+    records = [(rnd.choice(names), index * release_interval) for index in range(carriers)]
+    return bath_data, manip_data, WorkOrderStream(records, templates)
+
+
+SCENARIOS = {
+    "example_5": example_scenario,
+    "mixed_24x1000": mixed_order_scenario,
+    "synthetic_60x12": synthetic_scenario,
+}
+
+
+"""
+Measurement
+"""
+PHASES = ("move_manipulators", "check_baths", "skip_idle_steps")
+
+
+def build_line(scenario, event_driven, stats=None):
+    bath_data, manip_data, work_order = SCENARIOS[scenario]()
+    return LineSimulation(bath_data, manip_data, work_order, event_driven=event_driven, log=EventLog(LogMode.SILENT),
+                          stats=stats)
+
+
+def run_benchmark(scenario, event_driven, repeat=1):
+    """
+    Simulates a scenario, keeping the fastest of the repeated runs.
+    The phase split (see SimulationStats) and the peak memory (including the construction of the line) are measured
+    in separate runs, so neither the profiling wrappers nor tracemalloc slow down the timed runs.
+    :return: result dictionary of the scenario/engine pair
+    """
+    best = None
+    for _ in range(repeat):
+        line = build_line(scenario, event_driven)
+        start = time.perf_counter()
+        line.run()
+        wall_time = time.perf_counter() - start
+        if best is None or wall_time < best["wall_time"]:
+            best = {
+                "scenario": scenario,
+                "engine": "event" if event_driven else "step",
+                "simulated_seconds": line.step_counter,
+                "finished_carriers": line.finished_count,
+                "completed": line.is_work_order_processed and line.finished_count >= line.carriers_to_move,
+                "wall_time": wall_time,
+                "sim_seconds_per_wall_second": line.step_counter / wall_time,
+            }
+
+    stats = SimulationStats()
+    build_line(scenario, event_driven, stats).run()
+    profiled_time = stats.times["step"] + stats.times["skip_idle_steps"]
+    best["phase_shares"] = {phase: stats.times[phase] / profiled_time for phase in PHASES}
+    best["profile"] = stats.as_dict()
+
+    tracemalloc.start()
+    line = build_line(scenario, event_driven)
+    line.run()
+    best["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scenarios=None, repeat=1):
+    """
+    :param scenarios: names of the scenarios to run, all of them by default
+    :param repeat: number of timed runs per scenario and engine
+    :return: JSON serializable report
+    """
+    results = []
+    for scenario in scenarios or SCENARIOS:
+        for event_driven in (False, True):
+            result = run_benchmark(scenario, event_driven, repeat)
+            print_result(result)
+            results.append(result)
+    return {
+        "commit": current_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def print_result(result):
+    shares = ", ".join(f"{phase} {share:.0%}" for phase, share in result["phase_shares"].items())
+    status = "done" if result["completed"] else "overflow"
+    print(f"{result['scenario']:<16} {result['engine']:<5} {status:<8} {result['simulated_seconds']:>8}s simulated in "
+          f"{result['wall_time']:7.3f}s ({result['sim_seconds_per_wall_second']:>10.0f} sim s/s), "
+          f"peak {result['peak_memory_bytes'] / 1024:8.1f} KiB | {shares}")
+
+
+def compare_results(baseline, report):
+    """
+    Prints the throughput and memory ratios of the report against a baseline report (e.g. made on another commit).
+    """
+    reference = {(result["scenario"], result["engine"]): result for result in baseline["results"]}
+    print(f"Compared to {baseline.get('commit')}:")
+    for result in report["results"]:
+        old = reference.get((result["scenario"], result["engine"]))
+        if old is None:
+            continue
+        speedup = result["sim_seconds_per_wall_second"] / old["sim_seconds_per_wall_second"]
+        memory = result["peak_memory_bytes"] / old["peak_memory_bytes"]
+        note = "" if result["simulated_seconds"] == old["simulated_seconds"] else " (simulated time differs!)"
+        print(f"{result['scenario']:<16} {result['engine']:<5} speed x{speedup:.2f}, memory x{memory:.2f}{note}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark of the line simulator")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run (repeatable), all by default")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per scenario and engine, the fastest one is kept")
+    parser.add_argument("--output", default="bench_results.json", help="path of the JSON report")
+    parser.add_argument("--compare", help="JSON report of a previous run to compare against")
+    args = parser.parse_args()
+
+    report = run_suite(args.scenario, args.repeat)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare_results(json.load(file), report)
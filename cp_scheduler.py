@@ -0,0 +1,459 @@
+import math
+
+from ortools.sat.python import cp_model
+
+from main import LineSimulation, Carrier, WorkOrderStream, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+from cyclic_schedule import LineTiming, TimetableDispatcher, move_duration, timing_parameters, timing_constants
+"""
+CP-SAT scheduler of a whole work order, the production version of the prototype in experimental/ORtools.py.
+Every move of every carrier (see cyclic_schedule.py for the move durations) is an interval on the manipulator performing it,
+every submersion an interval on its bath, AddNoOverlap keeps each manipulator and each bath busy with one carrier at a time.
+Moves which can be performed by several manipulators (baths shared by neighbouring zones) get an optional interval per
+manipulator, exactly one of them is present.
+
+Manipulators only start moving when they are tasked, so a move interval also contains the approach of the manipulator
+from the farthest bath it may have been left at. This keeps the schedule executable by the simulator (see validate),
+but it is exact only for manipulators serving a single kind of move, otherwise the optimum is with respect to the
+conservative approach times and the greedy simulation can be faster.
+Neighbouring manipulators meet in the baths they share: the simulator holds a manipulator moving past a neighbour which
+lifts, drips or lowers a carrier there (see Manipulator.update_movement). The last part of every travel past a shared bath
+and the work of the neighbour in that bath are intervals of a common AddNoOverlap, so the schedule is replayed without
+holds and the simulated cycle time ends 2 steps after the makespan (the end of the last move).
+
+The search is warm started from the greedy simulation of the same work order.
+The model grows with the square of the number of carriers sharing a bath, long work orders are scheduled with a rolling
+horizon instead (see CPScheduler.solve_rolling): a window of carriers is optimized at a time, the moves of its first
+carriers are committed and enter the following windows as fixed intervals.
+Requires ortools, which is (unlike the rest of the simulation) not a part of the standard library.
+"""
+
+
+class MoveRecorder(EventLog):
+    """
+    Silent log remembering the start (load/lift start) and the manipulator of every move of a run.
+    """
+    def __init__(self):
+        super().__init__(LogMode.SILENT)
+        self.moves = {} # (carrier id, move index) -> (step, manipulator id)
+
+    def record(self, time, manipulator_id, carrier, event):
+        if event == "load":
+            self.moves[(carrier.carUUID, 0)] = (time, manipulator_id)
+        elif event == "lift_start":
+            self.moves[(carrier.carUUID, carrier.currentStepIndex)] = (time, manipulator_id)
+
+
+class CPSchedule:
+    def __init__(self, templates, starts, hoists, makespan, status, bound, parameters):
+        self.templates = templates # RecipeTemplate of every carrier, in the order of entering the line
+        self.starts = starts # per carrier, start of every move
+        self.hoists = hoists # per carrier, id of the manipulator performing every move
+        self.makespan = makespan # end of the last move
+        self.status = status # CP-SAT status name, OPTIMAL or FEASIBLE
+        self.bound = bound # lower bound of the makespan proven by the solver, None for rolling horizon schedules
+        self.parameters = parameters # timing constants, see timing_parameters
+        self.greedy_cycle_time = None # cycle time of the greedy simulation used as the warm start
+        self.wall_time = None # solver time in seconds
+        self.windows = 1 # number of solved models, see CPScheduler.solve_rolling
+
+    def __repr__(self):
+        bound = "-" if self.bound is None else f"{self.bound}s"
+        greedy = "-" if self.greedy_cycle_time is None else f"{self.greedy_cycle_time}s"
+        return (f"CPSchedule(carriers={len(self.templates)}, makespan={self.makespan}s, bound={bound}, "
+                f"status={self.status}, windows={self.windows}, greedy={greedy})")
+
+    @property
+    def gap(self):
+        """
+        :return: relative distance of the makespan from the proven lower bound, None without a bound
+        """
+        if self.bound is None:
+            return None
+        return (self.makespan - self.bound) / self.makespan if self.makespan else 0
+
+    def release_times(self, manip_data=manipData, bath_data=bathData):
+        """
+        :return: step in which every carrier should enter the line, so its loading manipulator can be tasked on time
+        """
+        timing = LineTiming(bath_data, manip_data, self.parameters)
+        last_drop = {index + 1: position for index, (_, position) in enumerate(manip_data)}
+        moves = sorted((start, carrier, move) for carrier, starts in enumerate(self.starts) for move, start in enumerate(starts))
+        releases = []
+        for start, carrier, move in moves:
+            hoist = self.hoists[carrier][move]
+            if move == 0:
+                lead = timing.latency(hoist, last_drop[hoist], 0)
+                releases.append(max(start - lead, releases[-1] if releases else 0))
+            last_drop[hoist] = self.templates[carrier].bath_ids[move + 1]
+        return releases
+
+    def validate(self, bath_data=bathData, manip_data=manipData, rail_planner=None):
+        """
+        Replays the schedule in the simulator (see ScheduleDispatcher).
+        :param rail_planner: RailPlanner of the simulated line, dense schedules of long work orders can lock up the step
+            by step collision handling of neighbouring manipulators
+        :return: dictionary with the simulated cycle time (makespan + 2 steps without delays), the largest delay of a move
+            behind the schedule and the completion status
+        """
+        with timing_constants(self.parameters):
+            templates = {template.name: template for template in self.templates}
+            records = [(template.name, time) for template, time in zip(self.templates, self.release_times(manip_data, bath_data))]
+            dispatcher = ScheduleDispatcher(self, bath_data, manip_data)
+            line = LineSimulation(bath_data, manip_data, WorkOrderStream(records, templates), event_driven=True,
+                                  log=EventLog(LogMode.SILENT), dispatcher=dispatcher, rail_planner=rail_planner)
+            line.run()
+        return {
+            "completed": line.finished_count >= line.carriers_to_move,
+            "cycle_time": line.step_counter,
+            "max_delay": dispatcher.max_delay,
+        }
+
+
+class ScheduleDispatcher(TimetableDispatcher):
+    """
+    Timetable of a CPSchedule.
+    """
+    def __init__(self, schedule, bath_data=bathData, manip_data=manipData, first_carrier_id=None):
+        super().__init__(schedule.parameters, bath_data, manip_data, first_carrier_id, schedule.starts, schedule.hoists)
+        self.schedule = schedule
+
+
+class CPScheduler:
+    """
+    Builds and solves the CP-SAT model of a work order, see solve.
+    """
+    def __init__(self, bath_data, manip_data, templates, lift_time=None, speed=None, drip_time=None, acceleration_time=None):
+        """
+        :param bath_data: list of (name, distance in mm, submergable flag) tuples, see bathData
+        :param manip_data: list of (operating range, starting position) tuples, see manipData
+        :param templates: RecipeTemplate of every carrier, in the order of entering the line
+        :param lift_time: defaults to Manipulator.LIFT_TIME, similarly for the other timing constants
+        """
+        self.bath_data = bath_data
+        self.manip_data = manip_data
+        self.templates = list(templates)
+        self.parameters = timing_parameters(lift_time, speed, drip_time, acceleration_time)
+        self.timing = LineTiming(bath_data, manip_data, self.parameters)
+
+        self.capable = {} # (from bath, to bath) -> ids of manipulators reaching both baths
+        for template in self.templates:
+            bath_ids = template.bath_ids
+            for k in range(len(bath_ids) - 1):
+                pair = bath_ids[k], bath_ids[k + 1]
+                if pair not in self.capable:
+                    self.capable[pair] = [index + 1 for index, reach in enumerate(self.timing.ranges) if pair[0] in reach and pair[1] in reach]
+                    if not self.capable[pair]:
+                        raise ValueError(f"No manipulator moves recipe {template.name} from bath {pair[0]} to bath {pair[1]}")
+
+        # every manipulator approaches a pick up from the farthest bath it may have been left at
+        drops = {index + 1: {position} for index, (_, position) in enumerate(manip_data)}
+        for (_, to_bath), hoists in self.capable.items():
+            for hoist in hoists:
+                drops[hoist].add(to_bath)
+        self.approach = {(hoist, from_bath): max(self.timing.latency(hoist, drop, from_bath) for drop in drops[hoist])
+                         for (from_bath, _), hoists in self.capable.items() for hoist in hoists}
+        # baths shared by every manipulator and its right neighbour, see rail_phases
+        self.shared = {index + 1: self.timing.ranges[index] & self.timing.ranges[index + 1] for index in range(len(manip_data) - 1)}
+
+    def rail_phases(self, hoist, from_bath, to_bath, loading):
+        """
+        Parts of a move its neighbours have to respect. The simulator holds a manipulator moving past a neighbour which
+        lifts, drips or lowers a carrier (see Manipulator.update_movement), within the baths shared by the two.
+        :return: list of ((left manipulator of the pair, shared bath, direction), offset from the move start, length):
+            phases with the same key must not overlap, they are the last part of a travel of one manipulator of the pair
+            past the shared bath in the direction of the other one, and the work of the other one in that bath
+        """
+        lift = self.timing.lift_time
+        work = 0 if loading else lift + max(self.parameters["drip_time"], 1)
+        arrival = work + self.timing.latency(hoist, from_bath, to_bath)
+        phases = []
+        for left, towards, away in ((hoist, "right", "left"), (hoist - 1, "left", "right")):
+            for bath_id in self.shared.get(left, ()):
+                # a step of margin on both sides of the work, the neighbours are moved in line order within a step
+                if bath_id == from_bath and work:
+                    phases.append(((left, bath_id, away), -1, work + 2))
+                if bath_id == to_bath:
+                    phases.append(((left, bath_id, away), arrival - 1, lift + 2))
+                passed = (lambda target: bath_id <= target) if towards == "right" else (lambda target: bath_id >= target)
+                # the approach comes from either side, the transfer only towards the neighbour
+                if from_bath in self.shared[left] and passed(from_bath):
+                    tail = self.timing.travel(hoist, bath_id, from_bath) + 1
+                    phases.append(((left, bath_id, towards), -tail, tail))
+                if to_bath in self.shared[left] and passed(to_bath) and (to_bath > from_bath) == (towards == "right"):
+                    tail = self.timing.travel(hoist, bath_id, to_bath) + 1
+                    phases.append(((left, bath_id, towards), arrival - tail, tail))
+        return phases
+
+    def move_end(self, carrier, move, start, hoist):
+        """
+        :return: step in which the manipulator gets idle after the given move of the carrier (index into templates)
+        """
+        bath_ids = self.templates[carrier].bath_ids
+        return start + move_duration(self.timing, hoist, bath_ids[move], bath_ids[move + 1], self.parameters["drip_time"],
+                                     loading=move == 0)
+
+    def cutoff(self, entry):
+        """
+        :param entry: loading start of the last committed carrier
+        :return: earliest begin of a move or bath interval of any carrier loaded later
+        """
+        return entry + 2 - max(self.approach.values())
+
+    def greedy_run(self):
+        """
+        Simulates the work order with the greedy dispatching.
+        :return: (cycle time or None if the line got stuck, (carrier index, move) -> (start, manipulator id))
+        """
+        with timing_constants(self.parameters):
+            first_id = Carrier.next_id
+            recorder = MoveRecorder()
+            line = LineSimulation(self.bath_data, self.manip_data, [Carrier(template.create_instance()) for template in self.templates],
+                                  event_driven=True, log=recorder)
+            line.run()
+        cycle_time = line.step_counter if line.finished_count >= line.carriers_to_move else None
+        return cycle_time, {(carrier_id - first_id, move): value for (carrier_id, move), value in recorder.moves.items()}
+
+    def horizon(self, carriers=None):
+        """
+        :param carriers: indexes of the carriers to schedule, all by default
+        :return: end of a schedule moving the carriers through the line one at a time
+        """
+        total = 0
+        for template in (self.templates if carriers is None else [self.templates[f] for f in carriers]):
+            bath_ids = template.bath_ids
+            for k in range(len(bath_ids) - 1):
+                hoist = self.capable[(bath_ids[k], bath_ids[k + 1])][0]
+                total += self.approach[(hoist, bath_ids[k])] + max(math.ceil(template.submersion_times[k + 1]), 1)
+                total += move_duration(self.timing, hoist, bath_ids[k], bath_ids[k + 1], self.parameters["drip_time"], loading=k == 0)
+        return total
+
+    def build(self, horizon, carriers=None, frozen=None, compact=False):
+        """
+        :param horizon: latest possible end of the schedule
+        :param carriers: indexes of the carriers to schedule (consecutive), all by default
+        :param frozen: committed carriers entering before the scheduled ones, carrier index -> (starts, manipulator ids)
+        :param compact: minimize the completion times of the single carriers next to the makespan, so no carrier is
+            left behind within the makespan (for the windows of solve_rolling)
+        :return: (model, start variables per carrier, manipulator literals per carrier and move, makespan variable)
+        """
+        model = cp_model.CpModel()
+        lift = self.timing.lift_time
+        hoist_intervals = {index + 1: [] for index in range(len(self.manip_data))}
+        rail_intervals = {}
+        bath_intervals = {}
+        starts, literals, completions = [], [], []
+        makespan = model.NewIntVar(0, horizon, "makespan")
+
+        entry = None
+        if frozen:
+            # committed moves are fixed intervals, the ones over before any scheduled move may begin are left out
+            entry = frozen[max(frozen)][0][0]
+            cutoff = self.cutoff(entry)
+            for f, (fixed_starts, fixed_hoists) in frozen.items():
+                bath_ids = self.templates[f].bath_ids
+                ends = [self.move_end(f, k, start, hoist) for k, (start, hoist) in enumerate(zip(fixed_starts, fixed_hoists))]
+                for k, (start, hoist) in enumerate(zip(fixed_starts, fixed_hoists)):
+                    begin = start - self.approach[(hoist, bath_ids[k])]
+                    if ends[k] > cutoff:
+                        hoist_intervals[hoist].append(model.NewFixedSizeIntervalVar(begin, ends[k] - begin, f"frozen_f{f}_m{k}"))
+                        for key, offset, length in self.rail_phases(hoist, bath_ids[k], bath_ids[k + 1], k == 0):
+                            rail_intervals.setdefault(key, []).append(model.NewFixedSizeIntervalVar(
+                                start + offset, length, f"frozen_f{f}_m{k}_r{len(rail_intervals[key])}"))
+                    if k > 0 and start + lift + 1 > cutoff:
+                        begin = ends[k - 1] - lift
+                        bath_intervals.setdefault(bath_ids[k], []).append(
+                            model.NewFixedSizeIntervalVar(begin, start + lift + 1 - begin, f"frozen_f{f}_s{k}"))
+
+        for f in (range(len(self.templates)) if carriers is None else carriers):
+            template = self.templates[f]
+            bath_ids = template.bath_ids
+            # steps of a second, fractions are rounded up like LineSimulation.ticks does
+            submersion_times = [math.ceil(time) for time in template.submersion_times]
+            carrier_starts, carrier_literals, ends, approaches = [], [], [], []
+            for k in range(len(bath_ids) - 1):
+                start = model.NewIntVar(0, horizon, f"start_f{f}_m{k}")
+                hoists = self.capable[(bath_ids[k], bath_ids[k + 1])]
+                options = {hoist: model.NewBoolVar(f"hoist_f{f}_m{k}_h{hoist}") for hoist in hoists}
+                model.AddExactlyOne(options.values())
+                durations = {hoist: move_duration(self.timing, hoist, bath_ids[k], bath_ids[k + 1], self.parameters["drip_time"],
+                                                  loading=k == 0) for hoist in hoists}
+                duration, approach = 0, 0
+                for hoist, literal in options.items():
+                    ahead = self.approach[(hoist, bath_ids[k])]
+                    hoist_intervals[hoist].append(model.NewOptionalFixedSizeIntervalVar(
+                        start - ahead, ahead + durations[hoist], literal, f"move_f{f}_m{k}_h{hoist}"))
+                    for key, offset, length in self.rail_phases(hoist, bath_ids[k], bath_ids[k + 1], k == 0):
+                        rail_intervals.setdefault(key, []).append(model.NewOptionalFixedSizeIntervalVar(
+                            start + offset, length, literal, f"rail_f{f}_m{k}_h{hoist}_r{len(rail_intervals[key])}"))
+                    duration += durations[hoist] * literal
+                    approach += ahead * literal
+                end = model.NewIntVar(0, horizon, f"end_f{f}_m{k}")
+                model.Add(end == start + duration)
+                carrier_starts.append(start)
+                carrier_literals.append(options)
+                ends.append(end)
+                approaches.append(approach)
+
+            for k in range(1, len(bath_ids) - 1):
+                # the carrier is picked up once its submersion is done and the manipulator reached it
+                model.Add(carrier_starts[k] >= ends[k - 1] + max(submersion_times[k], 1) - 1 + approaches[k])
+                # the bath is occupied from lowering the carrier in until lifting it out
+                begin = ends[k - 1] - lift
+                size = model.NewIntVar(0, horizon, f"bath_f{f}_s{k}")
+                bath_intervals.setdefault(bath_ids[k], []).append(
+                    model.NewIntervalVar(begin, size, carrier_starts[k] + lift + 1, f"bath_f{f}_s{k}_b{bath_ids[k]}"))
+            # carriers enter the line in the order of the work order, one step after the previous one was loaded
+            if starts:
+                model.Add(carrier_starts[0] >= starts[-1][0] + 2)
+            elif entry is not None:
+                model.Add(carrier_starts[0] >= entry + 2)
+            else:
+                # the first carrier enters in the first step, its loading manipulator is tasked from its starting position
+                model.Add(carrier_starts[0] >= sum(self.timing.latency(hoist, self.manip_data[hoist - 1][1], 0) * literal
+                                                   for hoist, literal in carrier_literals[0].items()))
+            model.Add(makespan >= ends[-1])
+            starts.append(carrier_starts)
+            literals.append(carrier_literals)
+            completions.append(ends[-1])
+
+        for intervals in hoist_intervals.values():
+            model.AddNoOverlap(intervals)
+        for intervals in rail_intervals.values():
+            model.AddNoOverlap(intervals)
+        for intervals in bath_intervals.values():
+            model.AddNoOverlap(intervals)
+        if compact:
+            model.Minimize(makespan * len(completions) + sum(completions))
+        else:
+            model.Minimize(makespan)
+        return model, starts, literals, makespan
+
+    @staticmethod
+    def run_solver(model, time_limit, workers, log_search):
+        """
+        :return: (solver, status) after solving the model
+        """
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = time_limit
+        solver.parameters.num_workers = workers
+        solver.parameters.log_search_progress = log_search
+        return solver, solver.Solve(model)
+
+    @staticmethod
+    def add_hints(model, starts, literals, hints, carriers):
+        """
+        :param hints: (carrier index, move) -> (start, manipulator id), moves without a hint are left to the solver
+        :param carriers: carrier index of every scheduled carrier
+        """
+        for index, f in enumerate(carriers):
+            for k, options in enumerate(literals[index]):
+                if (f, k) in hints:
+                    start, hoist = hints[(f, k)]
+                    model.AddHint(starts[index][k], start)
+                    for option, literal in options.items():
+                        model.AddHint(literal, option == hoist)
+
+    @staticmethod
+    def solution(solver, starts, literals):
+        """
+        :return: (start of every move per carrier, manipulator id of every move per carrier)
+        """
+        values = [[solver.Value(start) for start in carrier] for carrier in starts]
+        hoists = [[next(hoist for hoist, literal in options.items() if solver.BooleanValue(literal)) for options in carrier]
+                  for carrier in literals]
+        return values, hoists
+
+    def solve(self, time_limit=60.0, workers=8, warm_start=True, log_search=False, hints=None):
+        """
+        :param time_limit: wall time limit of the search in seconds
+        :param workers: number of parallel search workers
+        :param warm_start: hint the solver with the greedy simulation of the work order
+        :param log_search: print the progress of the solver
+        :param hints: (carrier index, move) -> (start, manipulator id), e.g. taken from the schedule of a similar work order
+            (see schedule_cache.py), preferred to the greedy simulation
+        :return: CPSchedule, None if no schedule was found within the time limit
+        """
+        greedy_cycle_time, greedy_moves = self.greedy_run() if warm_start else (None, {})
+        model, starts, literals, makespan = self.build(self.horizon())
+        # a greedy run which got stuck still hints the moves made before
+        self.add_hints(model, starts, literals, {**greedy_moves, **(hints or {})}, range(len(self.templates)))
+        solver, status = self.run_solver(model, time_limit, workers, log_search)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return None
+
+        values, hoists = self.solution(solver, starts, literals)
+        schedule = CPSchedule(self.templates, values, hoists, solver.Value(makespan), solver.StatusName(status),
+                              int(solver.BestObjectiveBound()), self.parameters)
+        schedule.greedy_cycle_time = greedy_cycle_time
+        schedule.wall_time = solver.WallTime()
+        return schedule
+
+    def solve_rolling(self, window=20, overlap=5, time_limit=10.0, workers=8, warm_start=True, log_search=False, hints=None):
+        """
+        Rolling horizon scheduling of long work orders. Every window of consecutive carriers is solved as its own model,
+        the moves of its first window - overlap carriers are committed, the rest is scheduled again with the next window.
+        Committed moves are fixed intervals of the following models (manipulators and baths they keep busy),
+        so the stitched schedule is feasible, but not necessarily optimal.
+        :param window: number of carriers scheduled by one model
+        :param overlap: number of carriers of a window scheduled again in the next one
+        :param time_limit: wall time limit of every window in seconds
+        :param warm_start: hint the first window with the greedy simulation, every following window is hinted with the
+            greedy simulation and the overlap of the previous one
+        :param hints: initial hints preferred to the greedy simulation, see solve
+        :return: CPSchedule stitched from the committed carriers of all windows, None if a window found no schedule
+        """
+        if window < 1 or not 0 <= overlap < window:
+            raise ValueError("The window has to contain at least one carrier on top of the overlap")
+        greedy_cycle_time, greedy_moves = self.greedy_run() if warm_start else (None, {})
+        hints = {**greedy_moves, **(hints or {})}
+        count = len(self.templates)
+        starts, hoists, ends = [], [], [] # committed carriers, ends are the end of the last move
+        wall_time, windows = 0.0, 0
+
+        while len(starts) < count:
+            first = len(starts)
+            carriers = range(first, min(first + window, count))
+            committed = len(carriers) if carriers.stop == count else window - overlap
+            frozen = {}
+            if starts:
+                cutoff = self.cutoff(starts[-1][0])
+                frozen = {f: (starts[f], hoists[f]) for f in range(first) if ends[f] > cutoff}
+            horizon = max(ends, default=0) + self.horizon(carriers)
+            model, start_vars, literals, _ = self.build(horizon, carriers, frozen, compact=True)
+            self.add_hints(model, start_vars, literals, hints, carriers)
+            solver, status = self.run_solver(model, time_limit, workers, log_search)
+            if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                return None
+            wall_time += solver.WallTime()
+            windows += 1
+
+            values, chosen = self.solution(solver, start_vars, literals)
+            for index, f in enumerate(carriers):
+                hints.update({(f, k): (start, hoist) for k, (start, hoist) in enumerate(zip(values[index], chosen[index]))})
+            for index in range(committed):
+                f = first + index
+                starts.append(values[index])
+                hoists.append(chosen[index])
+                ends.append(self.move_end(f, len(values[index]) - 1, values[index][-1], chosen[index][-1]))
+
+        # the windows minimize the completion times next to the makespan, even optimal windows prove no bound
+        schedule = CPSchedule(self.templates, starts, hoists, max(ends, default=0), "FEASIBLE", None, self.parameters)
+        schedule.greedy_cycle_time = greedy_cycle_time
+        schedule.wall_time = wall_time
+        schedule.windows = windows
+        return schedule
+
+
+if __name__ == "__main__":
+    # Schedules a mixed order of 50 carriers, released into the line as planned by the solver
+    names = sorted(RECIPE_TEMPLATES)
+    templates = [RECIPE_TEMPLATES[names[index % len(names)]] for index in range(50)]
+    schedule = CPScheduler(bathData, manipData, templates).solve(time_limit=60)
+    print(schedule, f"gap {schedule.gap:.1%}, solved in {schedule.wall_time:.1f}s")
+    print("Simulated:", schedule.validate())
+
+    # A shift of 500 carriers, scheduled 20 carriers at a time
+    templates = [RECIPE_TEMPLATES[names[index % len(names)]] for index in range(500)]
+    schedule = CPScheduler(bathData, manipData, templates).solve_rolling(window=20, overlap=5, time_limit=5)
+    print(schedule, f"solved in {schedule.wall_time:.1f}s")
+    print("Simulated:", schedule.validate())
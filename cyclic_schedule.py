@@ -0,0 +1,388 @@
+import itertools
+import math
+from contextlib import contextmanager
+
+from main import (LineSimulation, Dispatcher, Manipulator, RecipeStep, RailMove, Carrier, WorkOrderStream, EventLog, LogMode,
+                  RECIPE_TEMPLATES, bathData, manipData)
+"""
+Steady state (cyclic) schedule of a line processing a long run of carriers following the same recipe.
+Instead of simulating thousands of carriers, the minimal period T (takt) of a 1-degree cyclic schedule is computed
+(the classic hoist scheduling problem): one carrier enters the line every T seconds and every manipulator repeats
+the same sequence of moves in each period.
+
+Move k transfers the carrier from step k to step k + 1 of the recipe. Its start s_k is the step in which the manipulator
+starts lifting the carrier (loading it from the line entry for k = 0), the durations follow the step by step mechanics
+of the simulator (lifting, dripping, rail move, lowering and the one step latencies between them).
+The period is minimized by a CP-SAT model: a start is written as s_k = q_k * T + r_k (r_k is the start within the period),
+the moves of every manipulator form a circuit (AddCircuit) through a depot node marking the start of the period,
+so the arcs fix the order of the moves within the period, the travel of the manipulator between them and the wrap
+around to the next period. The constraints are not monotone in T, the period is a variable of the model instead of
+being searched from outside. Requires ortools, the timing functions of the module don't.
+
+Manipulators are assumed not to obstruct each other (their rail moves are not part of the model), schedules should be
+checked by validate_schedule, which replays the schedule in the simulator.
+"""
+
+
+class CyclicSchedule:
+    def __init__(self, template, period, starts, hoists, sequences, parameters):
+        self.template = template # RecipeTemplate the schedule belongs to
+        self.period = period # takt in seconds
+        self.starts = starts # start of every move of the carrier entering at time 0
+        self.hoists = hoists # id of the manipulator performing every move
+        self.sequences = sequences # manipulator id -> moves in the order of execution within a period
+        self.parameters = parameters # lift_time, speed, acceleration_time and drip_time the schedule was computed with
+        self.entry_lead = 0 # steps between a carrier entering the line and the start of its loading
+        self.status = "OPTIMAL" # CP-SAT status name, FEASIBLE if the period isn't proven minimal within the time limit
+
+    def release_times(self, count):
+        """
+        :return: steps in which the carriers should enter the line, see WorkOrderStream
+        """
+        return [max(index * self.period + self.starts[0] - self.entry_lead, 0) for index in range(count)]
+
+    def __repr__(self):
+        return f"CyclicSchedule(recipe={self.template.name}, period={self.period}s, moves={len(self.starts)})"
+
+    def describe(self):
+        """
+        :return: text table of the moves, ordered by their start within the period
+        """
+        bath_ids = self.template.bath_ids
+        lines = [f"Recipe {self.template.name}, one carrier every {self.period}s"]
+        for k in sorted(range(len(self.starts)), key=lambda move: (self.starts[move] % self.period, move)):
+            offset, start = divmod(self.starts[k], self.period)
+            lines.append(f"{start:>6}s manip {self.hoists[k]} moves bath {bath_ids[k]} -> {bath_ids[k + 1]} "
+                         f"(carrier entered {offset} periods earlier)")
+        return "\n".join(lines)
+
+
+class LineTiming:
+    """
+    Durations of the simulator mechanics for the given line and timing constants, all in simulation steps.
+    """
+    def __init__(self, bath_data, manip_data, parameters):
+        """
+        :param parameters: timing constants, see timing_parameters
+        """
+        self.distances = [distance / 1000 for _, distance, _ in bath_data]
+        self.ranges = [set(reach) for reach, _ in manip_data]
+        self.lift_time = parameters["lift_time"]
+        self.speed = parameters["speed"]
+        self.acceleration_time = parameters["acceleration_time"]
+
+    def travel(self, hoist, from_bath, to_bath):
+        start, target = self.distances[from_bath], self.distances[to_bath]
+        ticks = RailMove(0, start, target, self.speed, self.acceleration_time).duration
+        if hoist == len(self.ranges) and target > start:
+            ticks += 1 # the last manipulator registers its arrival when moving right one step late (see update_movement)
+        return ticks
+
+    def latency(self, hoist, from_bath, to_bath):
+        """
+        :return: steps from a move_to call to the next action at the target, a move finishing within
+            the step of the move_to call is noticed only in the next step
+        """
+        return max(self.travel(hoist, from_bath, to_bath) - 1, 1)
+
+
+def timing_parameters(lift_time=None, speed=None, drip_time=None, acceleration_time=None):
+    """
+    :return: dictionary of the timing constants, the current class level values of the simulator are used for missing ones
+    """
+    return {
+        "lift_time": Manipulator.LIFT_TIME if lift_time is None else lift_time,
+        "speed": Manipulator.SPEED if speed is None else speed,
+        "acceleration_time": Manipulator.ACCELERATION_TIME if acceleration_time is None else acceleration_time,
+        "drip_time": RecipeStep.DRIP_TIME if drip_time is None else drip_time,
+    }
+
+
+def move_duration(timing, hoist, from_bath, to_bath, drip_time, loading=False):
+    """
+    :return: number of steps from the start of a move until its manipulator is idle again
+    """
+    transfer = timing.latency(hoist, from_bath, to_bath)
+    if loading:
+        return transfer + timing.lift_time # loading from the line entry, no lifting or dripping
+    return timing.lift_time + max(drip_time, 1) + transfer + timing.lift_time
+
+
+def move_durations(timing, bath_ids, drip_times, hoists):
+    """
+    :return: move_duration of every move of a recipe
+    """
+    return [move_duration(timing, hoist, bath_ids[k], bath_ids[k + 1], drip_times[k + 1], loading=k == 0)
+            for k, hoist in enumerate(hoists)]
+
+
+def solve_cyclic_schedule(bath_data, manip_data, template, lift_time=None, speed=None, drip_time=None, acceleration_time=None,
+                          time_limit=60.0, workers=8):
+    """
+    Computes the minimal takt of a 1-degree cyclic schedule.
+    Every move may be performed by any manipulator reaching both of its baths. A bath can hold a single carrier,
+    so all visits of a bath by one carrier have to fit into one period.
+    The model has a literal per pair of moves a manipulator can perform, recipes visiting every bath of the example line
+    (23 moves) are solved to optimality within seconds, the time limit caps longer recipes and lines with more shared baths.
+    :param bath_data: list of (name, distance in mm, submergable flag) tuples, see bathData
+    :param manip_data: list of (operating range, starting position) tuples, see manipData
+    :param template: RecipeTemplate processed by the line, starting at the line entry (bath 0)
+    :param lift_time: defaults to Manipulator.LIFT_TIME
+    :param speed: defaults to Manipulator.SPEED
+    :param drip_time: drip time of every step, defaults to RecipeStep.DRIP_TIME
+    :param acceleration_time: defaults to Manipulator.ACCELERATION_TIME
+    :param time_limit: wall time limit of the solver in seconds
+    :param workers: number of parallel search workers
+    :return: CyclicSchedule with the minimal period (status OPTIMAL), or the best one found within the time limit (FEASIBLE)
+    """
+    # only this solver needs ortools, the timing functions of the module are used by modules which don't
+    from ortools.sat.python import cp_model
+
+    parameters = timing_parameters(lift_time, speed, drip_time, acceleration_time)
+    timing = LineTiming(bath_data, manip_data, parameters)
+    bath_ids = list(template.bath_ids)
+    # the model counts whole steps of a second, fractions of a second are rounded up like LineSimulation.ticks does
+    submersion_times = [math.ceil(time) for time in template.submersion_times]
+    if bath_ids[0] != 0:
+        raise ValueError(f"Recipe {template.name} doesn't start at the line entry")
+    move_count = len(bath_ids) - 1
+    lift = timing.lift_time
+
+    capable = []
+    for k in range(move_count):
+        hoists = [index + 1 for index, reach in enumerate(timing.ranges) if bath_ids[k] in reach and bath_ids[k + 1] in reach]
+        if not hoists:
+            raise ValueError(f"No manipulator moves recipe {template.name} from bath {bath_ids[k]} to bath {bath_ids[k + 1]}")
+        capable.append(hoists)
+    durations = [{hoist: move_duration(timing, hoist, bath_ids[k], bath_ids[k + 1], parameters["drip_time"], loading=k == 0)
+                  for hoist in hoists} for k, hoists in enumerate(capable)]
+
+    # first and last visit of every bath, the line entry and exit are emptied by the loader and off loader
+    visits = {}
+    for step in range(1, move_count):
+        first, _ = visits.get(bath_ids[step], (step, step))
+        visits[bath_ids[step]] = (first, step)
+
+    lower = max(min(duration.values()) for duration in durations) + 1
+    upper = sum(max(duration.values()) for duration in durations) + sum(max(time, 1) for time in submersion_times) + 2 * lift
+    upper += max(timing.travel(1, 0, len(bath_data) - 1), 1) * move_count
+    longest = max(timing.latency(1, from_bath, to_bath) for from_bath in range(len(bath_data)) for to_bath in range(len(bath_data)))
+    shift_bound = (max(max(duration.values()) for duration in durations) + max(submersion_times) + longest) // lower + 1
+
+    # move k of the carrier entering at time 0 starts at s_k = q_k * T + r_k, r_k is its start within the period,
+    # the products are kept linear by a literal per value of the periods separating consecutive moves of the carrier
+    model = cp_model.CpModel()
+    period = model.NewIntVar(lower, upper, "period")
+    offsets = [model.NewIntVar(0, upper - 1, f"r{k}") for k in range(move_count)]
+    for offset in offsets:
+        model.Add(offset <= period - 1)
+    model.Add(offsets[0] == 0)
+    shifts = [{0: model.NewConstant(1)}]
+    for k in range(1, move_count):
+        shifts.append({shift: model.NewBoolVar(f"q{k}_{shift}") for shift in range(shift_bound + 1)})
+        model.AddExactlyOne(shifts[k].values())
+
+    assigned = [{hoist: model.NewBoolVar(f"x{k}_{hoist}") for hoist in hoists} for k, hoists in enumerate(capable)]
+    for options in assigned:
+        model.AddExactlyOne(options.values())
+    duration = [sum(durations[k][hoist] * literal for hoist, literal in assigned[k].items()) for k in range(move_count)]
+
+    for first, last in visits.values():
+        # the last visit ends before the next carrier is lowered into the bath: s_first-1 + T - s_last >= 2 * lift + 1 - d_first-1,
+        # a move is shorter than the period, so the visits are at most two periods apart
+        gap = 2 * lift + 1 - duration[first - 1]
+        separated = {shift: model.NewBoolVar(f"separated{first}_{shift}") for shift in range(3)}
+        model.AddExactlyOne(separated.values())
+        model.Add(sum(shift * literal for k in range(first, last + 1) for shift, literal in shifts[k].items())
+                  == sum(shift * literal for shift, literal in separated.items()))
+        for shift, literal in separated.items():
+            model.Add(offsets[first - 1] + (1 - shift) * period - offsets[last] >= gap).OnlyEnforceIf(literal)
+
+    # the carrier is picked up once its submersion is done and the manipulator came from its previous drop
+    arrivals = [None] + [model.NewIntVar(0, longest, f"arrival{k}") for k in range(1, move_count)]
+    for k in range(1, move_count):
+        for shift, literal in shifts[k].items():
+            model.Add(offsets[k] + shift * period - offsets[k - 1] >= duration[k - 1] + max(submersion_times[k], 1) - 1
+                      + arrivals[k]).OnlyEnforceIf(literal)
+
+    def follows(hoist, k, j, literal, wrap):
+        # move j is the next move of the manipulator after move k, within the same period or in the next one
+        latency = timing.latency(hoist, bath_ids[k + 1], bath_ids[j])
+        model.Add(offsets[j] + (period if wrap else 0) >= offsets[k] + durations[k][hoist] + latency).OnlyEnforceIf(literal)
+        if j > 0:
+            model.Add(arrivals[j] >= latency).OnlyEnforceIf(literal)
+
+    # the moves of a manipulator form a circuit through a depot node marking the start of the period
+    for hoist in range(1, len(timing.ranges) + 1):
+        moves = [k for k in range(move_count) if hoist in capable[k]]
+        if not moves:
+            continue
+        idle = model.NewBoolVar(f"idle{hoist}")
+        arcs = [(0, 0, idle)]
+        firsts, lasts = {}, {}
+        for node, k in enumerate(moves, 1):
+            model.AddImplication(idle, assigned[k][hoist].Not())
+            arcs.append((node, node, assigned[k][hoist].Not()))
+            firsts[k] = model.NewBoolVar(f"first{hoist}_{k}")
+            lasts[k] = model.NewBoolVar(f"last{hoist}_{k}")
+            arcs += [(0, node, firsts[k]), (node, 0, lasts[k])]
+        for (node, k), (next_node, j) in itertools.product(enumerate(moves, 1), repeat=2):
+            if k != j:
+                literal = model.NewBoolVar(f"arc{hoist}_{k}_{j}")
+                arcs.append((node, next_node, literal))
+                follows(hoist, k, j, literal, wrap=False)
+            # the last move of a period is followed by the first move of the next one
+            wrap = model.NewBoolVar(f"wrap{hoist}_{k}_{j}")
+            model.AddBoolOr([lasts[k].Not(), firsts[j].Not(), wrap])
+            follows(hoist, k, j, wrap, wrap=True)
+        model.AddCircuit(arcs)
+    model.Minimize(period)
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = time_limit
+    solver.parameters.num_workers = workers
+    status = solver.Solve(model)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        raise ValueError(f"No cyclic schedule of recipe {template.name} with a period up to {upper}s found "
+                         f"({solver.StatusName(status)})")
+
+    value = solver.Value(period)
+    hoists = [next(hoist for hoist, literal in options.items() if solver.BooleanValue(literal)) for options in assigned]
+    sequences = {}
+    for k in sorted(range(move_count), key=lambda move: solver.Value(offsets[move])):
+        sequences.setdefault(hoists[k], []).append(k)
+    for hoist, order in sequences.items():
+        # listed from the first move of the carrier, as in the order of the moves of a single carrier
+        first = order.index(min(order))
+        sequences[hoist] = order[first:] + order[:first]
+    starts, periods = [], 0
+    for k in range(move_count):
+        periods += next(shift for shift, literal in shifts[k].items() if solver.BooleanValue(literal))
+        starts.append(periods * value + solver.Value(offsets[k]))
+    schedule = CyclicSchedule(template, value, starts, hoists, sequences, parameters)
+    schedule.status = solver.StatusName(status)
+    loader = sequences[hoists[0]]
+    # the manipulator loading the carriers comes back from the bath of its previous move
+    schedule.entry_lead = timing.latency(hoists[0], bath_ids[loader[-1] + 1], 0)
+    return schedule
+
+
+class TimetableDispatcher(Dispatcher):
+    """
+    Tasks the manipulators according to a timetable of move starts (simulation steps), a move is started once its time comes.
+    The timetable is given per carrier, subclasses may compute it instead (see planned). Carriers should be released into
+    the line shortly before their first move, the loading manipulator is tasked once the carrier entered.
+    Records how late the moves started compared to the timetable.
+    """
+    def __init__(self, parameters, bath_data=bathData, manip_data=manipData, first_carrier_id=None, starts=(), hoists=()):
+        """
+        :param parameters: lift_time, speed and acceleration_time the timetable was computed with
+        :param bath_data: line definition the timetable was computed for
+        :param manip_data: manipulators the timetable was computed for
+        :param first_carrier_id: id of the first carrier of the timetable, the id of the next created Carrier by default
+        :param starts: per carrier, start of every move
+        :param hoists: per carrier, id of the manipulator performing every move
+        """
+        super().__init__(allow_wait=True)
+        self.starts = starts
+        self.hoists = hoists
+        self.first_carrier_id = Carrier.next_id if first_carrier_id is None else first_carrier_id
+        self.max_delay = 0 # largest delay of a move start behind the timetable
+        self.timing = LineTiming(bath_data, manip_data, parameters)
+
+    def planned(self, carrier_index, move):
+        """
+        :return: (start, manipulator id) of the move of the carrier_index-th carrier
+        """
+        return self.starts[carrier_index][move], self.hoists[carrier_index][move]
+
+    def due(self, line, manipulator_id, bath_id):
+        """
+        :return: step in which the manipulator should be tasked with the carrier in the bath, None if the move isn't its one
+        """
+        carrier = line.baths[bath_id].containedCarrier
+        start, hoist = self.planned(carrier.carUUID - self.first_carrier_id, carrier.currentStepIndex)
+        if hoist != manipulator_id:
+            return None
+        manipulator = line.manipulators[manipulator_id - 1]
+        return start - self.timing.latency(manipulator_id, manipulator.position, bath_id)
+
+    def select(self, line, alternatives):
+        now = line.step_counter
+        due = {}
+        for alternative in alternatives:
+            for manipulator_id, bath_id in alternative:
+                if (manipulator_id, bath_id) not in due:
+                    due[(manipulator_id, bath_id)] = self.due(line, manipulator_id, bath_id)
+        best, best_size = 0, -1
+        for index, alternative in enumerate(alternatives):
+            times = [due[assignment] for assignment in alternative]
+            if all(time is not None and time <= now for time in times) and len(alternative) > best_size:
+                best, best_size = index, len(alternative)
+        for assignment in alternatives[best]:
+            self.max_delay = max(self.max_delay, now - due[assignment])
+        return best
+
+
+class CyclicDispatcher(TimetableDispatcher):
+    """
+    Timetable of a CyclicSchedule, the n-th carrier starts its first move n periods after the first one.
+    """
+    def __init__(self, schedule, bath_data=bathData, manip_data=manipData, first_carrier_id=None):
+        super().__init__(schedule.parameters, bath_data, manip_data, first_carrier_id)
+        self.schedule = schedule
+
+    def planned(self, carrier_index, move):
+        return carrier_index * self.schedule.period + self.schedule.starts[move], self.schedule.hoists[move]
+
+
+@contextmanager
+def timing_constants(parameters):
+    """
+    Sets the class level timing constants of the simulator for the time of a run, see CyclicSchedule.parameters.
+    """
+    saved = Manipulator.LIFT_TIME, Manipulator.SPEED, Manipulator.ACCELERATION_TIME, RecipeStep.DRIP_TIME
+    Manipulator.LIFT_TIME, Manipulator.SPEED = parameters["lift_time"], parameters["speed"]
+    Manipulator.ACCELERATION_TIME, RecipeStep.DRIP_TIME = parameters["acceleration_time"], parameters["drip_time"]
+    try:
+        yield
+    finally:
+        Manipulator.LIFT_TIME, Manipulator.SPEED, Manipulator.ACCELERATION_TIME, RecipeStep.DRIP_TIME = saved
+
+
+def validate_schedule(schedule, bath_data=bathData, manip_data=manipData, carriers=40):
+    """
+    Replays the schedule in the simulator, the timing constants of the schedule are set for the time of the run.
+    :param carriers: number of simulated carriers
+    :return: dictionary with the period measured between the carriers leaving the second half of the run, the largest
+        delay of a move behind the schedule and the completion status
+    """
+    with timing_constants(schedule.parameters):
+        name = schedule.template.name
+        work_order = WorkOrderStream([(name, time) for time in schedule.release_times(carriers)], {name: schedule.template})
+        dispatcher = CyclicDispatcher(schedule, bath_data, manip_data)
+        line = LineSimulation(bath_data, manip_data, work_order, event_driven=True, log=EventLog(LogMode.SILENT),
+                              dispatcher=dispatcher)
+        line.run()
+
+    times = list(line.deque_times)
+    half = len(times) // 2
+    measured = (times[-1] - times[half]) / (len(times) - 1 - half) if len(times) - 1 > half else None
+    return {
+        "completed": line.finished_count >= line.carriers_to_move,
+        "cycle_time": line.step_counter,
+        "measured_period": measured,
+        "max_delay": dispatcher.max_delay,
+    }
+
+
+if __name__ == "__main__":
+    # Minimal takt of every example recipe, compared with the greedy simulation of the same number of carriers
+    for name, template in sorted(RECIPE_TEMPLATES.items()):
+        schedule = solve_cyclic_schedule(bathData, manipData, template)
+        print(schedule.describe())
+        validation = validate_schedule(schedule)
+        greedy = LineSimulation(bathData, manipData, [Carrier(template.create_instance()) for _ in range(40)],
+                                event_driven=True, log=EventLog(LogMode.SILENT))
+        greedy.run()
+        print(f"Simulated schedule: {validation}, greedy dispatching: {greedy.avg_time_between:.2f}s between carriers\n")
@@ -0,0 +1,241 @@
+import copy
+
+from main import (LineSimulation, Dispatcher, Carrier, EventLog, LogMode, bathData, manipData,
+                  recipe_template1, recipe_template2, recipe_template3, recipe_template4)
+"""
+Search over the dispatching decisions of a line.
+The greedy tasking of check_baths gives the first idle manipulator the first carrier it can serve. Whenever more than one
+assignment of idle manipulators to waiting carriers is possible (a decision point, see LineSimulation.dispatch_alternatives),
+the search branches, simulating every alternative on a copy of the line. Branches are ranked by a greedy rollout
+(the rest of the work order simulated with the greedy tasking) and the best ones are kept (beam search), branches which
+can't beat the best rollout found so far are pruned (branch and bound).
+Rollouts are cached under the line state, so identical states reached by a different order of assignments
+are neither simulated nor expanded again.
+"""
+
+
+class ScriptedDispatcher(Dispatcher):
+    """
+    Replays a sequence of choices, one per decision point (step with more than one alternative), the greedy choice
+    is taken once the sequence runs out. Records the assignments chosen in the decision points.
+    """
+    def __init__(self, choices, allow_wait=False, max_alternatives=None):
+        """
+        :param choices: indexes of the alternatives chosen in the consecutive decision points, see DispatchSearch
+        """
+        super().__init__(allow_wait, max_alternatives)
+        self.choices = list(choices)
+        self.decisions = 0 # number of decision points passed so far
+        self.assignments = [] # (step, assignments) of every decision point
+
+    def select(self, line, alternatives):
+        if len(alternatives) < 2:
+            return 0
+        choice = self.choices[self.decisions] if self.decisions < len(self.choices) else 0
+        self.decisions += 1
+        self.assignments.append((line.step_counter, alternatives[choice]))
+        return choice
+
+
+def clone_line(line):
+    """
+    :return: independent copy of the line, the (read only) recipes of the carriers are shared with the original
+    """
+    memo = {}
+    carriers = list(line.carrier_definition) + list(line.work_order) + list(line.finished_carriers)
+    carriers += [bath.containedCarrier for bath in line.baths] + [manipulator.heldCarrier for manipulator in line.manipulators]
+    for carrier in carriers:
+        if carrier is not None:
+            memo[id(carrier.requiredProcedure)] = carrier.requiredProcedure
+    return copy.deepcopy(line, memo)
+
+
+def carrier_key(carrier):
+    # carriers following the same recipe are interchangeable, the id is left out
+    if carrier is None:
+        return None
+    return carrier.requiredProcedure.name, carrier.currentStepIndex, carrier.state, carrier.operation_timer
+
+
+def state_key(line):
+    """
+    :return: tuple of everything the rest of the simulation depends on (at the end of a step), compared in full by the
+        cache so that distinct states never share an entry
+    """
+    manipulators = []
+    for manipulator in line.manipulators:
+        move = manipulator.rail_move
+        manipulators.append((manipulator.state, manipulator.position, manipulator.target_position, manipulator.distance_rail,
+                             manipulator.operation_timer, manipulator.evasion_target, carrier_key(manipulator.heldCarrier),
+                             None if move is None else (move.start_time, move.start_distance, move.target_distance, move.wait)))
+    baths = tuple(carrier_key(bath.containedCarrier) for bath in line.baths)
+    return line.step_counter, line.finished_count, len(line.work_order), tuple(manipulators), baths
+
+
+def lower_bound(line, takt_bound=None):
+    """
+    :param takt_bound: TaktBound of the line, adds the work of the carriers which didn't enter the line yet,
+        only used with steps of a second (the bound rounds every operation up to whole seconds)
+    :return: earliest possible end of the work order in steps, every carrier still has to finish its remaining submersions
+    """
+    remaining = 0
+    carriers = [bath.containedCarrier for bath in line.baths] + [manipulator.heldCarrier for manipulator in line.manipulators]
+    for carrier in carriers:
+        if carrier is not None:
+            steps = carrier.requiredProcedure.executionList[carrier.currentStepIndex:]
+            remaining = max(remaining, sum(line.ticks(step.submersionTime) for step in steps) - carrier.operation_timer)
+    for carrier in line.work_order:
+        remaining = max(remaining, sum(line.ticks(step.submersionTime) for step in carrier.requiredProcedure.executionList))
+    if takt_bound is not None and line.time_unit == 1 and line.work_order:
+        bottleneck = takt_bound.bottleneck([carrier.requiredProcedure for carrier in line.work_order])
+        if bottleneck is not None:
+            remaining = max(remaining, bottleneck[0])
+    return line.step_counter + remaining
+
+
+class SearchResult:
+    def __init__(self, cycle_time, greedy_cycle_time, choices, assignments):
+        self.cycle_time = cycle_time # total cycle time of the best schedule, None if no schedule finished the work order
+        self.greedy_cycle_time = greedy_cycle_time # total cycle time of the greedy tasking
+        self.choices = choices # chosen alternative per decision point, see ScriptedDispatcher
+        self.assignments = assignments # list of (step, ((manipulator id, bath id), ...)) per decision point
+        self.expanded = 0 # number of expanded decision points
+        self.rollouts = 0 # number of simulated rollouts
+        self.cache_hits = 0 # branches found in the transposition cache
+        self.pruned = 0 # branches cut off by the bound
+
+    def __repr__(self):
+        return (f"SearchResult(cycle_time={self.cycle_time}, greedy_cycle_time={self.greedy_cycle_time}, "
+                f"decisions={len(self.choices)}, expanded={self.expanded}, rollouts={self.rollouts}, "
+                f"cache_hits={self.cache_hits}, pruned={self.pruned})")
+
+
+class DispatchSearch:
+    """
+    Beam search (branch and bound with beam_width=None) over the decision points of a line, minimising the total cycle time.
+    The lines are simulated by the event driven engine with a silent log, the original line is never modified.
+    """
+    def __init__(self, beam_width=4, max_alternatives=6, allow_wait=False, max_expansions=2000, takt_bound=None):
+        """
+        :param beam_width: number of branches kept per decision depth, None keeps every branch which isn't pruned
+        :param max_alternatives: maximal number of alternatives simulated per decision point
+        :param allow_wait: also branch on leaving a manipulator idle although it could serve a carrier
+        :param max_expansions: budget of expanded decision points, the best schedule found so far is returned once spent
+        :param takt_bound: TaktBound of the searched line (see takt_bound.py), prunes branches by the manipulator and bath
+            work left in the work order, not just by the submersions of single carriers
+        """
+        self.beam_width = beam_width
+        self.max_alternatives = max_alternatives
+        self.allow_wait = allow_wait
+        self.max_expansions = max_expansions
+        self.takt_bound = takt_bound
+        self.cache = {} # state key -> (cycle time, finished carriers) of the greedy rollout, filled by search
+
+    def dispatcher(self, choices=()):
+        return ScriptedDispatcher(choices, self.allow_wait, self.max_alternatives)
+
+    def rollout(self, line, result):
+        """
+        Finishes a copy of the line (at the end of a step) with the greedy tasking.
+        :return: total cycle time (None if the work order wasn't finished due to the overflow control)
+            and the number of finished carriers
+        """
+        key = state_key(line)
+        if key in self.cache:
+            result.cache_hits += 1
+            return self.cache[key]
+        result.rollouts += 1
+        finished = clone_line(line)
+        finished.dispatcher = self.dispatcher()
+        finished.run()
+        cycle_time = finished.step_counter if finished.finished_count >= finished.carriers_to_move else None
+        self.cache[key] = cycle_time, finished.finished_count
+        return self.cache[key]
+
+    @staticmethod
+    def advance(line):
+        """
+        Simulates the line until the middle of the next step with more than one alternative.
+        :return: alternatives of the decision point, None once the work order is done
+        """
+        while not line.is_work_order_done:
+            line.begin_step()
+            alternatives = line.prepare_dispatch()
+            if len(alternatives) > 1:
+                return alternatives
+            line.apply_assignments(alternatives[0])
+            if not line.finish_step():
+                line.skip_idle_steps()
+        return None
+
+    def search(self, line):
+        """
+        :param line: LineSimulation with a list work order, which wasn't run yet
+        :return: SearchResult with the best schedule found
+        """
+        if line.order_stream is not None:
+            raise ValueError("Dispatch search needs a work order given as a list of carriers")
+        if line.stats is not None:
+            raise ValueError("Dispatch search can't copy a line with SimulationStats attached")
+
+        start = clone_line(line)
+        start.log = EventLog(LogMode.SILENT)
+        start.event_driven = True
+        start.dispatcher = self.dispatcher()
+        root = clone_line(start)
+        self.cache = {}
+        result = SearchResult(None, None, (), [])
+        result.greedy_cycle_time = best = self.rollout(root, result)[0]
+        best_choices = ()
+
+        # beam of (line paused in a decision point, its alternatives, choices leading to it)
+        alternatives = self.advance(root)
+        beam = [] if alternatives is None else [(root, alternatives, ())]
+        while beam and result.expanded < self.max_expansions:
+            children = []
+            for node, alternatives, choices in beam:
+                result.expanded += 1
+                for index, assignments in enumerate(alternatives):
+                    child = clone_line(node)
+                    child.apply_assignments(assignments)
+                    if not child.finish_step():
+                        child.skip_idle_steps()
+                    key = state_key(child)
+                    if key in self.cache:
+                        # identical state already reached by another order of assignments
+                        result.cache_hits += 1
+                        continue
+                    if best is not None and lower_bound(child, self.takt_bound) >= best:
+                        result.pruned += 1
+                        continue
+                    cycle_time, finished_count = self.rollout(child, result)
+                    if cycle_time is not None and (best is None or cycle_time < best):
+                        best, best_choices = cycle_time, choices + (index,)
+                    child_alternatives = self.advance(child)
+                    if child_alternatives is not None:
+                        # finished rollouts first, the ones which got stuck ranked by the number of finished carriers
+                        rank = (0, cycle_time) if cycle_time is not None else (1, -finished_count)
+                        children.append((rank, len(children), child, child_alternatives, choices + (index,)))
+            children.sort(key=lambda item: item[:2])
+            if self.beam_width is not None:
+                children = children[:self.beam_width]
+            beam = [(child, child_alternatives, choices) for _, _, child, child_alternatives, choices in children]
+
+        result.cycle_time = best
+        result.choices = best_choices
+        replay = start
+        replay.dispatcher = self.dispatcher(best_choices)
+        replay.run()
+        result.assignments = replay.dispatcher.assignments
+        return result
+
+
+if __name__ == "__main__":
+    # Searches the dispatching of the example work order of main.py
+    order = [recipe_template1, recipe_template4, recipe_template2, recipe_template3, recipe_template1]
+    line = LineSimulation(bathData, manipData, [Carrier(template.create_instance()) for template in order],
+                          log=EventLog(LogMode.SILENT))
+    result = DispatchSearch().search(line)
+    print(result)
+    for step, assignments in result.assignments:
+        print(f"{step:>6}s " + ", ".join(f"manip {manipulator_id} -> bath {bath_id}" for manipulator_id, bath_id in assignments))
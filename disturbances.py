@@ -0,0 +1,288 @@
+import copy
+import itertools
+import math
+from time import perf_counter
+
+from main import (LineSimulation, Carrier, CarrierState, ManipulatorState, WorkOrderStream, EventLog, LogMode, RECIPE_TEMPLATES,
+                  bathData, manipData)
+from plant import StationBlocker
+from snapshot import LineSnapshot
+"""
+Disturbances of a running line (baths out of service, stopped manipulators, hot orders) and re-planning around them.
+Disturbances(line) attaches to a line in the middle of its run, the tasking then works around the active disturbances:
+    - a carrier whose next bath is out of service is not picked up (or loaded) and waits in its current bath,
+      carriers already on their way wait above the bath until it is back, the bath is blocked meanwhile like a shared
+      station held by another line (see plant.StationBlocker),
+    - a stopped manipulator finishes the move in progress and is not tasked any more, neighbours take over the moves
+      they can reach (it still gives way on the rail, but doesn't load a carrier at the line entry),
+    - a hot order is placed in front of the remaining work order.
+Only the carriers needing a disturbed bath or manipulator are held back, the greedy tasking (or the Dispatcher of the
+line) keeps deciding everything else, so nothing has to be re-simulated from the start of the shift.
+
+Like SimulationStats, the disturbances are installed as instance attributes wrapping the filters of the tasking
+(candidate_baths, idle_manipulators_for, may_load), begin_step and ticks_until_next_event of that line only. The event driven
+engine wakes up at the start and the end of every disturbance window.
+forecast / replan continue a fork of the line (see snapshot.py) to predict the effect on every carrier, in milliseconds.
+"""
+
+
+class DisturbanceReport:
+    """
+    Predicted effect of the disturbances, see Disturbances.replan.
+    """
+    def __init__(self, time, cycle_time, baseline_cycle_time, exits, baseline_exits, wall_time):
+        self.time = time # step of the line when the report was made
+        self.cycle_time = cycle_time # predicted end of the work order with the disturbances
+        self.baseline_cycle_time = baseline_cycle_time # predicted end without them
+        self.exits = exits # carrier id -> predicted exit step with the disturbances
+        self.baseline_exits = baseline_exits # carrier id -> predicted exit step without them
+        self.wall_time = wall_time # seconds spent on both forecasts
+
+    @property
+    def delays(self):
+        """
+        :return: carrier id -> delay of its exit in steps, for the carriers the disturbances delay (or speed up)
+        """
+        return {carrier_uuid: exit_time - self.baseline_exits[carrier_uuid] for carrier_uuid, exit_time in self.exits.items()
+                if carrier_uuid in self.baseline_exits and exit_time != self.baseline_exits[carrier_uuid]}
+
+    def __repr__(self):
+        return (f"DisturbanceReport(at {self.time}s: cycle time {self.cycle_time}s instead of {self.baseline_cycle_time}s,"
+                f" {len(self.delays)} carriers affected, {self.wall_time * 1000:.1f} ms)")
+
+
+class Disturbances:
+    """
+    Disturbance windows of a line, see the module description.
+    Windows are half open [start, end) intervals of simulation steps, an end of None lasts until the resource is restored.
+    """
+    def __init__(self, line):
+        """
+        :param line: LineSimulation between two steps
+        """
+        self.line = line
+        self.bath_outages = [] # (bath id, start, end) windows
+        self.manipulator_stops = [] # (manipulator id, start, end) windows
+        self.blocked = set() # bath ids currently holding a StationBlocker
+        self.hot_orders = [] # ids of the carriers inserted by hot_order
+        self.attach(line)
+
+    def attach(self, line):
+        """
+        Installs the wrappers on the given line.
+        """
+        candidate_baths = line.candidate_baths
+        def held_candidate_baths(bath_ids, state):
+            valid = candidate_baths(bath_ids, state)
+            if state in (CarrierState.UNSERVICED, CarrierState.BATH_COMPLETED):
+                # the held carriers stay tracked, they are only left out of the tasking
+                valid = [bath_id for bath_id in valid if not self.is_held(line.baths[bath_id].containedCarrier)]
+            return valid
+        line.candidate_baths = held_candidate_baths
+
+        idle_manipulators_for = line.idle_manipulators_for
+        def available_manipulators_for(bath_ids):
+            return [manipulator for manipulator in idle_manipulators_for(bath_ids)
+                    if not self.is_stopped(manipulator.ManipUUID, line.step_counter)]
+        line.idle_manipulators_for = available_manipulators_for
+
+        may_load = line.may_load
+        def running_may_load(manipulator):
+            return may_load(manipulator) and not self.is_stopped(manipulator.ManipUUID, line.step_counter)
+        line.may_load = running_may_load
+
+        begin_step = line.begin_step
+        def disturbed_begin_step():
+            self.update_blockers()
+            begin_step()
+        line.begin_step = disturbed_begin_step
+
+        ticks_until_next_event = line.ticks_until_next_event
+        def ticks_until_next_change():
+            ticks = ticks_until_next_event()
+            boundary = self.next_boundary(line.step_counter)
+            return ticks if boundary is None else min(ticks, boundary - line.step_counter)
+        line.ticks_until_next_event = ticks_until_next_change
+
+    @staticmethod
+    def active(windows, key, time):
+        return any(window_key == key and start <= time and (end is None or time < end) for window_key, start, end in windows)
+
+    def is_bath_down(self, bath_id, time):
+        return self.active(self.bath_outages, bath_id, time)
+
+    def is_stopped(self, manipulator_id, time):
+        return self.active(self.manipulator_stops, manipulator_id, time)
+
+    def is_held(self, carrier):
+        """
+        :return: True if the next bath of the carrier is out of service
+        """
+        steps = carrier.requiredProcedure.executionList
+        next_step_index = carrier.currentStepIndex + 1
+        return next_step_index < len(steps) and self.is_bath_down(steps[next_step_index].bathID, self.line.step_counter)
+
+    def next_boundary(self, time):
+        """
+        :return: first start or end of a window at the given step or later, None if there is none
+        """
+        boundaries = [boundary for _, start, end in itertools.chain(self.bath_outages, self.manipulator_stops)
+                      for boundary in (start, end) if boundary is not None and boundary >= time]
+        return min(boundaries, default=None)
+
+    def update_blockers(self):
+        """
+        Blocks the empty baths which are out of service, frees the ones which are back.
+        """
+        line = self.line
+        for bath_id in list(self.blocked):
+            if not self.is_bath_down(bath_id, line.step_counter):
+                line.baths[bath_id].containedCarrier = None
+                self.blocked.discard(bath_id)
+        for bath_id in {bath_id for bath_id, _, _ in self.bath_outages} - self.blocked:
+            # a carrier in the bath (or being lowered into it) is finished normally, the bath is blocked once it is lifted out
+            if (self.is_bath_down(bath_id, line.step_counter) and line.baths[bath_id].containedCarrier is None
+                    and not any(manipulator.state == ManipulatorState.SUBMERGING and manipulator.target_position == bath_id
+                                for manipulator in line.manipulators)):
+                line.baths[bath_id].containedCarrier = StationBlocker()
+                self.blocked.add(bath_id)
+
+    def window(self, start, duration):
+        # both given in s, the window starts with the first step at or after the start time
+        start = self.line.step_counter if start is None else self.line.ticks(start)
+        return start, None if duration is None else start + self.line.ticks(duration)
+
+    def bath_outage(self, bath_id, duration=None, start=None):
+        """
+        Takes a bath out of service.
+        :param bath_id: bath of the line, neither the entry nor the exit
+        :param duration: length of the outage in s, None until restore_bath
+        :param start: start of the outage in s since the start of the line, the next step by default
+        """
+        if not 0 < bath_id < len(self.line.baths) - 1:
+            raise ValueError(f"The entry and the exit of the line can't be taken out of service, got bath {bath_id}")
+        self.bath_outages.append((bath_id, *self.window(start, duration)))
+
+    def stop_manipulator(self, manipulator_id, duration=None, start=None):
+        """
+        Takes a manipulator out of service, it finishes the move in progress first.
+        :param manipulator_id: ManipUUID of the manipulator
+        :param duration: length of the stop in s, None until restart_manipulator
+        :param start: start of the stop in s since the start of the line, the next step by default
+        """
+        if not 1 <= manipulator_id <= len(self.line.manipulators):
+            raise ValueError(f"Unknown manipulator {manipulator_id}, the line has {len(self.line.manipulators)}")
+        self.manipulator_stops.append((manipulator_id, *self.window(start, duration)))
+
+    @staticmethod
+    def ended(windows, key, time):
+        return [(window_key, start, time if window_key == key and (end is None or end > time) else end)
+                for window_key, start, end in windows]
+
+    def restore_bath(self, bath_id):
+        """
+        Ends the outages of the bath from the next step on.
+        """
+        self.bath_outages = self.ended(self.bath_outages, bath_id, self.line.step_counter)
+
+    def restart_manipulator(self, manipulator_id):
+        """
+        Ends the stops of the manipulator from the next step on.
+        """
+        self.manipulator_stops = self.ended(self.manipulator_stops, manipulator_id, self.line.step_counter)
+
+    def hot_order(self, carrier):
+        """
+        Places the carrier in front of the remaining work order, it enters the line as soon as the entry is free.
+        :param carrier: new Carrier, streamed work orders accept the recipes of their templates only
+        """
+        line = self.line
+        if line.is_work_order_done:
+            raise ValueError("The work order of the line is already done")
+        stream = line.order_stream
+        if stream is None:
+            line.work_order.append(carrier) # carriers are popped from the right
+            line.carrier_definition.append(carrier)
+            line.carriers_to_move += 1
+        elif type(stream) is WorkOrderStream:
+            stream.insert(carrier, line.seconds(line.step_counter))
+        else:
+            raise ValueError(f"Hot orders can't be placed into lines fed by {type(stream).__name__}")
+        line.is_work_order_processed = False
+        self.hot_orders.append(carrier.carUUID)
+
+    def fork(self, disturbed=True):
+        """
+        :param disturbed: apply the disturbances to the fork, it follows the undisturbed tasking otherwise
+        :return: independent silent copy of the line continuing from its current step
+        """
+        line = self.line
+        # blockers are placed again by the first step of the fork
+        for bath_id in self.blocked:
+            line.baths[bath_id].containedCarrier = None
+        try:
+            snapshot = LineSnapshot.capture(line)
+        finally:
+            for bath_id in self.blocked:
+                line.baths[bath_id].containedCarrier = StationBlocker()
+        # dispatchers may keep state (e.g. the decisions replayed by a ScriptedDispatcher), the fork gets its own copy
+        branch = snapshot.restore(log=EventLog(LogMode.SILENT), dispatcher=copy.deepcopy(line.dispatcher))
+        if disturbed:
+            branch_disturbances = Disturbances(branch)
+            branch_disturbances.bath_outages = list(self.bath_outages)
+            branch_disturbances.manipulator_stops = list(self.manipulator_stops)
+            branch_disturbances.hot_orders = list(self.hot_orders)
+        return branch
+
+    @staticmethod
+    def exits(line):
+        """
+        :return: carrier id -> exit step of the carriers finished by the line (the kept history for streamed work orders)
+        """
+        return {carrier.carUUID: exit_time for carrier, exit_time in zip(line.finished_carriers, line.deque_times)}
+
+    def forecast(self, disturbed=True, horizon=None):
+        """
+        Continues a fork of the line until its work order is done.
+        :param disturbed: see fork
+        :param horizon: stops after this many steps at the latest
+        :return: the finished fork
+        """
+        branch = self.fork(disturbed)
+        end = math.inf if horizon is None else branch.step_counter + horizon
+        while branch.step_counter < end and not branch.step():
+            if branch.event_driven:
+                branch.skip_idle_steps()
+        return branch
+
+    def replan(self, horizon=None):
+        """
+        Predicts the effect of the disturbances, the line itself is not advanced.
+        :param horizon: see forecast
+        :return: DisturbanceReport comparing the forecasts with and without the disturbances
+        """
+        start = perf_counter()
+        disturbed = self.forecast(True, horizon)
+        baseline = self.forecast(False, horizon)
+        return DisturbanceReport(self.line.step_counter, disturbed.step_counter, baseline.step_counter,
+                                 self.exits(disturbed), self.exits(baseline), perf_counter() - start)
+
+
+if __name__ == "__main__":
+    # At 300 s of the example work order bath 13 goes down for 10 minutes and manipulator 3 stops for 5 minutes,
+    # then a hot order is inserted
+    order = ["Test1", "Test4", "Test2", "Test3", "Test1"]
+    line = LineSimulation(bathData, manipData, [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in order],
+                          event_driven=True, log=EventLog(LogMode.SILENT))
+    while line.step_counter < 300 and not line.step():
+        line.skip_idle_steps()
+    disturbances = Disturbances(line)
+    disturbances.bath_outage(13, duration=600)
+    print(disturbances.replan())
+    disturbances.stop_manipulator(3, duration=300)
+    print(disturbances.replan())
+    disturbances.hot_order(Carrier(RECIPE_TEMPLATES["Test2"].create_instance()))
+    report = disturbances.replan()
+    print(report, f"delays {report.delays}")
+    line.run()
+    print(f"Simulated: {line.step_counter}s, {line.finished_count} carriers")
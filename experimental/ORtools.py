@@ -1,3 +1,4 @@
+# Prototype, superseded by cp_scheduler.py in the repository root
 # Import necessary libraries
 from ortools.sat.python import cp_model
 
@@ -1,5 +1,10 @@
+import csv
+import json
+import math
+from array import array
 from enum import Enum
 from collections import deque, defaultdict
+from time import perf_counter
 """
 Code mimics the described assembly line problem and 
 attempts to solve the planning and optimization issue by 
@@ -15,9 +20,11 @@ class Bath:
     """
     next_id = 0  # Class variable for auto-incrementing ID
 
-    def __init__(self, name, distance, submergable=True):
-        self.bathUUID = Bath.next_id  # Assign auto-incremented ID
-        Bath.next_id += 1  # Increment for the next instance
+    def __init__(self, name, distance, submergable=True, bath_id=None):
+        if bath_id is None:
+            bath_id = Bath.next_id  # Assign auto-incremented ID
+            Bath.next_id += 1  # Increment for the next instance
+        self.bathUUID = bath_id # also used as index of the bath within the line
         self.name = name # plain text descriptor
         self.distanceToStart = distance  # Distance in m
         self.containedCarrier = None # Object of carrier held/submerged by line position
@@ -39,23 +46,123 @@ class ManipulatorState(Enum):
     HOLDING = "Holding" #manipulator has a carrier, but possible target baths are occupied
     LOADING = "Loading" #manipulator is in a process of picking up from position bath[0] or is letting go of a carrier at baths[-1]
 
+class RailMove:
+    """
+    Single move of a manipulator alongside the rail, described in closed form.
+    The position after any number of steps is computed directly from the start of the move instead of being accumulated
+    step by step, so long traverses can be skipped in O(1) and arrival is exact (no float drift).
+    With a non-zero acceleration time the move follows the trapezoidal (or for short moves triangular) speed profile
+    of travel_time in experimental/procedural_sim.py.
+    Steps last time_unit seconds (see LineSimulation), the profile itself is in seconds and doesn't depend on the step length.
+    """
+    __slots__ = ("start_time", "start_distance", "target_distance", "speed", "direction", "length",
+                 "acceleration", "ramp_time", "cruise_time", "total_time", "wait", "duration", "elapsed", "time_unit")
+    EPSILON = 1e-9 # tolerance of the duration rounding
+
+    def __init__(self, start_time, start_distance, target_distance, speed, acceleration_time=0, wait=0, time_unit=1):
+        """
+        :param start_time: simulation step in which the move starts
+        :param start_distance: rail distance in meters at the start of the move
+        :param target_distance: rail distance in meters of the target
+        :param speed: maximal speed in m/s
+        :param acceleration_time: time to reach the maximal speed from standstill in seconds
+        :param wait: number of steps spent standing at the start distance before moving (see RailPlanner)
+        :param time_unit: length of a step in seconds
+        """
+        self.start_time = start_time
+        self.start_distance = start_distance
+        self.target_distance = target_distance
+        self.speed = speed
+        self.direction = 1 if target_distance >= start_distance else -1
+        self.length = abs(target_distance - start_distance)
+        if acceleration_time > 0:
+            self.acceleration = speed / acceleration_time
+            self.ramp_time = min(acceleration_time, math.sqrt(self.length / self.acceleration))
+            self.cruise_time = (self.length - self.acceleration * self.ramp_time ** 2) / speed if self.ramp_time == acceleration_time else 0
+        else:
+            self.acceleration = 0
+            self.ramp_time = 0
+            self.cruise_time = self.length / speed
+        self.total_time = 2 * self.ramp_time + self.cruise_time
+        self.wait = wait
+        self.time_unit = time_unit
+        self.duration = wait + math.ceil(self.total_time / time_unit - self.EPSILON) # number of whole steps until arrival
+        self.elapsed = 0 # steps already moved
+
+    def __repr__(self):
+        return (f"RailMove({self.start_distance}m -> {self.target_distance}m from step {self.start_time},"
+                f" {self.elapsed}/{self.duration} steps)")
+
+    def travelled(self, time):
+        """
+        :param time: time since the start of the move in seconds
+        :return: distance in meters covered until the given time
+        """
+        if time >= self.total_time:
+            return self.length
+        if self.acceleration == 0:
+            return time * self.speed
+        if time <= self.ramp_time:
+            return 0.5 * self.acceleration * time ** 2
+        if time <= self.ramp_time + self.cruise_time:
+            return 0.5 * self.acceleration * self.ramp_time ** 2 + self.acceleration * self.ramp_time * (time - self.ramp_time)
+        return self.length - 0.5 * self.acceleration * (self.total_time - time) ** 2
+
+    def position(self, elapsed=None):
+        """
+        :param elapsed: number of steps since the start of the move, defaults to the steps already moved
+        :return: rail distance in meters, exactly the target distance once the move is finished
+        """
+        elapsed = self.elapsed if elapsed is None else elapsed
+        if elapsed >= self.duration:
+            return self.target_distance
+        if elapsed <= self.wait:
+            return self.start_distance
+        return self.start_distance + self.direction * self.travelled((elapsed - self.wait) * self.time_unit)
+
+    @property
+    def arrival_time(self):
+        """
+        :return: simulation step in which the move finishes, unless it gets interrupted by a collision
+        """
+        return self.start_time + self.duration - 1
+
+
+def to_ticks(seconds, time_unit=1):
+    """
+    :param seconds: duration (or point in time) in seconds
+    :param time_unit: length of a simulation step in seconds
+    :return: number of whole steps reaching the given time, i.e. the first step timer which is not below it
+    """
+    if time_unit == 1 and type(seconds) is int:
+        return seconds
+    if seconds == math.inf:
+        return seconds
+    return math.ceil(seconds / time_unit - RailMove.EPSILON)
+
+
 class Manipulator:
     """
     Manipulator class definition.
     Manipulator holds time definitions regarding operation speeds of lifting, putting down and moving the carriers.
-    Take note that acceleration is not taken into account
+    Take note that acceleration is not taken into account unless ACCELERATION_TIME is set
     """
     # Constants
-    LIFT_TIME = 16  # Time for lift in seconds (constant)
+    LIFT_TIME = 16  # Time for lift in seconds (constant), converted to steps by LineSimulation.ticks
     SPEED = 0.6  # Speed of the manipulator (constant, 0.6 m/s)
+    ACCELERATION_TIME = 0 # Time to reach SPEED from standstill in seconds, 0 moves at constant speed
     QUEUE_TIME = 1 # Time it takes to pickup and position baths[0] and let go at baths[-1]
 
     next_id = 1  # Class variable for auto-incrementing ID
 
-    def __init__(self, reach, starting_position):
-        self.ManipUUID = Manipulator.next_id # UUID
-        Manipulator.next_id += 1
+    def __init__(self, reach, starting_position, line, manip_id=None):
+        if manip_id is None:
+            manip_id = Manipulator.next_id
+            Manipulator.next_id += 1
+        self.ManipUUID = manip_id # UUID, also used as (index + 1) within the line
+        self.line = line # LineSimulation the manipulator belongs to, provides baths and neighbouring manipulators
         self.operatingRange = reach # List of positions/operations which manipulator can service
+        self.operating_range_set = frozenset(reach) # same as operatingRange, used for membership checks
         self.liftTime = Manipulator.LIFT_TIME # Lift/put down timer
         self.movementSpeed = Manipulator.SPEED # movement speed alongside the rail
         self.position = starting_position # Position in which manipulators 'begins' the assembly line run
@@ -63,6 +170,8 @@ class Manipulator:
         self.distance_rail = Manipulator.calculate_rail_meters(self) # Distance in meters alongside the line
         self.state = ManipulatorState.IDLE # see ManipulatorState
         self.target_position = None  # Track where the manipulator is moving (ie. to which bath the manipulator needs to get to, in order to 'solve' next procedure step for carrier
+        self.rail_move = None # RailMove towards target_position, created on the first movement step
+        self.evasion_target = None # bath the manipulator is evading to, only used with a RailPlanner
         self.operation_timer = 0 # tracks length of current manipulator state for relevant operations such as dripping
 
     def __repr__(self):
@@ -77,84 +186,172 @@ class Manipulator:
         :return: side effects - modify the target position attribute, immediately calls the update_movement function
         """
         if new_position in self.operatingRange:
-            print(f"Manipulator {self.ManipUUID} moving from {self.position} to {new_position}")
+            if self.line.log.verbose:
+                print(f"Manipulator {self.ManipUUID} moving from {self.position} to {new_position}")
+            self.line.log.record(self.line.step_counter, self.ManipUUID, self.heldCarrier, "move")
             self.state = ManipulatorState.MOVING
             self.target_position = new_position
+            if self.evasion_target is None:
+                self.rail_move = None # an evasion in progress is finished first
             self.update_movement()
         else:
-            print(f"Manipulator {self.ManipUUID} cannot move to {new_position}, out of range.")
+            if self.line.log.verbose:
+                print(f"Manipulator {self.ManipUUID} cannot move to {new_position}, out of range.")
+            self.line.log.record(self.line.step_counter, self.ManipUUID, self.heldCarrier, "out_of_range")
 
     def calculate_rail_meters(self):
         """
         :return: Distance in meters alongside the line rails given the distance listed for bath above which manipulator 'begins' operations
         """
-        return baths[self.position].distanceToStart
+        return self.line.baths[self.position].distanceToStart
 
     def update_movement(self):
         """
         Primary movement function, called in each time step for every moving manipulator during simulation step.
-        Modifies distance_rail in a desired detection and handles collisions by moving idle manipulators or suspending operations when no other solution is
-        available.
+        Advances the current RailMove by one step (the position itself is computed in closed form) and handles collisions
+        by moving idle manipulators or suspending operations when no other solution is available.
         :return: side effects - changes the distance_rail parameter, updates position/bath index where appropriate, handles collision detection
         """
+        if self.line.rail_planner is not None:
+            self.update_planned_movement()
+            return
+
         if self.state == ManipulatorState.MOVING and self.target_position is not None:
-            target_distance = baths[self.target_position].distanceToStart
+            target_distance = self.line.baths[self.target_position].distanceToStart
+            previous_distance = self.distance_rail
 
-            if self.distance_rail < target_distance:  # Moving RIGHT
-                self.distance_rail = min(self.distance_rail + self.SPEED, target_distance)
-                self.operation_timer += 1
+            if previous_distance < target_distance:  # Moving RIGHT
+                self.advance_movement(1)
                 next_manip_index = self.ManipUUID
-                if next_manip_index >= len(manipulators):
+                if next_manip_index >= len(self.line.manipulators):
                     return
-                #print(f"Running collision analysis for {self} and {manipulators[next_manip_index]}")
-                if manipulators[next_manip_index].state not in (ManipulatorState.LIFTING,ManipulatorState.SUBMERGING,ManipulatorState.DRIPPING) and self.distance_rail >= manipulators[next_manip_index].distance_rail:
-                    print(f"{self.ManipUUID} is on collision rightwise course with {manipulators[next_manip_index].ManipUUID}, evasive action taken")
-                    manipulators[next_manip_index].distance_rail += manipulators[next_manip_index].SPEED
-                elif manipulators[next_manip_index].state in (ManipulatorState.LIFTING,ManipulatorState.SUBMERGING,ManipulatorState.DRIPPING) and self.distance_rail >= manipulators[next_manip_index].distance_rail:
-                    print(f"unable to perform rightwise evasion {self.ManipUUID} holding position")
-                    self.distance_rail -= self.SPEED
-
-            elif self.distance_rail > target_distance:  # Moving LEFT
-                self.distance_rail = max(self.distance_rail - self.SPEED, target_distance)
-                self.operation_timer += 1
+                #print(f"Running collision analysis for {self} and {self.line.manipulators[next_manip_index]}")
+                if self.line.manipulators[next_manip_index].state not in (ManipulatorState.LIFTING,ManipulatorState.SUBMERGING,ManipulatorState.DRIPPING) and self.distance_rail >= self.line.manipulators[next_manip_index].distance_rail:
+                    if self.line.log.verbose:
+                        print(f"{self.ManipUUID} is on collision rightwise course with {self.line.manipulators[next_manip_index].ManipUUID}, evasive action taken")
+                    self.line.log.record(self.line.step_counter, self.ManipUUID, self.heldCarrier, "evade_right")
+                    self.line.manipulators[next_manip_index].shift_rail(self.line.manipulators[next_manip_index].SPEED * self.line.time_unit)
+                elif self.line.manipulators[next_manip_index].state in (ManipulatorState.LIFTING,ManipulatorState.SUBMERGING,ManipulatorState.DRIPPING) and self.distance_rail >= self.line.manipulators[next_manip_index].distance_rail:
+                    if self.line.log.verbose:
+                        print(f"unable to perform rightwise evasion {self.ManipUUID} holding position")
+                    self.line.log.record(self.line.step_counter, self.ManipUUID, self.heldCarrier, "hold_right")
+                    self.hold_position(previous_distance)
+
+            elif previous_distance > target_distance:  # Moving LEFT
+                self.advance_movement(1)
                 prev_manip_index = self.ManipUUID - 2
                 if prev_manip_index > 1:
-                    if manipulators[prev_manip_index].state not in (
+                    if self.line.manipulators[prev_manip_index].state not in (
                     ManipulatorState.LIFTING, ManipulatorState.SUBMERGING,
-                    ManipulatorState.DRIPPING) and self.distance_rail <= manipulators[prev_manip_index].distance_rail and prev_manip_index != self.ManipUUID:
-                        print(
-                            f"{self.ManipUUID} is on collision leftwise course with {manipulators[prev_manip_index].ManipUUID}, evasive action taken")
-                        manipulators[prev_manip_index].distance_rail -= manipulators[prev_manip_index].SPEED
-                    elif manipulators[prev_manip_index].state in (ManipulatorState.LIFTING, ManipulatorState.SUBMERGING,
+                    ManipulatorState.DRIPPING) and self.distance_rail <= self.line.manipulators[prev_manip_index].distance_rail and prev_manip_index != self.ManipUUID:
+                        if self.line.log.verbose:
+                            print(
+                                f"{self.ManipUUID} is on collision leftwise course with {self.line.manipulators[prev_manip_index].ManipUUID}, evasive action taken")
+                        self.line.log.record(self.line.step_counter, self.ManipUUID, self.heldCarrier, "evade_left")
+                        self.line.manipulators[prev_manip_index].shift_rail(-self.line.manipulators[prev_manip_index].SPEED * self.line.time_unit)
+                    elif self.line.manipulators[prev_manip_index].state in (ManipulatorState.LIFTING, ManipulatorState.SUBMERGING,
                                                                   ManipulatorState.DRIPPING) and self.distance_rail <= \
-                            manipulators[prev_manip_index].distance_rail:
-                        print(f"Unable to perform leftwise evasion, {self.ManipUUID} holding position")
-                        self.distance_rail += self.SPEED
+                            self.line.manipulators[prev_manip_index].distance_rail:
+                        if self.line.log.verbose:
+                            print(f"Unable to perform leftwise evasion, {self.ManipUUID} holding position")
+                        self.line.log.record(self.line.step_counter, self.ManipUUID, self.heldCarrier, "hold_left")
+                        self.hold_position(previous_distance)
 
             # Check if we reached the destination
             if self.distance_rail == target_distance:
                 self.position = self.target_position
                 self.operation_timer = 0
+                self.rail_move = None
+
+    def update_planned_movement(self):
+        """
+        Counterpart of update_movement used with a RailPlanner.
+        Moves are planned collision free ahead of time, so the manipulator only follows its RailMove.
+        An evasive move in progress is finished first, a move blocked by a neighbour is planned again in the next step.
+        """
+        if self.state != ManipulatorState.MOVING or self.target_position is None:
+            return
+        if self.evasion_target is not None:
+            self.update_evasion()
+            if self.evasion_target is not None:
+                return
+
+        target_distance = self.line.baths[self.target_position].distanceToStart
+        if self.rail_move is None and self.distance_rail != target_distance:
+            self.rail_move = self.line.rail_planner.plan_move(self, target_distance)
+        if self.rail_move is not None:
+            self.follow_rail_move()
+
+        # Check if we reached the destination
+        if self.distance_rail == target_distance:
+            self.position = self.target_position
+            self.operation_timer = 0
+            self.rail_move = None
+
+    def follow_rail_move(self):
+        """
+        Sets distance_rail to the planned position at the end of the current step.
+        Repeated calls within a single step don't move the manipulator any further.
+        """
+        self.rail_move.elapsed = self.line.step_counter - self.rail_move.start_time + 1
+        self.distance_rail = self.rail_move.position()
+        self.operation_timer = self.rail_move.elapsed
 
+    def update_evasion(self):
+        """
+        Follows an evasive move scheduled by the RailPlanner, updating the position once the evasion bath is reached.
+        """
+        self.follow_rail_move()
+        if self.distance_rail == self.rail_move.target_distance:
+            self.position = self.evasion_target
+            self.evasion_target = None
+            self.rail_move = None
+            self.operation_timer = 0
+
+    def current_rail_move(self):
+        """
+        :return: RailMove towards the target position, started from the current distance_rail if there is none yet
+        """
+        if self.rail_move is None:
+            self.rail_move = RailMove(self.line.step_counter, self.distance_rail, self.line.baths[self.target_position].distanceToStart,
+                                      self.SPEED, self.ACCELERATION_TIME, time_unit=self.line.time_unit)
+        return self.rail_move
+
+    def shift_rail(self, delta):
+        """
+        Pushes the manipulator alongside the rail (evasive action requested by a neighbour).
+        A move in progress continues from the new distance.
+        """
+        self.distance_rail += delta
+        self.rail_move = None
+
+    def hold_position(self, distance):
+        """
+        Reverts the last movement step, the manipulator stops and restarts its move from the given distance in the next step.
+        """
+        self.distance_rail = distance
+        self.rail_move = None
 
     def load_into_line(self):
         """
         Called in simulation step to handle initial carrier processing from the loader into the varnish line.
         :return: side effect - initiates movement for manipulator responsible for 'loading' a carrier into varnishing line
         """
-        carrier = baths[self.position].containedCarrier
-        carrier.get_current_step().completed = True
+        carrier = self.line.baths[self.position].containedCarrier
         carrier.currentStepIndex += 1
         self.heldCarrier = carrier
-        baths[self.position].containedCarrier = None
+        self.line.baths[self.position].containedCarrier = None
         carrier.state = CarrierState.SERVICED
+        self.line.log.record(self.line.step_counter, self.ManipUUID, carrier, "load")
         self.move_to(carrier.get_current_step().bathID)
 
     def dismount_carrier(self):
         """
         Initiates lowering of the carriers
         """
-        print(f"Manip {self.ManipUUID} offloading payload into {baths[self.target_position]}")
+        if self.line.log.verbose:
+            print(f"Manip {self.ManipUUID} offloading payload into {self.line.baths[self.target_position]}")
+        self.line.log.record(self.line.step_counter, self.ManipUUID, self.heldCarrier, "submerge_start")
         self.state = ManipulatorState.SUBMERGING
         self.operation_timer = 0
 
@@ -166,11 +363,14 @@ class Manipulator:
         """
         self.operation_timer += 1
 
-        if self.operation_timer >= self.LIFT_TIME:
-            bath = baths[self.target_position]
+        if self.operation_timer >= self.line.ticks(self.LIFT_TIME):
+            bath = self.line.baths[self.target_position]
             bath.containedCarrier = self.heldCarrier
             bath.containedCarrier.state = CarrierState.BATHING
-            print(f"Manip {self.ManipUUID} offloaded payload into {baths[self.target_position]}")
+            self.line.bathing_baths.add(bath.bathUUID)
+            if self.line.log.verbose:
+                print(f"Manip {self.ManipUUID} offloaded payload into {self.line.baths[self.target_position]}")
+            self.line.log.record(self.line.step_counter, self.ManipUUID, self.heldCarrier, "submerge_end")
             self.heldCarrier = None
             self.target_position = None
             self.state = ManipulatorState.IDLE
@@ -179,10 +379,12 @@ class Manipulator:
         """
         Initiates the process of lifting carrier from bath.
         """
-        print(f"Manip {self.ManipUUID} loading payload from {baths[self.target_position]}, dripping expected")
+        if self.line.log.verbose:
+            print(f"Manip {self.ManipUUID} loading payload from {self.line.baths[self.target_position]}, dripping expected")
         self.operation_timer = 0
-        bath = baths[self.target_position]
+        bath = self.line.baths[self.target_position]
         carrier = bath.containedCarrier
+        self.line.log.record(self.line.step_counter, self.ManipUUID, carrier, "lift_start")
         carrier.state = CarrierState.DRIPPING
         self.state = ManipulatorState.LIFTING
 
@@ -194,8 +396,8 @@ class Manipulator:
         """
         self.operation_timer += 1
 
-        if self.operation_timer >= self.LIFT_TIME:
-            bath = baths[self.target_position]
+        if self.operation_timer >= self.line.ticks(self.LIFT_TIME):
+            bath = self.line.baths[self.target_position]
             carrier = bath.containedCarrier
             carrier.currentStepIndex += 1
             self.state = ManipulatorState.DRIPPING
@@ -203,7 +405,9 @@ class Manipulator:
             self.heldCarrier = carrier
             bath.containedCarrier = None
             self.operation_timer = 0
-            print(f"Manip {self.ManipUUID} loaded payload from {baths[self.target_position]}, dripping to commence")
+            if self.line.log.verbose:
+                print(f"Manip {self.ManipUUID} loaded payload from {self.line.baths[self.target_position]}, dripping to commence")
+            self.line.log.record(self.line.step_counter, self.ManipUUID, carrier, "lift_end")
 
     def drip_carrier(self):
         """
@@ -211,42 +415,106 @@ class Manipulator:
         """
         self.operation_timer += 1
 
-        if self.operation_timer >= self.heldCarrier.get_current_step().dripTime:
+        if self.operation_timer >= self.line.ticks(self.heldCarrier.get_current_step().dripTime):
             self.operation_timer = 0
             self.heldCarrier.state = CarrierState.SERVICED
             self.move_to(self.heldCarrier.get_current_step().bathID)
 
+    def ticks_to_arrival(self):
+        """
+        Used by the event driven engine to predict when a rail move finishes.
+        :return: number of movement steps needed before distance_rail equals the target distance
+        """
+        rail_move = self.current_rail_move()
+        return rail_move.duration - rail_move.elapsed
+
+    def rail_extent(self):
+        """
+        :return: (min, max) distance alongside the rail the manipulator can occupy until its current move finishes
+        """
+        if self.state == ManipulatorState.MOVING and self.target_position is not None:
+            target_distance = self.line.baths[self.target_position].distanceToStart
+            return min(self.distance_rail, target_distance), max(self.distance_rail, target_distance)
+        return self.distance_rail, self.distance_rail
+
+    def advance_movement(self, ticks):
+        """
+        Applies several movement steps at once, used for a single step by update_movement and for
+        collision free idle steps by advance_idle_ticks.
+        :param ticks: number of steps to apply
+        """
+        rail_move = self.current_rail_move()
+        rail_move.elapsed += ticks
+        self.distance_rail = rail_move.position()
+        self.operation_timer += ticks
+
+    def push_ahead(self, neighbour, ticks):
+        """
+        Counterpart of advance_movement for idle steps in which the manipulator pushes a standing neighbour aside,
+        see LineSimulation.pushed_neighbour. The steps until the neighbour is reached are applied at once,
+        the pushes step by step with the same arithmetic as update_movement.
+        :param neighbour: the neighbour in the way
+        :param ticks: number of steps to apply
+        """
+        approach = min(self.line.ticks_to_contact(self) - 1, ticks)
+        self.advance_movement(approach)
+        direction = self.rail_move.direction
+        delta = direction * neighbour.SPEED * self.line.time_unit
+        for _ in range(ticks - approach):
+            self.advance_movement(1)
+            if (self.distance_rail - neighbour.distance_rail) * direction >= 0:
+                neighbour.shift_rail(delta)
+
 
 class RecipeStep:
     """
     Definition of a procedure component defined by target bath and required times.
+    Steps are shared by every carrier following the same template and are not modified during the simulation,
+    progress is tracked by Carrier.currentStepIndex (all steps below the index are completed).
     """
+    __slots__ = ("step_identifier", "bathID", "submersionTime", "dripTime")
     DRIP_TIME = 20 # set to constant for now
     next_id = 0
-    def __init__(self, bid, submersion_time):
-        self.step_identifier = self.next_id
+    def __init__(self, bid, submersion_time, drip_time=None):
+        self.step_identifier = RecipeStep.next_id
         RecipeStep.next_id += 1
         self.bathID = bid  # The bath to use in this step
         self.submersionTime = submersion_time  # Time to submerge the product
-        self.dripTime = RecipeStep.DRIP_TIME  # Time to drip before moving on
-        self.completed = False  # Flag to track completion
+        self.dripTime = RecipeStep.DRIP_TIME if drip_time is None else drip_time  # Time to drip before moving on
 
     def __repr__(self):
-        return f"RecipeStep(Bath: {self.bathID}, Submersion: {self.submersionTime}s, Drip: {self.dripTime}s, Completed: {self.completed})"
+        return f"RecipeStep(Bath: {self.bathID}, Submersion: {self.submersionTime}s, Drip: {self.dripTime}s)"
 
 class RecipeTemplate:
     """
     Template responsible for instantiation of
     procedure lists for carriers.
+    Step data is kept in compact arrays and a single Recipe is shared by all carriers of the template,
+    so the memory needed per carrier doesn't depend on the recipe length.
     """
     def __init__(self, name, step_definitions):
         self.name = name  # Name of the recipe template
         self.step_definitions = step_definitions  # List of (bath_id, submersion_time) tuples
+        self.bath_ids = array("l", (bath_id for bath_id, _ in step_definitions))
+        submersion_times = [submersion_time for _, submersion_time in step_definitions]
+        if all(float(submersion_time).is_integer() for submersion_time in submersion_times):
+            self.submersion_times = array("l", (int(submersion_time) for submersion_time in submersion_times))
+        else:
+            # fractions of a second only matter for lines simulated with a time_unit below a second
+            self.submersion_times = array("d", submersion_times)
+        self.shared_recipe = None # Recipe handed out by create_instance
+        self.shared_drip_time = None # RecipeStep.DRIP_TIME the shared recipe was built with
 
     def create_instance(self):
-        """Generate a new Recipe instance with unique steps."""
-        steps = [RecipeStep(bath_id, submersion_time) for bath_id, submersion_time in self.step_definitions]
-        return Recipe(self.name, steps)
+        """
+        Provides the Recipe shared by the carriers of this template.
+        The recipe is rebuilt only when RecipeStep.DRIP_TIME changed since the last call.
+        """
+        if self.shared_recipe is None or self.shared_drip_time != RecipeStep.DRIP_TIME:
+            steps = tuple(RecipeStep(bath_id, submersion_time) for bath_id, submersion_time in zip(self.bath_ids, self.submersion_times))
+            self.shared_recipe = Recipe(self.name, steps)
+            self.shared_drip_time = RecipeStep.DRIP_TIME
+        return self.shared_recipe
 
 
 class Recipe:
@@ -259,7 +527,7 @@ class Recipe:
         self.recpUUID = Recipe.next_id  # Unique identifier for the recipe
         Recipe.next_id += 1
         self.name = name  # Name of the recipe
-        self.executionList = operations  # List of RecipeStep objects
+        self.executionList = operations  # Sequence of RecipeStep objects
 
     def __repr__(self):
         return f"Recipe(ID={self.recpUUID}, Name={self.name}, Steps={len(self.executionList)})"
@@ -281,7 +549,10 @@ class CarrierState(Enum):
 class Carrier:
     """
     Definition of carriers 'carrying' products for varnish.
+    Only the progress of the carrier is stored per instance (the Recipe is shared, see RecipeTemplate),
+    slots keep the instances small for large work orders.
     """
+    __slots__ = ("carUUID", "requiredProcedure", "currentStepIndex", "state", "operation_timer")
     next_id = 1
     def __init__(self, procedure):
         self.carUUID = Carrier.next_id  # Unique identifier for the recipe
@@ -302,21 +573,470 @@ class Carrier:
         """
         return self.requiredProcedure.executionList[self.currentStepIndex]
 
-    def update_bathe_timer(self):
+    def update_bathe_timer(self, time_unit=1):
         """
         Called by the simulation steps to update timers on submerged carriers, checking whether
         the process is finished or not
+        :param time_unit: length of the simulation step in seconds, see LineSimulation
         """
         if self.state == CarrierState.BATHING:
             self.operation_timer += 1
 
-            if self.operation_timer >= self.get_current_step().submersionTime:
+            submersion_time = self.get_current_step().submersionTime
+            if time_unit != 1:
+                submersion_time = to_ticks(submersion_time, time_unit)
+            if self.operation_timer >= submersion_time:
                 self.state = CarrierState.BATH_COMPLETED
                 self.operation_timer = 0
         else:
             raise RuntimeError("ERROR: UNEXPECTED STATE")
 
 
+class WorkOrderStream:
+    """
+    Work order provided lazily as an iterable of (recipe name, release time) records, see read_order_file.
+    Carriers are created only once they enter the line, so arbitrarily long order histories can be replayed
+    without materializing the whole work order up front.
+    """
+    def __init__(self, records, templates):
+        """
+        :param records: iterable of (recipe name, release time in s) pairs, in the order of entering the line
+        :param templates: dictionary of recipe name -> RecipeTemplate
+        """
+        self.records = iter(records)
+        self.templates = templates
+        self.next_record = None # (template, release time) read ahead from the records
+        self.inserted = [] # (Carrier, release time) placed in front of the records by insert, the last one enters first
+        self.released = 0 # number of carriers handed to the line so far
+        self.read_ahead()
+
+    def read_ahead(self):
+        record = next(self.records, None)
+        if record is None:
+            self.next_record = None
+            return
+        name, release_time = record
+        if name not in self.templates:
+            raise ValueError(f"Unknown recipe {name!r} in the work order, expected one of {sorted(self.templates)}")
+        self.next_record = (self.templates[name], float(release_time))
+
+    @property
+    def exhausted(self):
+        return self.next_record is None and not self.inserted
+
+    @property
+    def next_release_time(self):
+        """
+        :return: release time of the next carrier in s (it enters in the first step reaching it), None once exhausted
+        """
+        if self.inserted:
+            return self.inserted[-1][1]
+        return None if self.next_record is None else self.next_record[1]
+
+    def insert(self, carrier, release_time):
+        """
+        Places an existing carrier in front of the remaining work order, e.g. a hot order (see disturbances.py).
+        :param carrier: Carrier following one of the recipes of the stream
+        :param release_time: release time in s
+        """
+        name = carrier.requiredProcedure.name
+        if name not in self.templates:
+            raise ValueError(f"Unknown recipe {name!r} in the work order, expected one of {sorted(self.templates)}")
+        self.inserted.append((carrier, float(release_time)))
+
+    def pop(self):
+        """
+        :return: the last inserted Carrier, a new Carrier for the next record of the work order otherwise
+        """
+        if self.inserted:
+            self.released += 1
+            return self.inserted.pop()[0]
+        template, _ = self.next_record
+        self.read_ahead()
+        self.released += 1
+        return Carrier(template.create_instance())
+
+
+def read_order_file(path):
+    """
+    Reads work order records one at a time, so the file is never loaded as a whole.
+    CSV files are expected to have 'recipe' and 'release_time' columns, any other file is read as JSONL
+    with one {"recipe": ..., "release_time": ...} object per line. Missing release times default to 0.
+    :param path: path of the order file
+    :return: generator of (recipe name, release time) pairs
+    """
+    with open(path, newline="") as file:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(file):
+                yield row["recipe"], row.get("release_time") or 0
+        else:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["recipe"], record.get("release_time", 0)
+
+
+class LogMode(Enum):
+    """
+    Enumeration of logging modes of the simulation.
+    """
+    VERBOSE = "Verbose" # every action and simulation step is printed
+    SUMMARY = "Summary" # only the result of the run is printed
+    EVENTS = "Events" # result is printed, actions are recorded as structured events and written into a file in bulk
+    SILENT = "Silent" # nothing is printed nor recorded
+
+class EventLog:
+    """
+    Decides what the simulation prints and records.
+    Flags are resolved once on creation, so the simulation step only checks a boolean before formatting anything.
+    Recorded events are (time step, manipulator id, carrier id, event type) rows, buffered in memory
+    and appended to a CSV file whenever the buffer fills up or the run finishes.
+    """
+    BUFFER_SIZE = 10000 # number of events kept in memory before being written out
+
+    def __init__(self, mode=LogMode.VERBOSE, path=None):
+        self.mode = mode
+        self.verbose = mode == LogMode.VERBOSE
+        self.summary = mode != LogMode.SILENT
+        self.events = mode == LogMode.EVENTS
+        self.path = path # target file of the event stream
+        self.buffer = []
+
+        if self.events:
+            if path is None:
+                raise ValueError("Event log mode requires a target file path")
+            with open(path, "w", newline="") as file:
+                csv.writer(file).writerow(["time", "manipulator", "carrier", "event"])
+
+    def record(self, time, manipulator_id, carrier, event):
+        """
+        Stores a single event, does nothing unless the EVENTS mode is used.
+        :param time: simulation step of the event
+        :param manipulator_id: ManipUUID of the acting manipulator (None for loader/off loader events)
+        :param carrier: affected Carrier object or None
+        :param event: short event type descriptor, such as "move" or "lift_start"
+        """
+        if not self.events:
+            return
+        self.buffer.append((time, manipulator_id, carrier.carUUID if carrier is not None else None, event))
+        if len(self.buffer) >= self.BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends buffered events to the target file.
+        """
+        if not self.buffer:
+            return
+        with open(self.path, "a", newline="") as file:
+            csv.writer(file).writerows(self.buffer)
+        self.buffer.clear()
+
+
+class SimulationStats:
+    """
+    Opt-in profiling of the simulation hot path, see the stats argument of LineSimulation.
+    Attaching the stats to a line wraps the manipulator state handlers, the simulation phases and the passes of check_baths
+    of that line only (as instance attributes), so lines without stats run the plain methods with no overhead at all.
+    Collected values:
+        calls/times - number of calls and cumulative wall time in seconds per handler/phase name
+                      (times are inclusive, e.g. update_movement contains the time of a dismount_carrier it triggers)
+        steps - number of regular simulation steps
+        idle_steps - regular steps in which no manipulator or carrier changed its state
+        skipped_steps - steps jumped over by the event driven engine (idle by definition)
+    """
+    MANIPULATOR_HANDLERS = ("update_movement", "lower_carrier", "lift_carrier", "drip_carrier", "load_into_line",
+                            "dismount_carrier", "mount_carrier", "move_to")
+    LINE_PHASES = ("move_manipulators", "check_baths", "task_loading", "update_bathing", "task_pickups",
+                   "ticks_until_next_event", "advance_idle_ticks")
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.times = defaultdict(float)
+        self.steps = 0
+        self.idle_steps = 0
+        self.skipped_steps = 0
+
+    def timed(self, method, name):
+        """
+        :return: wrapper of the bound method counting its calls and accumulating its wall time under the given name
+        """
+        calls = self.calls
+        times = self.times
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                times[name] += perf_counter() - start
+                calls[name] += 1
+        return wrapper
+
+    def attach(self, line):
+        """
+        Installs the wrappers on the given line and its manipulators.
+        """
+        for manipulator in line.manipulators:
+            for name in self.MANIPULATOR_HANDLERS:
+                setattr(manipulator, name, self.timed(getattr(manipulator, name), name))
+        for name in self.LINE_PHASES:
+            setattr(line, name, self.timed(getattr(line, name), name))
+
+        step = self.timed(line.step, "step")
+        def counted_step():
+            before = self.state_signature(line)
+            done = step()
+            self.steps += 1
+            if self.state_signature(line) == before:
+                self.idle_steps += 1
+            return done
+        line.step = counted_step
+
+        skip_idle_steps = self.timed(line.skip_idle_steps, "skip_idle_steps")
+        def counted_skip():
+            skipped = skip_idle_steps()
+            self.skipped_steps += skipped
+            return skipped
+        line.skip_idle_steps = counted_skip
+
+    @staticmethod
+    def state_signature(line):
+        return (tuple(manipulator.state for manipulator in line.manipulators),
+                tuple(None if bath.containedCarrier is None else (bath.containedCarrier.carUUID, bath.containedCarrier.state)
+                      for bath in line.baths))
+
+    def as_dict(self):
+        """
+        :return: JSON serializable copy of the collected values
+        """
+        return {
+            "steps": self.steps,
+            "idle_steps": self.idle_steps,
+            "skipped_steps": self.skipped_steps,
+            "calls": dict(self.calls),
+            "times": dict(self.times),
+        }
+
+    def print_report(self):
+        total = self.times.get("step", 0.0) + self.times.get("skip_idle_steps", 0.0)
+        print(f"{self.steps} steps ({self.idle_steps} idle), {self.skipped_steps} skipped steps, {total:.3f}s in total")
+        for name, spent in sorted(self.times.items(), key=lambda item: item[1], reverse=True):
+            share = spent / total if total else 0
+            print(f"{name:<24} {self.calls[name]:>10} calls {spent:9.4f}s {share:6.1%} {spent / self.calls[name] * 1e6:9.2f}us/call")
+
+
+class RailPlanner:
+    """
+    Collision subsystem working on the planned rail trajectories of all manipulators sharing the rail.
+    Replaces the step by step collision handling of update_movement when passed to LineSimulation.
+
+    Manipulators keep their order on the rail, so only neighbouring pairs can collide and each pair has to stay at least
+    safety_gap meters apart at the end of every step. Every move is planned once, when it starts, on a first come first served
+    basis - moves planned earlier are never changed:
+        - a manipulator at rest in the way (IDLE, or MOVING without a planned move) is sent to the nearest bath
+          of its range which clears the move, evasions cascade further down the rail if needed,
+        - otherwise the move waits at its start until the planned trajectory of the neighbour clears it,
+        - if the neighbour ends up in the way and can't be moved (e.g. it is lifting), the move is blocked
+          and planned again in the next step.
+    The work therefore scales with the number of moves, not with steps x manipulators.
+    """
+    def __init__(self, safety_gap=1.0):
+        """
+        :param safety_gap: minimal distance in meters between two neighbouring manipulators
+        """
+        self.safety_gap = safety_gap
+        self.line = None # LineSimulation the planner belongs to, assigned by the line
+        self.planned_moves = 0
+        self.evasions = 0
+        self.waits = 0 # planned moves which had to wait for a neighbour
+
+    def position_at(self, manipulator, time, pending=None):
+        """
+        :param time: simulation step
+        :param pending: uncommitted evasions, dictionary of manipulator -> (RailMove, bath id)
+        :return: planned rail distance of the manipulator at the end of the step
+        """
+        rail_move = pending[manipulator][0] if pending and manipulator in pending else manipulator.rail_move
+        if rail_move is None:
+            return manipulator.distance_rail
+        return rail_move.position(time - rail_move.start_time + 1)
+
+    def final_position(self, manipulator, pending):
+        rail_move = pending[manipulator][0] if manipulator in pending else manipulator.rail_move
+        return manipulator.distance_rail if rail_move is None else rail_move.target_distance
+
+    def end_time(self, manipulator, pending):
+        """
+        :return: last step of the planned move of the manipulator (or the current step if there is none)
+        """
+        rail_move = pending[manipulator][0] if manipulator in pending else manipulator.rail_move
+        if rail_move is None:
+            return self.line.step_counter
+        return rail_move.start_time + rail_move.duration - 1
+
+    @staticmethod
+    def can_evade(manipulator):
+        """
+        :return: True for manipulators standing still without an obligation to stay, such as lifting or dripping
+        """
+        return manipulator.rail_move is None and manipulator.state in (ManipulatorState.IDLE, ManipulatorState.MOVING)
+
+    def evasion_bath(self, manipulator, limit, direction):
+        """
+        :return: the nearest bath within the range of the manipulator which lies beyond the limit distance, None if there is none
+        """
+        baths = self.line.baths
+        candidates = [bath_id for bath_id in manipulator.operatingRange
+                      if (baths[bath_id].distanceToStart - limit) * direction >= -RailMove.EPSILON]
+        if not candidates:
+            return None
+        return min(candidates) if direction > 0 else max(candidates)
+
+    def plan_move(self, manipulator, target_distance):
+        """
+        Plans a move of the manipulator starting in the current step, together with the evasions it requires.
+        :return: the planned RailMove, None if the move is blocked
+        """
+        pending = {}
+        rail_move = self.plan(manipulator, target_distance, self.line.step_counter, pending)
+        if rail_move is None:
+            return None
+
+        self.planned_moves += 1
+        if rail_move.wait:
+            self.waits += 1
+            if self.line.log.verbose:
+                print(f"Manipulator {manipulator.ManipUUID} waits {self.line.seconds(rail_move.wait)}s for the rail to clear")
+            self.line.log.record(self.line.step_counter, manipulator.ManipUUID, manipulator.heldCarrier, "wait")
+        for neighbour, (evasion, bath_id) in pending.items():
+            self.evasions += 1
+            if self.line.log.verbose:
+                print(f"Manipulator {neighbour.ManipUUID} evading to {bath_id} to clear the way for {manipulator.ManipUUID}")
+            self.line.log.record(self.line.step_counter, neighbour.ManipUUID, neighbour.heldCarrier, "evade")
+            neighbour.rail_move = evasion
+            neighbour.evasion_target = bath_id
+            neighbour.update_evasion()
+        return rail_move
+
+    def plan(self, manipulator, target_distance, now, pending):
+        """
+        Recursive part of plan_move.
+        :param pending: evasions planned so far, filled with the evasions required by this move
+        :return: RailMove of the manipulator, None if it can't be planned
+        """
+        start_distance = manipulator.distance_rail
+        if target_distance == start_distance:
+            return RailMove(now, start_distance, target_distance, manipulator.SPEED, manipulator.ACCELERATION_TIME,
+                            time_unit=self.line.time_unit)
+        direction = 1 if target_distance > start_distance else -1
+        neighbour_index = manipulator.ManipUUID - 1 + direction
+        if not 0 <= neighbour_index < len(self.line.manipulators):
+            return RailMove(now, start_distance, target_distance, manipulator.SPEED, manipulator.ACCELERATION_TIME,
+                            time_unit=self.line.time_unit)
+        neighbour = self.line.manipulators[neighbour_index]
+
+        limit = target_distance + direction * self.safety_gap
+        if (self.final_position(neighbour, pending) - limit) * direction < -RailMove.EPSILON:
+            # neighbour would end up in the way
+            if neighbour in pending or not self.can_evade(neighbour):
+                return None
+            bath_id = self.evasion_bath(neighbour, limit, direction)
+            if bath_id is None:
+                return None
+            evasion = self.plan(neighbour, self.line.baths[bath_id].distanceToStart, now, pending)
+            if evasion is None:
+                return None
+            pending[neighbour] = (evasion, bath_id)
+
+        # moving away from us, the neighbour clears the way at the latest once its move is done
+        for wait in range(max(self.end_time(neighbour, pending) - now, 0) + 2):
+            rail_move = RailMove(now, start_distance, target_distance, manipulator.SPEED, manipulator.ACCELERATION_TIME, wait,
+                                 self.line.time_unit)
+            end = max(now + rail_move.duration - 1, self.end_time(neighbour, pending))
+            if self.keeps_gap(neighbour, rail_move, direction, now, end, pending):
+                return rail_move
+        return None
+
+    @staticmethod
+    def phase_times(rail_move, start, end):
+        """
+        :return: steps from start to end around which the speed profile of the move changes (start, end of the wait,
+            of the ramps and of the cruise)
+        """
+        elapsed = [rail_move.wait, rail_move.duration]
+        for phase_end in (rail_move.ramp_time, rail_move.ramp_time + rail_move.cruise_time, rail_move.total_time):
+            elapsed.append(rail_move.wait + phase_end / rail_move.time_unit)
+        times = set()
+        for value in elapsed:
+            for time in (math.floor(value), math.ceil(value)):
+                time += rail_move.start_time - 1
+                if start <= time <= end:
+                    times.add(time)
+        return times
+
+    def keeps_gap(self, neighbour, rail_move, direction, now, end, pending):
+        """
+        Checks the safety gap between the planned move of a manipulator and its neighbour at the end of every step from now to end.
+        Both trajectories are piecewise quadratic in time, so in between the phase changes of the two moves the gap is
+        smallest at one of the ends or next to the vertex of its parabola, only these steps are checked. The number
+        of checks therefore doesn't depend on the time unit of the line.
+        :param rail_move: planned move of the manipulator starting at now
+        :param direction: direction of the move, towards the neighbour
+        :return: True if the gap is kept in every step
+        """
+        def gap(time):
+            return (self.position_at(neighbour, time, pending) - rail_move.position(time - now + 1)) * direction
+
+        neighbour_move = pending[neighbour][0] if neighbour in pending else neighbour.rail_move
+        times = {now, end} | self.phase_times(rail_move, now, end)
+        if neighbour_move is not None:
+            times |= self.phase_times(neighbour_move, now, end)
+        if end - now < 4 * len(times):
+            # short span, checking every step is cheaper
+            return all(gap(time) >= self.safety_gap - RailMove.EPSILON for time in range(now, end + 1))
+        times = sorted(times)
+        checked = set(times)
+        for first, last in zip(times, times[1:]):
+            if last - first < 2:
+                continue
+            middle = (first + last) // 2
+            checked.add(middle)
+            first_gap, middle_gap, last_gap = gap(first), gap(middle), gap(last)
+            first_slope = (middle_gap - first_gap) / (middle - first)
+            curvature = ((last_gap - middle_gap) / (last - middle) - first_slope) / (last - first)
+            if curvature > 0:
+                vertex = (first + middle) / 2 - first_slope / (2 * curvature)
+                for time in range(math.floor(vertex) - 1, math.ceil(vertex) + 2):
+                    if first < time < last:
+                        checked.add(time)
+        return all(gap(time) >= self.safety_gap - RailMove.EPSILON for time in checked)
+
+    def find_conflicts(self, start, end):
+        """
+        Sweeps the planned trajectories of all neighbouring pairs and reports the steps in which they violate the safety gap.
+        Only steps in which one of the pair moves are checked, when both stand still a single check covers the whole span.
+        :return: list of (left manipulator id, right manipulator id, first step, last step) intervals
+        """
+        conflicts = []
+        manipulators = self.line.manipulators
+        for left, right in zip(manipulators, manipulators[1:]):
+            times = {start}
+            for manipulator in (left, right):
+                if manipulator.rail_move is not None:
+                    move_start = max(start, manipulator.rail_move.start_time)
+                    move_end = min(end, manipulator.rail_move.start_time + manipulator.rail_move.duration)
+                    times.update(range(move_start, move_end + 1))
+            interval = None
+            for time in sorted(times):
+                if self.position_at(right, time) - self.position_at(left, time) < self.safety_gap - RailMove.EPSILON:
+                    if interval is not None and interval[3] == time - 1:
+                        interval[3] = time
+                    else:
+                        interval = [left.ManipUUID, right.ManipUUID, time, time]
+                        conflicts.append(interval)
+        return [tuple(interval) for interval in conflicts]
+
+
 """
 In this section of the code, input parameters of the code are entered and 
 then processed by object constructors.
@@ -375,56 +1095,57 @@ recipe_template2 = RecipeTemplate("Test2", [(0, 0), (5, 4), (10, 3), (12,5), (17
 recipe_template3 = RecipeTemplate("Test3", [(0, 0), (5, 4), (10,2), (12,5) ,(17, 3), (23, 0)])
 recipe_template4 = RecipeTemplate("Test4", [(0,0),(4,50),(8,60),(13,13),(17,10),(23,0)])
 
-
-### Collection Instantiation & readback
 """
-Object instantiation is handled in this block.
+Recipe templates which can be referenced by name, e.g. from order files (see read_order_file) or sweep definitions.
 """
-baths = [
-    Bath(name, distance / 1000, submergable=flag)  # converts to m from original measurement unit
-    for name, distance, flag in bathData
-]
+RECIPE_TEMPLATES = {template.name: template for template in (recipe_template1, recipe_template2, recipe_template3, recipe_template4)}
 
 
-manipulators = [
-    Manipulator(reach,startingPosition)
-    for reach, startingPosition in manipData
-]
-
-"""
-Carrier definition corresponds to the 'list' of carriers/products which need to be serviced (and their accompanying procedure).
-This is then converted to a stack data structure under the FIFO ruleset.
-"""
-carrier_definition = [Carrier(recipe_template1.create_instance()),Carrier(recipe_template4.create_instance()),Carrier(recipe_template2.create_instance()),Carrier(recipe_template3.create_instance()),Carrier(recipe_template1.create_instance())]
-carriers_to_move = len(carrier_definition)
-work_order = deque(list(reversed(carrier_definition)))
-finished_carriers = deque()
-
 """
-Code runs this function before proceeding to the simulation step. 
-Terminates if the configuration is unsolvable.
+Code runs this function before proceeding to the simulation step.
+Returns False if the configuration is unsolvable.
 """
-def validate_work_order(manipulator_list, workorder_definition):
-    # Map of which manipulators can reach which baths
-    reachable_positions = {}
-    for manipulator in manipulator_list:
-        reachable_positions[manipulator.ManipUUID] = set(manipulator.operatingRange)  # Store as a set for faster lookup
-
+def validate_work_order(manipulator_list, workorder_definition, last_bath=23, verbose=True):
     # Map of required bath positions for each carrier
     required_positions = defaultdict(list)
     for carrier in workorder_definition:
         for step in carrier.requiredProcedure.executionList:
             required_positions[carrier.carUUID].append(step.bathID)
 
-    print("Reachable Positions:", reachable_positions)
-    print("Required Positions:", required_positions)
+    return validate_bath_sequences(manipulator_list, required_positions, last_bath, verbose)
+
+
+def validate_recipe_templates(manipulator_list, templates, last_bath=23, verbose=True):
+    """
+    Counterpart of validate_work_order for streamed work orders, whose carriers are not known up front.
+    Validates every recipe which may appear in the stream instead.
+    """
+    required_positions = {name: list(template.bath_ids) for name, template in templates.items()}
+    return validate_bath_sequences(manipulator_list, required_positions, last_bath, verbose, subject="Recipe")
+
+
+def validate_bath_sequences(manipulator_list, required_positions, last_bath=23, verbose=True, subject="Carrier"):
+    """
+    :param required_positions: dictionary of carrier (or recipe) identifier -> list of required bath ids
+    :param subject: name of the validated items used in printed messages
+    :return: True if every bath sequence can be moved through the line
+    """
+    # Map of which manipulators can reach which baths
+    reachable_positions = {}
+    for manipulator in manipulator_list:
+        reachable_positions[manipulator.ManipUUID] = set(manipulator.operatingRange)  # Store as a set for faster lookup
+
+    if verbose:
+        print("Reachable Positions:", reachable_positions)
+        print("Required Positions:", required_positions)
 
     # Validation logic
     is_solvable = True
     for carrier_id, bath_sequence in required_positions.items():
         # Check start and end bath validity
-        if bath_sequence[0] != 0 or bath_sequence[-1] != 23:
-            print(f"Carrier {carrier_id} is invalid: does not start at bath[0] or end at bath[23]")
+        if bath_sequence[0] != 0 or bath_sequence[-1] != last_bath:
+            if verbose:
+                print(f"{subject} {carrier_id} is invalid: does not start at bath[0] or end at bath[{last_bath}]")
             is_solvable = False
             continue
 
@@ -433,18 +1154,17 @@ def validate_work_order(manipulator_list, workorder_definition):
             bath_a = bath_sequence[i]
             bath_b = bath_sequence[i + 1]
             if not any(bath_a in manipulator and bath_b in manipulator for manipulator in reachable_positions.values()):
-                print(f"Carrier {carrier_id} is invalid: No manipulator can move from bath[{bath_a}] to bath[{bath_b}]")
+                if verbose:
+                    print(f"{subject} {carrier_id} is invalid: No manipulator can move from bath[{bath_a}] to bath[{bath_b}]")
                 is_solvable = False
                 break
         else:
-            print(f"Carrier {carrier_id} is valid!")
+            if verbose:
+                print(f"{subject} {carrier_id} is valid!")
 
-    if not is_solvable:
+    if not is_solvable and verbose:
         print("The initial bath and workorder definition is unsolvable, terminating")
-        exit(1)
-
-
-validate_work_order(manipulators,carrier_definition)
+    return is_solvable
 
 
 """
@@ -455,151 +1175,716 @@ def print_collection(collection):
         print(item)
 
 
-def provide_states():
-    print_collection(baths)
-    print_collection(manipulators)
-    print_collection(carrier_definition)
-    print_collection(work_order)
+class Dispatcher:
+    """
+    Decides which idle manipulators serve which waiting carriers, replacing the tasking of check_baths when passed
+    to LineSimulation. The base class keeps the greedy choice of check_baths (the first idle manipulator in line order
+    takes the first carrier it can serve), subclasses override select, see dispatch_search.py.
+    """
+    def __init__(self, allow_wait=False, max_alternatives=None):
+        """
+        :param allow_wait: also offer alternatives leaving a manipulator idle although it could serve a carrier
+        :param max_alternatives: maximal number of alternatives enumerated per step
+        """
+        self.allow_wait = allow_wait
+        self.max_alternatives = max_alternatives
+
+    def select(self, line, alternatives):
+        """
+        :param line: LineSimulation in the middle of a step, manipulators moved and bathing timers updated
+        :param alternatives: list of assignment tuples, see LineSimulation.dispatch_alternatives
+        :return: index of the chosen alternative
+        """
+        return 0
 
-provide_states()
 
-### non object function definitions
-def move_manipulators():
+### Simulation
+class LineSimulation:
     """
-    In this function, for each manipulator in a line, a state is checked
-    and a corresponding function is called to update and/or switch operations.
+    Simulation of a single assembly line.
+    The object owns all the line state (baths, manipulators, work order and finished carriers),
+    therefore any number of independent lines can be instantiated and simulated within one process.
+
+    The primary simulation loop first handles initial and exit stack states,
+    the loop is popping new carrier into a line every time the first slot of the line is available, until there are
+    carriers to be processed.
+
+    Finally the update_simulation function is called which by extension refers to check_baths and move_manipulators functions.
+    As such, on every simulation loop iteration (which by design corresponds to one second) every manipulator and bath is checked for potential
+    task allocations and status updates.
+
+    Choice of the time unit is mostly arbitrary, time_unit sets the length of a step in seconds (e.g. 0.001 for milliseconds).
+    Timing parameters stay in seconds (LIFT_TIME, SPEED, DRIP_TIME, submersion and release times) and are converted to whole
+    steps by ticks, the step counter, deque times and logged times are integer steps (see seconds).
+    Since each validation is automatic, the overhead on manipulator assignments is very low.
+    It is up to debate, whether the approach isn't "too greedy" from the optimization perspective.
+    A Dispatcher can take over the tasking, dispatch_search.py searches for the assignments minimising the total cycle time.
+
+    With event_driven enabled, the loop does not iterate over steps in which nothing but timers and rail positions change.
+    Instead, after each regular step it computes the number of such idle steps until the next timer threshold, rail arrival
+    or tasking (see ticks_until_next_event) and jumps over them, producing identical deque times and total cycle time.
+    The number of regular steps then depends on the events of the line, not on time_unit, except while a manipulator
+    pushes a moving neighbour aside (update_movement does so step by step, a RailPlanner plans such moves collision free).
+
+    The work order is either a list of carriers or a WorkOrderStream. A stream is pulled lazily whenever the line entry
+    is free and the release time of the next order has passed, only a bounded history of finished carriers and
+    deque times is kept, so the memory use doesn't grow with the length of the replayed order history.
     """
-    for manipulator in manipulators:
-        if manipulator.state == ManipulatorState.MOVING:
-            manipulator.update_movement()
+    MAX_STEPS = 10000 # overflow control in s, for streamed work orders counted from the last carrier entering/leaving the line
+    STREAM_HISTORY = 1000 # finished carriers and deque times kept for streamed work orders
 
-        if manipulator.state == ManipulatorState.SUBMERGING:
-            manipulator.lower_carrier()
-            continue
+    def __init__(self, bath_data, manip_data, work_order, event_driven=False, log=None, stats=None, rail_planner=None,
+                 dispatcher=None, time_unit=1):
+        """
+        :param bath_data: list of (name, distance in mm, submergable flag) tuples, see bathData
+        :param manip_data: list of (operating range, starting position) tuples, see manipData
+        :param work_order: carriers in the order in which they enter the line, or a WorkOrderStream
+        :param event_driven: skip simulation steps in which only timers change
+        :param log: EventLog deciding what is printed/recorded, prints everything by default
+        :param stats: SimulationStats collecting the profile of the run, no profiling by default
+        :param rail_planner: RailPlanner resolving collisions ahead of time, the step by step collision handling of
+            update_movement is used by default
+        :param dispatcher: Dispatcher tasking the idle manipulators, the greedy tasking of check_baths is used by default
+        :param time_unit: length of a simulation step in seconds
+        """
+        if time_unit <= 0:
+            raise ValueError(f"The time unit has to be positive, got {time_unit}")
+        self.time_unit = time_unit
+        self.log = log if log is not None else EventLog()
+        self.dispatcher = dispatcher
+        self.rail_planner = rail_planner
+        if rail_planner is not None:
+            rail_planner.line = self
+        self.baths = [
+            Bath(name, distance / 1000, submergable=flag, bath_id=index)  # converts to m from original measurement unit
+            for index, (name, distance, flag) in enumerate(bath_data)
+        ]
+        self.manipulators = [
+            Manipulator(reach, starting_position, self, manip_id=index + 1)
+            for index, (reach, starting_position) in enumerate(manip_data)
+        ]
+
+        # Index of manipulators able to service each bath (in line order) together with sets of bath ids
+        # which may require an action. The sets are filled on state transitions and stale entries are dropped lazily,
+        # so the per step checks only touch baths which actually changed.
+        self.servicing_manipulators = {bath.bathUUID: [] for bath in self.baths}
+        for manipulator in self.manipulators:
+            for bath_id in manipulator.operatingRange:
+                self.servicing_manipulators[bath_id].append(manipulator)
+        self.awaiting_load = set() # baths holding an UNSERVICED carrier
+        self.bathing_baths = set() # baths holding a BATHING carrier
+        self.completed_baths = set() # baths holding a BATH_COMPLETED carrier
+
+        if isinstance(work_order, WorkOrderStream):
+            # Carriers are created on demand, carriers_to_move grows as they enter the line
+            self.order_stream = work_order
+            self.carrier_definition = []
+            self.carriers_to_move = 0
+            self.work_order = deque()
+            self.finished_carriers = deque(maxlen=self.STREAM_HISTORY)
+            self.deque_times = deque(maxlen=self.STREAM_HISTORY)
+            self.is_work_order_processed = work_order.exhausted
+        else:
+            # Carrier definition corresponds to the 'list' of carriers/products which need to be serviced (and their accompanying procedure).
+            # This is then converted to a stack data structure under the FIFO ruleset.
+            self.order_stream = None
+            self.carrier_definition = list(work_order)
+            self.carriers_to_move = len(self.carrier_definition)
+            self.work_order = deque(reversed(self.carrier_definition))
+            self.finished_carriers = deque()
+            self.deque_times = []
+            self.is_work_order_processed = False
+        self.finished_count = 0
+        self.first_deque_time = None
+        self.last_progress = 0 # step of the last streamed carrier entering/leaving the line, see MAX_STEPS
+
+        self.event_driven = event_driven
+        self.is_work_order_done = False
+        self.step_counter = 0 # one step is equal to time_unit seconds
+
+        self.stats = stats
+        if stats is not None:
+            stats.attach(self)
+
+    def ticks(self, seconds):
+        """
+        :return: number of steps needed for the given time in seconds, see to_ticks
+        """
+        if self.time_unit == 1 and type(seconds) is int:
+            return seconds # the common case, without a call
+        return to_ticks(seconds, self.time_unit)
 
-        if manipulator.state == ManipulatorState.LIFTING:
-            manipulator.lift_carrier()
-            continue
+    def seconds(self, ticks):
+        """
+        :return: the given number of steps in seconds
+        """
+        return round(ticks * self.time_unit, 9)
 
-        if manipulator.state == ManipulatorState.DRIPPING:
-            manipulator.drip_carrier()
-            continue
+    def validate(self):
+        """
+        :return: True if every carrier of the work order can be moved through the line
+        """
+        if self.order_stream is not None:
+            return validate_recipe_templates(self.manipulators, self.order_stream.templates, last_bath=len(self.baths) - 1,
+                                             verbose=self.log.verbose)
+        return validate_work_order(self.manipulators, self.carrier_definition, last_bath=len(self.baths) - 1,
+                                   verbose=self.log.verbose)
+
+    def provide_states(self):
+        print_collection(self.baths)
+        print_collection(self.manipulators)
+        print_collection(self.carrier_definition)
+        print_collection(self.work_order)
+
+    @property
+    def avg_time_between(self):
+        """
+        :return: average number of steps between two consecutive carriers leaving the line
+        """
+        if self.finished_count > 1:
+            # the differences of consecutive deque times sum up to the span between the first and the last one
+            return (self.deque_times[-1] - self.first_deque_time) / (self.finished_count - 1)
+        return 0  # Default to 0 if there aren't enough values
+
+    def is_entry_ready(self):
+        """
+        :return: True if a new carrier can be placed on the line entry in the current step
+        """
+        if self.baths[0].containedCarrier is not None or self.is_work_order_processed:
+            return False
+        return self.order_stream is None or self.ticks(self.order_stream.next_release_time) <= self.step_counter
 
-        if manipulator.position == 0 and baths[0].containedCarrier is not None and baths[0].containedCarrier.state.TO_BE_LOADED and manipulator.heldCarrier is None:
-            manipulator.load_into_line()
+    def pop_carrier(self):
+        """
+        Takes the next carrier of the work order, marking the work order as processed after its last carrier.
+        """
+        if self.order_stream is None:
+            carrier = self.work_order.pop()
+            if len(self.work_order) == 0:
+                self.is_work_order_processed = True
+            return carrier
+
+        carrier = self.order_stream.pop()
+        self.carriers_to_move += 1
+        self.last_progress = self.step_counter
+        if self.order_stream.exhausted:
+            self.is_work_order_processed = True
+        return carrier
+
+    def candidate_baths(self, bath_ids, state):
+        """
+        Filters one of the tracked bath id sets, dropping ids whose carrier is no longer in the expected state.
+        :param bath_ids: awaiting_load, bathing_baths or completed_baths
+        :param state: CarrierState the tracked baths should contain
+        :return: sorted list of bath ids holding a carrier in the given state
+        """
+        valid = []
+        for bath_id in list(bath_ids):
+            carrier = self.baths[bath_id].containedCarrier
+            if carrier is not None and carrier.state == state:
+                valid.append(bath_id)
+            else:
+                bath_ids.discard(bath_id)
+        valid.sort()
+        return valid
+
+    def idle_manipulators_for(self, bath_ids):
+        """
+        :return: idle manipulators servicing at least one of the given baths, in line order
+        """
+        manipulator_ids = set()
+        for bath_id in bath_ids:
+            for manipulator in self.servicing_manipulators[bath_id]:
+                if manipulator.state == ManipulatorState.IDLE:
+                    manipulator_ids.add(manipulator.ManipUUID)
+        return [self.manipulators[manipulator_id - 1] for manipulator_id in sorted(manipulator_ids)]
+
+    def may_load(self, manipulator):
+        """
+        :param manipulator: manipulator standing at the line entry
+        :return: True if it takes the carrier tasked for loading there
+        """
+        carrier = self.baths[0].containedCarrier
+        return carrier is not None and carrier.state == CarrierState.TO_BE_LOADED and manipulator.heldCarrier is None
 
-        elif manipulator.position == manipulator.target_position and baths[manipulator.position].containedCarrier is None:
-            manipulator.dismount_carrier()
+    def move_manipulators(self):
+        """
+        In this function, for each manipulator in a line, a state is checked
+        and a corresponding function is called to update and/or switch operations.
+        """
+        baths = self.baths
+        for manipulator in self.manipulators:
+            if manipulator.state == ManipulatorState.MOVING:
+                manipulator.update_movement()
 
-        elif manipulator.position == manipulator.target_position and manipulator.heldCarrier is None and baths[manipulator.position].containedCarrier.state == CarrierState.BATH_SERVICED:
-            manipulator.mount_carrier()
+            if manipulator.state == ManipulatorState.SUBMERGING:
+                manipulator.lower_carrier()
+                continue
 
+            if manipulator.state == ManipulatorState.LIFTING:
+                manipulator.lift_carrier()
+                continue
 
-def check_baths():
-    """
-    In this function, each bath is checked against its respective manipulator operating range twice.
-    First, whether a loader has a new carrier available, secondly, whether carrier is ready to be lifted and proceed to a new step.
-    Furthermore,  bathing timers are updated from this function call.
-    """
-    for manipulator in manipulators:
-        for bath in baths:
-            if bath.bathUUID in manipulator.operatingRange and bath.containedCarrier and bath.containedCarrier.state == CarrierState.UNSERVICED and manipulator.state == ManipulatorState.IDLE:
-                print(f"Tasking manip {manipulator.ManipUUID} with servicing {bath.containedCarrier} at bath{bath}")
-                bath.containedCarrier.state = CarrierState.TO_BE_LOADED
-                manipulator.move_to(bath.bathUUID)
+            if manipulator.state == ManipulatorState.DRIPPING:
+                manipulator.drip_carrier()
                 continue
 
-    for bath in baths:
-        if bath.containedCarrier is not None and bath.containedCarrier.state == CarrierState.BATHING:
-            bath.containedCarrier.update_bathe_timer()
-
-    for manipulator in manipulators:
-        for bath in baths:
-            if bath.bathUUID in manipulator.operatingRange and bath.containedCarrier and bath.containedCarrier.state == CarrierState.BATH_COMPLETED and manipulator.state == ManipulatorState.IDLE:
-                carrier = bath.containedCarrier  # Fetch the carrier inside the bath
-                next_step_index = carrier.currentStepIndex + 1  # Predict next step index
-
-                # Ensure next_step_index is within range
-                if next_step_index < len(carrier.requiredProcedure.executionList):
-                    next_bath_step = carrier.requiredProcedure.executionList[next_step_index].bathID
-                    if next_bath_step in manipulator.operatingRange:
-                        print(f"Tasking manip {manipulator.ManipUUID} with servicing {carrier} at bath {bath}")
-                        carrier.state = CarrierState.BATH_SERVICED
-                        manipulator.move_to(bath.bathUUID)
-                    else:
-                        print(
-                            f"Manipulator {manipulator.ManipUUID} cannot service next target {next_bath_step} for {carrier}")
+            if manipulator.evasion_target is not None:
+                # evasive move scheduled by the rail planner, no actions until the evasion bath is reached
+                if manipulator.state == ManipulatorState.IDLE:
+                    manipulator.update_evasion()
+                if manipulator.evasion_target is not None:
+                    continue
+
+            if manipulator.position == 0 and self.may_load(manipulator):
+                manipulator.load_into_line()
+
+            elif manipulator.position == manipulator.target_position and baths[manipulator.position].containedCarrier is None:
+                manipulator.dismount_carrier()
+
+            elif manipulator.position == manipulator.target_position and manipulator.heldCarrier is None and baths[manipulator.position].containedCarrier.state == CarrierState.BATH_SERVICED:
+                manipulator.mount_carrier()
+
+    def check_baths(self):
+        """
+        In this function, baths which may need an action are checked against the operating ranges of idle manipulators twice.
+        First, whether a loader has a new carrier available, secondly, whether carrier is ready to be lifted and proceed to a new step.
+        Furthermore,  bathing timers are updated from this function call.
+        Only the tracked baths (see candidate_baths) and their servicing manipulators are visited, in the same
+        manipulator/bath order as a full scan of the line would use.
+        """
+        self.task_loading()
+        self.update_bathing()
+        self.task_pickups()
+
+    def task_loading(self):
+        """
+        First pass of check_baths, tasks idle manipulators with loading carriers waiting in baths.
+        """
+        loading = self.candidate_baths(self.awaiting_load, CarrierState.UNSERVICED)
+        for manipulator in self.idle_manipulators_for(loading):
+            for bath_id in loading:
+                bath = self.baths[bath_id]
+                if bath_id in manipulator.operating_range_set and bath.containedCarrier and bath.containedCarrier.state == CarrierState.UNSERVICED and manipulator.state == ManipulatorState.IDLE:
+                    if self.log.verbose:
+                        print(f"Tasking manip {manipulator.ManipUUID} with servicing {bath.containedCarrier} at bath{bath}")
+                    self.log.record(self.step_counter, manipulator.ManipUUID, bath.containedCarrier, "task_load")
+                    bath.containedCarrier.state = CarrierState.TO_BE_LOADED
+                    self.awaiting_load.discard(bath_id)
+                    manipulator.move_to(bath.bathUUID)
+                    continue
+
+    def update_bathing(self):
+        """
+        Second pass of check_baths, updates the timers of submerged carriers.
+        """
+        for bath_id in self.candidate_baths(self.bathing_baths, CarrierState.BATHING):
+            carrier = self.baths[bath_id].containedCarrier
+            carrier.update_bathe_timer(self.time_unit)
+            if carrier.state == CarrierState.BATH_COMPLETED:
+                self.bathing_baths.discard(bath_id)
+                self.completed_baths.add(bath_id)
+
+    def task_pickups(self):
+        """
+        Third pass of check_baths, tasks idle manipulators with moving carriers which completed their bath to the next step.
+        """
+        completed = self.candidate_baths(self.completed_baths, CarrierState.BATH_COMPLETED)
+        for manipulator in self.idle_manipulators_for(completed):
+            for bath_id in completed:
+                bath = self.baths[bath_id]
+                if bath_id in manipulator.operating_range_set and bath.containedCarrier and bath.containedCarrier.state == CarrierState.BATH_COMPLETED and manipulator.state == ManipulatorState.IDLE:
+                    carrier = bath.containedCarrier  # Fetch the carrier inside the bath
+                    next_step_index = carrier.currentStepIndex + 1  # Predict next step index
+
+                    # Ensure next_step_index is within range
+                    if next_step_index < len(carrier.requiredProcedure.executionList):
+                        next_bath_step = carrier.requiredProcedure.executionList[next_step_index].bathID
+                        if next_bath_step in manipulator.operating_range_set:
+                            if self.log.verbose:
+                                print(f"Tasking manip {manipulator.ManipUUID} with servicing {carrier} at bath {bath}")
+                            self.log.record(self.step_counter, manipulator.ManipUUID, carrier, "task_pickup")
+                            carrier.state = CarrierState.BATH_SERVICED
+                            self.completed_baths.discard(bath_id)
+                            manipulator.move_to(bath.bathUUID)
+                        elif self.log.verbose:
+                            print(
+                                f"Manipulator {manipulator.ManipUUID} cannot service next target {next_bath_step} for {carrier}")
+                    elif self.log.verbose:
+                        print(f"Carrier {carrier} has no further steps in its process.")
+
+    def update_simulation(self):
+        self.move_manipulators()
+        self.check_baths()
+
+    def prepare_dispatch(self):
+        """
+        Counterpart of update_simulation used with a dispatcher, the tasking of check_baths is left to the dispatcher.
+        Bathing timers are updated before the tasking, which doesn't change anything as the loading pass of check_baths
+        doesn't touch submerged carriers.
+        :return: alternative assignments of the current step, see dispatch_alternatives
+        """
+        self.move_manipulators()
+        self.update_bathing()
+        return self.dispatch_alternatives(self.dispatcher.allow_wait, self.dispatcher.max_alternatives)
+
+    def dispatch_alternatives(self, allow_wait=False, limit=None):
+        """
+        Enumerates the ways in which idle manipulators can be tasked with the carriers waiting for them.
+        A carrier waiting for loading can be served by any idle manipulator reaching its bath, a carrier which completed
+        its bath by any idle manipulator reaching both its bath and the bath of its next step.
+        The first alternative is always the greedy choice of check_baths.
+        :param allow_wait: include alternatives leaving a manipulator idle although it could serve a carrier
+        :param limit: maximal number of returned alternatives
+        :return: list of alternatives, each a tuple of (manipulator id, bath id) assignments (an empty one if nothing can be tasked)
+        """
+        loading = self.candidate_baths(self.awaiting_load, CarrierState.UNSERVICED)
+        completed = self.candidate_baths(self.completed_baths, CarrierState.BATH_COMPLETED)
+        options = []
+        for manipulator in self.idle_manipulators_for(loading + completed):
+            reachable = [bath_id for bath_id in loading if bath_id in manipulator.operating_range_set]
+            for bath_id in completed:
+                if bath_id in manipulator.operating_range_set:
+                    carrier = self.baths[bath_id].containedCarrier
+                    next_step_index = carrier.currentStepIndex + 1
+                    steps = carrier.requiredProcedure.executionList
+                    if next_step_index < len(steps) and steps[next_step_index].bathID in manipulator.operating_range_set:
+                        reachable.append(bath_id)
+            if reachable:
+                options.append((manipulator.ManipUUID, reachable))
+
+        alternatives = []
+        def expand(index, taken, assignments):
+            if limit is not None and len(alternatives) >= limit:
+                return
+            if index == len(options):
+                alternatives.append(tuple(assignments))
+                return
+            manipulator_id, reachable = options[index]
+            free = [bath_id for bath_id in reachable if bath_id not in taken]
+            for bath_id in free:
+                expand(index + 1, taken | {bath_id}, assignments + [(manipulator_id, bath_id)])
+            if allow_wait or not free:
+                expand(index + 1, taken, assignments)
+        expand(0, frozenset(), [])
+        return alternatives
+
+    def apply_assignments(self, assignments):
+        """
+        Tasks the manipulators as chosen by the dispatcher, loading assignments first (same order as check_baths).
+        :param assignments: tuple of (manipulator id, bath id) pairs, one of dispatch_alternatives
+        """
+        for task in (CarrierState.UNSERVICED, CarrierState.BATH_COMPLETED):
+            for manipulator_id, bath_id in assignments:
+                carrier = self.baths[bath_id].containedCarrier
+                if carrier.state != task:
+                    continue
+                manipulator = self.manipulators[manipulator_id - 1]
+                if self.log.verbose:
+                    print(f"Tasking manip {manipulator_id} with servicing {carrier} at bath {self.baths[bath_id]}")
+                if task == CarrierState.UNSERVICED:
+                    self.log.record(self.step_counter, manipulator_id, carrier, "task_load")
+                    carrier.state = CarrierState.TO_BE_LOADED
+                    self.awaiting_load.discard(bath_id)
                 else:
-                    print(f"Carrier {carrier} has no further steps in its process.")
+                    self.log.record(self.step_counter, manipulator_id, carrier, "task_pickup")
+                    carrier.state = CarrierState.BATH_SERVICED
+                    self.completed_baths.discard(bath_id)
+                manipulator.move_to(bath_id)
+
+    def can_collide(self, manipulator):
+        """
+        Checks whether a moving manipulator may trigger the collision handling of update_movement before it arrives.
+        Neighbour indexes follow the ones used in update_movement.
+        """
+        if self.rail_planner is not None:
+            return False # planned moves are collision free
+        target_distance = self.baths[manipulator.target_position].distanceToStart
+        if manipulator.distance_rail < target_distance:
+            next_manip_index = manipulator.ManipUUID
+            if next_manip_index < len(self.manipulators):
+                return target_distance >= self.manipulators[next_manip_index].rail_extent()[0]
+        elif manipulator.distance_rail > target_distance:
+            prev_manip_index = manipulator.ManipUUID - 2
+            if prev_manip_index > 1:
+                return target_distance <= self.manipulators[prev_manip_index].rail_extent()[1]
+        return False
+
+    def collision_neighbour(self, manipulator):
+        """
+        :return: neighbour checked by the collision handling of update_movement for the current move, see can_collide
+        """
+        direction = 1 if manipulator.distance_rail < self.baths[manipulator.target_position].distanceToStart else -1
+        return self.manipulators[manipulator.ManipUUID - 1 + direction], direction
 
+    def ticks_to_contact(self, manipulator):
+        """
+        Used by the event driven engine when can_collide holds.
+        :return: number of movement steps until the manipulator may reach the distance of its neighbour, i.e. the step in which
+            update_movement may push the neighbour aside or hold (or arrive first), 0 if it can't be predicted
+        """
+        neighbour, direction = self.collision_neighbour(manipulator)
+        neighbour_move = None
+        if neighbour.state == ManipulatorState.MOVING and not self.is_holding(neighbour):
+            if neighbour.rail_move is None:
+                return 0
+            if neighbour.rail_move.direction != direction:
+                # coming closer, right neighbours are moved after the manipulator within a step
+                neighbour_move = neighbour.rail_move
+                lag = 1 if direction > 0 else 0
+            # otherwise moving away, it can't be reached before its current distance
+        rail_move = manipulator.current_rail_move()
+        # the distance between the two is monotonic in the elapsed steps, bisects for the first step reaching the neighbour
+        low, high = rail_move.elapsed + 1, rail_move.duration
+        while low < high:
+            middle = (low + high) // 2
+            if neighbour_move is None:
+                neighbour_distance = neighbour.distance_rail
+            else:
+                neighbour_distance = neighbour_move.position(neighbour_move.elapsed + middle - rail_move.elapsed - lag)
+            if (rail_move.position(middle) - neighbour_distance) * direction >= 0:
+                high = middle
+            else:
+                low = middle + 1
+        return low - rail_move.elapsed
+
+    def pushed_neighbour(self, manipulator):
+        """
+        Used by the event driven engine, update_movement pushes a standing neighbour aside in every step in which the moving
+        manipulator reaches it (see Manipulator.push_ahead). The manipulator beyond the neighbour has to stand still as well,
+        so that the pushes don't change the predictions made for it.
+        :return: the neighbour which may be pushed before the manipulator arrives, None if there is none
+        """
+        if not self.can_collide(manipulator):
+            return None
+        neighbour, direction = self.collision_neighbour(manipulator)
+        if neighbour.state in (ManipulatorState.MOVING, ManipulatorState.LIFTING, ManipulatorState.SUBMERGING, ManipulatorState.DRIPPING):
+            return None
+        far_index = neighbour.ManipUUID - 1 + direction
+        if 0 <= far_index < len(self.manipulators) and self.manipulators[far_index].state == ManipulatorState.MOVING:
+            return None
+        return neighbour
+
+    def is_holding(self, manipulator):
+        """
+        Checks whether a moving manipulator stands in front of a neighbour which is lifting, submerging or dripping.
+        update_movement then holds its position in every step until the neighbour is done, which changes nothing but
+        the operation timer, so the event driven engine skips these steps.
+        """
+        if manipulator.rail_move is not None or not self.can_collide(manipulator):
+            return False
+        neighbour, direction = self.collision_neighbour(manipulator)
+        if neighbour.state not in (ManipulatorState.LIFTING, ManipulatorState.SUBMERGING, ManipulatorState.DRIPPING):
+            return False
+        rail_move = RailMove(self.step_counter, manipulator.distance_rail, self.baths[manipulator.target_position].distanceToStart,
+                             manipulator.SPEED, manipulator.ACCELERATION_TIME, time_unit=self.time_unit)
+        return (rail_move.position(1) - neighbour.distance_rail) * direction >= 0
+
+    def ticks_until_next_event(self):
+        """
+        Event driven counterpart of update_simulation.
+        Computes how many of the upcoming simulation steps would only increment timers/rail positions,
+        i.e. steps in which no state transition, tasking or loader/off loader action can happen.
+        Any uncertain situation (such as a possible collision with a moving neighbour) returns 0, forcing a regular simulation step.
+        :return: number of steps which can be skipped by advance_idle_ticks
+        """
+        baths = self.baths
+        if self.is_entry_ready():
+            return 0
+        if baths[-1].containedCarrier is not None:
+            return 0
+
+        horizon = float("inf")
+        if baths[0].containedCarrier is None and self.is_work_order_processed is False:
+            # streamed order waiting for its release time
+            horizon = self.ticks(self.order_stream.next_release_time) - self.step_counter
+        for manipulator in self.manipulators:
+            if manipulator.state in (ManipulatorState.SUBMERGING, ManipulatorState.LIFTING):
+                horizon = min(horizon, self.ticks(manipulator.LIFT_TIME) - manipulator.operation_timer - 1)
+                continue
+            if manipulator.state == ManipulatorState.DRIPPING:
+                horizon = min(horizon, self.ticks(manipulator.heldCarrier.get_current_step().dripTime) - manipulator.operation_timer - 1)
+                continue
 
-def update_simulation():
-    move_manipulators()
-    check_baths()
+            if manipulator.evasion_target is not None:
+                horizon = min(horizon, manipulator.ticks_to_arrival() - 1)
+                continue
 
-### Simulation
-"""
-Simulation step of the program. 
-The primary simulation loop first handles initial and exit stack states,
-the loop is popping new carrier into a line every time the first slot of the line is available, until there are
-carriers to be processed.
-
-Finally the update_simulation function is called which by extension refers to check_baths and move_manipulators functions.
-As such, on every simulation loop iteration (which by design corresponds to one second) every manipulator and bath is checked for potential
-task allocations and status updates. 
-
-Choice of the time unit is mostly arbitrary, but changing it would require recalculating (or adding a dynamic mechanism for doing so) relevant datum parameters. 
-Since each validation is automatic, the overhead on manipulator assignments is very low. 
-It is up to debate, whether the approach isn't "too greedy" from the optimization perspective. 
-"""
-is_work_order_done = False
-is_work_order_processed = False
-step_counter = 0 # one step is equal to one second
-deque_times = []
-
-while not is_work_order_done:
-
-    if baths[0].containedCarrier is None and is_work_order_processed is False:
-        print("Loader ready")
-        carrier = work_order.pop()
-        print(f"Carrier: {carrier}, is now at line entry point")
-        baths[0].containedCarrier = carrier
-        if len(work_order) == 0:
-            is_work_order_processed = True
-
-    if not baths[-1].containedCarrier is None:
-        finished_carriers.append(baths[-1].containedCarrier)
-        baths[-1].containedCarrier = None
-        deque_times.append(step_counter)
-
-    update_simulation()
-
-    step_counter += 1
-    print(step_counter)
-
-    if len(finished_carriers) >= carriers_to_move:
-        is_work_order_done = True
-        provide_states()
-        print("Workorder processed successfully!")
-
-        if len(deque_times) > 1:
-            time_diffs = [deque_times[i] - deque_times[i - 1] for i in range(1, len(deque_times))]
-            avg_time_between = sum(time_diffs) / len(time_diffs)
+            if manipulator.state == ManipulatorState.MOVING and manipulator.target_position is not None:
+                if manipulator.distance_rail == baths[manipulator.target_position].distanceToStart:
+                    if manipulator.position != manipulator.target_position:
+                        return 0  # arrival gets registered in the next step
+                elif self.rail_planner is not None and manipulator.rail_move is None:
+                    # blocked by a neighbour, the move can be planned in the next step if the neighbour changed since the last attempt
+                    if self.rail_planner.plan(manipulator, baths[manipulator.target_position].distanceToStart, self.step_counter, {}):
+                        return 0
+                elif self.is_holding(manipulator):
+                    pass # bounded by the timers of the neighbour
+                elif self.pushed_neighbour(manipulator) is not None:
+                    horizon = min(horizon, manipulator.ticks_to_arrival() - 1)
+                elif self.can_collide(manipulator):
+                    horizon = min(horizon, self.ticks_to_contact(manipulator) - 1)
+                else:
+                    horizon = min(horizon, manipulator.ticks_to_arrival() - 1)
+
+            # same decisions as the fall through part of move_manipulators
+            if manipulator.position == 0 and baths[0].containedCarrier is not None and manipulator.heldCarrier is None:
+                return 0
+            if manipulator.position == manipulator.target_position:
+                contained = baths[manipulator.position].containedCarrier
+                if contained is None:
+                    return 0
+                if manipulator.heldCarrier is None and contained.state == CarrierState.BATH_SERVICED:
+                    return 0
+
+        # same decisions as the tasking part of check_baths
+        for bath_id in self.candidate_baths(self.awaiting_load, CarrierState.UNSERVICED):
+            if self.idle_manipulators_for((bath_id,)):
+                return 0
+        for bath_id in self.candidate_baths(self.completed_baths, CarrierState.BATH_COMPLETED):
+            carrier = baths[bath_id].containedCarrier
+            next_step_index = carrier.currentStepIndex + 1
+            steps = carrier.requiredProcedure.executionList
+            if next_step_index < len(steps):
+                for manipulator in self.idle_manipulators_for((bath_id,)):
+                    if steps[next_step_index].bathID in manipulator.operating_range_set:
+                        return 0
+
+        for bath_id in self.candidate_baths(self.bathing_baths, CarrierState.BATHING):
+            carrier = baths[bath_id].containedCarrier
+            horizon = min(horizon, self.ticks(carrier.get_current_step().submersionTime) - carrier.operation_timer - 1)
+
+        return max(horizon, 0)
+
+    def advance_idle_ticks(self, ticks):
+        """
+        Applies the effect of several idle simulation steps at once (see ticks_until_next_event).
+        :param ticks: number of skipped steps
+        :return: side effects - timers of manipulators and submerged carriers are incremented, moving manipulators are advanced
+        """
+        for manipulator in self.manipulators:
+            if manipulator.state in (ManipulatorState.SUBMERGING, ManipulatorState.LIFTING, ManipulatorState.DRIPPING):
+                manipulator.operation_timer += ticks
+            elif manipulator.evasion_target is not None:
+                manipulator.advance_movement(ticks)
+            elif manipulator.state == ManipulatorState.MOVING and manipulator.target_position is not None:
+                if manipulator.distance_rail != self.baths[manipulator.target_position].distanceToStart:
+                    if self.is_holding(manipulator):
+                        manipulator.operation_timer += ticks
+                    elif (neighbour := self.pushed_neighbour(manipulator)) is not None:
+                        manipulator.push_ahead(neighbour, ticks)
+                    elif self.rail_planner is None or manipulator.rail_move is not None:
+                        manipulator.advance_movement(ticks)
+
+        for bath_id in self.bathing_baths:
+            carrier = self.baths[bath_id].containedCarrier
+            if carrier is not None and carrier.state == CarrierState.BATHING:
+                carrier.operation_timer += ticks
+
+    def step(self):
+        """
+        Performs a single simulation step (one second unless time_unit is set).
+        :return: True once the work order is done (or the overflow control terminated the run)
+        """
+        self.begin_step()
+        if self.dispatcher is None:
+            self.update_simulation()
         else:
-            avg_time_between = 0  # Default to 0 if there aren't enough values
-
+            alternatives = self.prepare_dispatch()
+            self.apply_assignments(alternatives[self.dispatcher.select(self, alternatives)])
+        return self.finish_step()
 
-        print(
-            f"Whole cycle completed in {step_counter}s, average time between carrier dequeing is {avg_time_between:.2f}s")
-        print("Loader state: " + str(work_order))
-        print("Off loader state: " + str(finished_carriers))
+    def begin_step(self):
+        """
+        First part of a simulation step, the loader places the next carrier on the line entry and the off loader
+        takes the carrier leaving the line.
+        """
+        baths = self.baths
+        if self.is_entry_ready():
+            carrier = self.pop_carrier()
+            if self.log.verbose:
+                print("Loader ready")
+                print(f"Carrier: {carrier}, is now at line entry point")
+            self.log.record(self.step_counter, None, carrier, "enter")
+            baths[0].containedCarrier = carrier
+            self.awaiting_load.add(0)
+
+        if not baths[-1].containedCarrier is None:
+            self.finished_carriers.append(baths[-1].containedCarrier)
+            self.log.record(self.step_counter, None, baths[-1].containedCarrier, "exit")
+            baths[-1].containedCarrier = None
+            self.deque_times.append(self.step_counter)
+            if self.first_deque_time is None:
+                self.first_deque_time = self.step_counter
+            self.finished_count += 1
+            if self.order_stream is not None:
+                self.last_progress = self.step_counter
+
+    def finish_step(self):
+        """
+        Last part of a simulation step, advances the clock and checks whether the work order is done.
+        :return: True once the work order is done (or the overflow control terminated the run)
+        """
+        self.step_counter += 1
+        if self.log.verbose:
+            print(self.step_counter)
+
+        if self.is_work_order_processed and self.finished_count >= self.carriers_to_move:
+            self.is_work_order_done = True
+            if self.log.verbose:
+                self.provide_states()
+            if self.log.summary:
+                print("Workorder processed successfully!")
+                print(
+                    f"Whole cycle completed in {self.seconds(self.step_counter)}s, average time between carrier dequeing is {self.seconds(self.avg_time_between):.2f}s")
+            if self.log.verbose:
+                print("Loader state: " + str(self.work_order))
+                print("Off loader state: " + str(self.finished_carriers))
+
+        #overflow control
+        if self.step_counter - self.last_progress > self.ticks(self.MAX_STEPS):
+            self.is_work_order_done = True
+            if self.log.verbose:
+                self.provide_states()
+            if self.log.summary:
+                print(self.carriers_to_move, self.finished_count)
+                print("Simulation exceeds safe runtime, terminating")
+                print("This indicates some unexpected error")
+
+        if self.is_work_order_done:
+            self.log.flush()
+
+        return self.is_work_order_done
+
+    def skip_idle_steps(self):
+        """
+        Event driven time advance, jumps over the steps in which no event can happen.
+        :return: number of skipped steps
+        """
+        idle_steps = min(self.ticks_until_next_event(), self.ticks(self.MAX_STEPS) + self.last_progress - self.step_counter)
+        if idle_steps > 0:
+            self.advance_idle_ticks(idle_steps)
+            self.step_counter += idle_steps
+            return idle_steps
+        return 0
+
+    def run(self):
+        """
+        Runs the simulation until the whole work order leaves the line.
+        :return: total cycle time in steps, i.e. in seconds unless time_unit is set
+        """
+        while not self.step():
+            if self.event_driven:
+                self.skip_idle_steps()
+        return self.step_counter
 
-    #overflow control
-    if step_counter > 10000:
-        is_work_order_done = True
-        provide_states()
-        print(carriers_to_move, len(finished_carriers))
-        print("Simulation exceeds safe runtime, terminating")
-        print("This indicates some unexpected error")
 
+if __name__ == "__main__":
+    # Carrier definition corresponds to the 'list' of carriers/products which need to be serviced (and their accompanying procedure).
+    carrier_definition = [Carrier(recipe_template1.create_instance()),Carrier(recipe_template4.create_instance()),Carrier(recipe_template2.create_instance()),Carrier(recipe_template3.create_instance()),Carrier(recipe_template1.create_instance())]
 
+    line = LineSimulation(bathData, manipData, carrier_definition)
+    if not line.validate():
+        exit(1)
+    line.provide_states()
+    line.run()
@@ -0,0 +1,335 @@
+import heapq
+import math
+
+from main import (LineSimulation, WorkOrderStream, Carrier, CarrierState, ManipulatorState, RecipeTemplate, EventLog, LogMode,
+                  validate_bath_sequences, to_ticks, RECIPE_TEMPLATES, bathData, manipData)
+"""
+Plant of several lines simulated together.
+Every line is a LineSimulation with its own baths and manipulators, fed by a LineFeed instead of its own work order.
+The plant reads a single work order (recipe name, release time records) and routes every released carrier to one of the
+lines with a free entry (see least_loaded and first_free). Baths of different lines can be one physical station
+(SharedStation, e.g. a transfer cart serving two lines), which holds a single carrier at a time.
+
+Lines are advanced by a common event queue: every line has its own clock and the time of its next event
+(see LineSimulation.ticks_until_next_event), only the lines with an event due are stepped, the others catch up
+their idle steps at once when they are stepped or touched by the plant (a routed carrier, a freed station).
+With a single line and no stations the plant reproduces the run of the line with a WorkOrderStream.
+"""
+
+
+def least_loaded(plant, candidates, name):
+    """
+    Routing rule, the carrier goes to the line with the fewest carriers in progress (the first one on a tie).
+    :param candidates: indexes of the lines with a free entry which can process the recipe
+    :param name: recipe name of the routed carrier
+    :return: index of the chosen line
+    """
+    return min(candidates, key=lambda index: plant.lines[index].carriers_to_move - plant.lines[index].finished_count)
+
+
+def first_free(plant, candidates, name):
+    """
+    Routing rule, the carrier goes to the first line (in plant order) with a free entry.
+    """
+    return candidates[0]
+
+
+class LineFeed(WorkOrderStream):
+    """
+    Work order of a single line of a plant, holds at most one carrier routed to the line by the plant.
+    """
+    def __init__(self, templates):
+        """
+        :param templates: dictionary of recipe name -> RecipeTemplate of the line
+        """
+        self.templates = templates
+        self.pending = None # (template, release time in s) of the routed carrier
+        self.source_exhausted = False # set by the plant once the work order of the plant is routed
+        self.released = 0
+
+    @property
+    def exhausted(self):
+        return self.source_exhausted and self.pending is None
+
+    @property
+    def next_release_time(self):
+        # without a routed carrier the line waits for the plant, which wakes it when routing one
+        return math.inf if self.pending is None else self.pending[1]
+
+    def pop(self):
+        template, _ = self.pending
+        self.pending = None
+        self.released += 1
+        return Carrier(template.create_instance())
+
+
+class StationBlocker:
+    """
+    Placeholder in the baths of a shared station while another line holds its carrier, manipulators wait
+    with their carrier until the station is free again.
+    """
+    __slots__ = ("carUUID", "state")
+
+    def __init__(self):
+        self.carUUID = None
+        self.state = CarrierState.SERVICED # matches none of the states the lines react to in a bath
+
+    def __repr__(self):
+        return "StationBlocker()"
+
+
+class SharedStation:
+    """
+    Baths of several lines which are a single physical station, holding one carrier at a time.
+    A member is taken from the start of lowering a carrier into its bath until the carrier is lifted out,
+    the baths of the other members are blocked (see StationBlocker) meanwhile.
+    """
+    def __init__(self, name, members):
+        """
+        :param name: plain text descriptor
+        :param members: list of (line index, bath id) pairs
+        """
+        self.name = name
+        self.members = members
+        self.holder = None # member currently holding the station
+        self.blocked = set() # members blocked by a StationBlocker
+        self.holds = 0 # number of carriers which passed the station
+
+    def is_taken(self, line, bath_id):
+        carrier = line.baths[bath_id].containedCarrier
+        if carrier is not None and not isinstance(carrier, StationBlocker):
+            return True
+        return any(manipulator.state == ManipulatorState.SUBMERGING and manipulator.target_position == bath_id
+                   for manipulator in line.manipulators)
+
+    def update(self, plant, time):
+        """
+        Blocks or frees the other members after a line was stepped.
+        """
+        holder = next((member for member in self.members if member not in self.blocked
+                       and self.is_taken(plant.lines[member[0]], member[1])), None)
+        if holder == self.holder:
+            return
+        if holder is None:
+            for line_index, bath_id in self.blocked:
+                plant.catch_up(line_index, time)
+                plant.lines[line_index].baths[bath_id].containedCarrier = None
+                plant.wake_freed(line_index, time)
+            self.blocked.clear()
+        else:
+            self.holds += 1
+            for line_index, bath_id in self.members:
+                if (line_index, bath_id) != holder:
+                    plant.catch_up(line_index, time)
+                    plant.lines[line_index].baths[bath_id].containedCarrier = StationBlocker()
+                    self.blocked.add((line_index, bath_id))
+        self.holder = holder
+
+
+class Plant:
+    """
+    Lines sharing a work order and stations, see run.
+    """
+    def __init__(self, layouts, records, templates, stations=(), routing=least_loaded, event_driven=True, logs=None, time_unit=1):
+        """
+        :param layouts: list of (bath_data, manip_data) pairs, one per line
+        :param records: iterable of (recipe name, release time in s) pairs, in the order of entering the plant
+        :param templates: dictionary of recipe name -> RecipeTemplate used by all lines, or a list of them per line
+        :param stations: SharedStations of the plant
+        :param routing: function (plant, candidate line indexes, recipe name) -> line index, see least_loaded
+        :param event_driven: advance the lines by their events, every line is stepped every second otherwise
+        :param logs: EventLog of every line, silent by default
+        :param time_unit: length of a step of all lines in seconds, see LineSimulation
+        """
+        if isinstance(templates, dict):
+            templates = [templates] * len(layouts)
+        self.feeds = [LineFeed(line_templates) for line_templates in templates]
+        self.time_unit = time_unit
+        self.lines = [LineSimulation(bath_data, manip_data, feed, event_driven=event_driven,
+                                     log=logs[index] if logs is not None else EventLog(LogMode.SILENT), time_unit=time_unit)
+                      for index, ((bath_data, manip_data), feed) in enumerate(zip(layouts, self.feeds))]
+        # recipes every line can process
+        self.capable = []
+        for line, feed in zip(self.lines, self.feeds):
+            self.capable.append({name for name, template in feed.templates.items()
+                                 if validate_bath_sequences(line.manipulators, {name: list(template.bath_ids)},
+                                                            last_bath=len(line.baths) - 1, verbose=False)})
+        for station in stations:
+            for line_index, bath_id in station.members:
+                if not 0 < bath_id < len(self.lines[line_index].baths) - 1:
+                    raise ValueError(f"Station {station.name} can't use the entry or the exit of line {line_index}")
+        self.stations = list(stations)
+        self.routing = routing
+        self.event_driven = event_driven
+
+        self.routed = [0] * len(self.lines) # carriers routed to every line
+        self.time = 0 # step processed by the event queue
+        self.current = -1 # index of the line being stepped
+        self.last_progress = 0 # step of the last carrier entering/leaving any line, see LineSimulation.MAX_STEPS
+        self.queue = [] # heap of (step, line index), entries not matching wake_times are stale
+        self.wake_times = [math.inf] * len(self.lines)
+        for index in range(len(self.lines)):
+            self.wake(index, 0)
+        self.records = iter(records)
+        self.next_record = None # (recipe name, release time in s) read ahead from the records
+        self.read_ahead()
+
+    def ticks(self, seconds):
+        """
+        :return: number of steps needed for the given time in seconds, see LineSimulation.ticks
+        """
+        return to_ticks(seconds, self.time_unit)
+
+    def read_ahead(self):
+        record = next(self.records, None)
+        if record is None:
+            self.next_record = None
+            for feed in self.feeds:
+                feed.source_exhausted = True
+            for index, line in enumerate(self.lines):
+                if line.order_stream.exhausted and not line.is_work_order_processed:
+                    # lines waiting for more carriers get done once their carriers leave
+                    line.is_work_order_processed = True
+                    self.wake(index, self.time)
+            return
+        name, release_time = record
+        if not any(name in capable for capable in self.capable):
+            raise ValueError(f"Recipe {name!r} of the work order can't be processed by any line")
+        self.next_record = (name, float(release_time))
+
+    def wake(self, index, time):
+        """
+        Schedules a step of the line, keeping an earlier one.
+        """
+        if self.lines[index].is_work_order_done or time >= self.wake_times[index]:
+            return
+        self.wake_times[index] = time
+        heapq.heappush(self.queue, (time, index))
+
+    def wake_freed(self, index, time):
+        """
+        Schedules a step of a line after another line changed it during the given step, in the same step
+        if the line comes later in the plant order (lines are stepped in plant order within a step).
+        """
+        self.wake(index, time if index > self.current else time + 1)
+
+    def catch_up(self, index, time):
+        """
+        Applies the idle steps of the line up to the given step (exclusive), see LineSimulation.advance_idle_ticks.
+        """
+        line = self.lines[index]
+        if line.step_counter < time:
+            line.advance_idle_ticks(time - line.step_counter)
+            line.step_counter = time
+
+    def candidates(self, name):
+        return [index for index, line in enumerate(self.lines)
+                if name in self.capable[index] and self.feeds[index].pending is None and line.baths[0].containedCarrier is None
+                and not line.is_work_order_done]
+
+    def route(self, time):
+        """
+        Routes the released carriers to lines with a free entry, in the order of the work order.
+        """
+        while self.next_record is not None and self.ticks(self.next_record[1]) <= time:
+            name, release_time = self.next_record
+            candidates = self.candidates(name)
+            if not candidates:
+                break
+            index = self.routing(self, candidates, name)
+            self.catch_up(index, time)
+            self.feeds[index].pending = (self.feeds[index].templates[name], release_time)
+            self.routed[index] += 1
+            self.wake(index, time)
+            self.read_ahead()
+
+    def next_time(self):
+        """
+        :return: step of the next event of the plant, a line step or the release of a carrier which can enter a line
+        """
+        while self.queue and self.queue[0][0] != self.wake_times[self.queue[0][1]]:
+            heapq.heappop(self.queue)
+        time = self.queue[0][0] if self.queue else math.inf
+        if self.next_record is not None and self.candidates(self.next_record[0]):
+            # lines are only changed by their steps, a carrier which couldn't enter yet enters in a later step
+            time = min(time, max(self.ticks(self.next_record[1]), self.time + 1))
+        return time
+
+    @property
+    def is_done(self):
+        return all(line.is_work_order_done for line in self.lines)
+
+    def step(self):
+        """
+        Processes the next event time of the plant.
+        :return: True once every line is done (or the overflow control terminated the run)
+        """
+        time = self.next_time()
+        if time == math.inf or time - self.last_progress > self.ticks(LineSimulation.MAX_STEPS):
+            # nothing can happen any more, or nothing entered or left the plant for too long
+            for line in self.lines:
+                line.is_work_order_done = True
+            return True
+        self.time = time
+        self.route(time)
+        # lines due in this step in plant order, a line can wake a later one for the same step (see wake_freed)
+        while self.queue and self.queue[0][0] == time:
+            _, index = heapq.heappop(self.queue)
+            if self.wake_times[index] != time:
+                continue
+            self.current = index
+            self.wake_times[index] = math.inf
+            line = self.lines[index]
+            self.catch_up(index, time)
+            line.last_progress = max(line.last_progress, self.last_progress)
+            line.step()
+            self.last_progress = max(self.last_progress, line.last_progress)
+            for station in self.stations:
+                station.update(self, time)
+            if not line.is_work_order_done:
+                if self.event_driven:
+                    # at the latest when the overflow control terminates the line, like LineSimulation.skip_idle_steps
+                    self.wake(index, min(line.step_counter + line.ticks_until_next_event(),
+                                         line.ticks(LineSimulation.MAX_STEPS) + line.last_progress))
+                else:
+                    self.wake(index, line.step_counter)
+        self.current = -1
+        return self.is_done
+
+    def run(self):
+        """
+        Runs all lines until the work order of the plant left the plant.
+        :return: cycle time of the plant in steps, i.e. in seconds unless time_unit is set
+        """
+        while not self.step():
+            pass
+        return self.cycle_time
+
+    @property
+    def cycle_time(self):
+        return max(line.step_counter for line in self.lines)
+
+    @property
+    def finished_count(self):
+        return sum(line.finished_count for line in self.lines)
+
+    def summary(self):
+        """
+        :return: list of dictionaries with the routed and finished carriers, cycle time and average time between carriers of every line
+        """
+        return [{"line": index, "routed": self.routed[index], "finished": line.finished_count, "cycle_time": line.step_counter,
+                 "avg_time_between": line.avg_time_between} for index, line in enumerate(self.lines)]
+
+
+if __name__ == "__main__":
+    # Two copies of the example line sharing the transfer cart (bath 18), a carrier released every 150 seconds
+    transfer = RecipeTemplate("Transfer", [(0, 0), (5, 4), (10, 3), (12, 5), (17, 3), (18, 10), (19, 30), (23, 0)])
+    templates = dict(RECIPE_TEMPLATES, Transfer=transfer)
+    names = sorted(templates)
+    records = [(names[index % len(names)], index * 150) for index in range(40)]
+    for routing in (least_loaded, first_free):
+        for stations in ((), (SharedStation("Převážecí vozík předúprava", [(0, 18), (1, 18)]),)):
+            plant = Plant([(bathData, manipData), (bathData, manipData)], records, templates, stations, routing=routing)
+            plant.run()
+            shared = f"shared cart ({stations[0].holds} carriers)" if stations else "separate carts"
+            print(f"{routing.__name__}, {shared}: {plant.finished_count} carriers in {plant.cycle_time}s, lines {plant.summary()}")
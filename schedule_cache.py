@@ -0,0 +1,296 @@
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+from main import RECIPE_TEMPLATES, bathData, manipData
+from cp_scheduler import CPScheduler, CPSchedule
+"""
+Persistent cache of solved CP-SAT schedules (see cp_scheduler.py).
+Entries are keyed by a canonical hash of the line (baths, manipulator ranges and starting positions, timing constants)
+and of the multiset of recipes of the work order. A request for the same carriers in the same entry order returns the
+stored schedule without solving, unless the stored one is weaker than requested: schedules which aren't proven optimal
+are only returned for the same solve method and options (window, overlap) with at least the same time limit.
+Otherwise the closest stored work order of the same line (fewest carriers to add or remove) hints the solver,
+its carriers are matched to the requested ones by recipe.
+
+Every entry is a JSON file in the cache directory, index.json holds the keys and recipe counts of all entries so near
+matches are found without reading the schedules. The least recently used entries are evicted once the number of entries
+or their total size exceeds the limits. Several processes (e.g. the workers of a sweep) can share a cache directory,
+entries and the index are replaced atomically and the index is only updated under an exclusive lock of index.lock.
+"""
+
+
+def digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def line_signature(bath_data, manip_data, parameters):
+    """
+    :return: hash of everything a schedule depends on except the work order
+    """
+    baths = [[name, distance, bool(submergable)] for name, distance, submergable in bath_data]
+    manipulators = [[sorted(reach), position] for reach, position in manip_data]
+    return digest([baths, manipulators, parameters])
+
+
+def recipe_signature(template):
+    """
+    :return: hash of the steps of a recipe template, templates with different names but equal steps share it
+    """
+    return digest([list(template.bath_ids), list(template.submersion_times)])[:16]
+
+
+def solve_request(scheduler, rolling, options):
+    """
+    :return: the options a stored schedule depends on, with the defaults of the solve method filled in
+    """
+    method = type(scheduler).solve_rolling if rolling else type(scheduler).solve
+    arguments = inspect.signature(method).bind_partial(scheduler, **options)
+    arguments.apply_defaults()
+    request = {name: arguments.arguments[name] for name in ("time_limit", "window", "overlap") if name in arguments.arguments}
+    request["rolling"] = rolling
+    return request
+
+
+class ScheduleCache:
+    """
+    On disk LRU cache of CPSchedules, see solve.
+    """
+    VERSION = 2 # entries of other versions were solved by a different model and are ignored
+    def __init__(self, directory="schedule_cache", max_entries=256, max_bytes=256 * 2**20, max_distance=0.5):
+        """
+        :param directory: cache directory, created when needed
+        :param max_entries: maximal number of stored schedules
+        :param max_bytes: maximal total size of the stored schedules
+        :param max_distance: near matches differing in more than this share of carriers are not used as hints
+        """
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_distance = max_distance
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load_index(self):
+        """
+        :return: dictionary of entry file name -> {"line", "recipes", "bytes"}
+        """
+        try:
+            with open(self.path("index.json")) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def write(self, name, value):
+        """
+        Replaces the file atomically, readers see either the old or the new content.
+        """
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, prefix=name, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w") as file:
+                json.dump(value, file)
+            os.replace(temporary, self.path(name))
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds the exclusive lock of the index, for the read-modify-write of put.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path("index.lock"), "a+b") as file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+                else:
+                    file.seek(0)
+                    msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def read(self, name):
+        """
+        :return: stored entry, None if its file is gone or of another version; marks the entry as recently used
+        """
+        try:
+            with open(self.path(name)) as file:
+                entry = json.load(file)
+            os.utime(self.path(name))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return entry if entry.get("version") == self.VERSION else None
+
+    @staticmethod
+    def serves(entry, request):
+        """
+        :return: True if the stored entry is at least as good as a schedule solved for the request
+        """
+        if entry["status"] == "OPTIMAL":
+            return True
+        stored = entry["request"]
+        return ({name: value for name, value in stored.items() if name != "time_limit"}
+                == {name: value for name, value in request.items() if name != "time_limit"}
+                and stored["time_limit"] >= request["time_limit"])
+
+    @staticmethod
+    def keys(scheduler):
+        """
+        :return: (line signature, recipe signature of every carrier, entry file name)
+        """
+        line = line_signature(scheduler.bath_data, scheduler.manip_data, scheduler.parameters)
+        recipes = [recipe_signature(template) for template in scheduler.templates]
+        return line, recipes, digest([line, sorted(Counter(recipes).items())])[:32] + ".json"
+
+    def get(self, scheduler, rolling=False, **options):
+        """
+        :param rolling: see solve
+        :param options: options of the solve method, see solve
+        :return: stored CPSchedule of the work order of the scheduler, None if it wasn't stored in the same entry order
+            or is weaker than requested
+        """
+        _, recipes, name = self.keys(scheduler)
+        entry = self.read(name)
+        if entry is None or entry["recipes"] != recipes or not self.serves(entry, solve_request(scheduler, rolling, options)):
+            return None
+        schedule = CPSchedule(scheduler.templates, entry["starts"], entry["hoists"], entry["makespan"], entry["status"],
+                              entry["bound"], scheduler.parameters)
+        schedule.greedy_cycle_time = entry["greedy_cycle_time"]
+        schedule.wall_time = entry["wall_time"]
+        schedule.windows = entry["windows"]
+        return schedule
+
+    def hints(self, scheduler):
+        """
+        :return: hints for CPScheduler.solve taken from the closest stored work order of the same line, empty if none is close
+        """
+        line, recipes, _ = self.keys(scheduler)
+        wanted = Counter(recipes)
+        best, best_distance = None, None
+        for name, meta in self.load_index().items():
+            if meta["line"] != line or meta.get("version") != self.VERSION:
+                continue
+            distance = sum(((Counter(meta["recipes"]) - wanted) + (wanted - Counter(meta["recipes"]))).values())
+            if best_distance is None or distance < best_distance:
+                best, best_distance = name, distance
+        if best is None or best_distance > self.max_distance * len(recipes):
+            return {}
+        entry = self.read(best)
+        if entry is None:
+            return {}
+
+        # the n-th requested carrier of a recipe follows the moves of the n-th stored one
+        stored = {}
+        for index, recipe in enumerate(entry["recipes"]):
+            stored.setdefault(recipe, []).append(index)
+        hints = {}
+        for f, recipe in enumerate(recipes):
+            if stored.get(recipe):
+                index = stored[recipe].pop(0)
+                for k, (start, hoist) in enumerate(zip(entry["starts"][index], entry["hoists"][index])):
+                    hints[(f, k)] = (start, hoist)
+        return hints
+
+    def put(self, scheduler, schedule, rolling=False, **options):
+        """
+        Stores the schedule of the work order of the scheduler, replacing a stored one of the same recipes
+        unless that one keeps the same entry order, serves the request too and is not longer.
+        :param rolling: see solve
+        :param options: options of the solve method the schedule was found with, see solve
+        """
+        line, recipes, name = self.keys(scheduler)
+        request = solve_request(scheduler, rolling, options)
+        with self.locked():
+            index = self.load_index()
+            if name in index:
+                entry = self.read(name)
+                if (entry is not None and entry["recipes"] == recipes and self.serves(entry, request)
+                        and entry["makespan"] <= schedule.makespan):
+                    return
+            self.store(name, line, recipes, request, schedule, index)
+
+    def store(self, name, line, recipes, request, schedule, index):
+        # called by put while holding the lock
+        entry = {
+            "version": self.VERSION,
+            "request": request,
+            "recipes": recipes,
+            "starts": schedule.starts,
+            "hoists": schedule.hoists,
+            "makespan": schedule.makespan,
+            "status": schedule.status,
+            "bound": schedule.bound,
+            "greedy_cycle_time": schedule.greedy_cycle_time,
+            "wall_time": schedule.wall_time,
+            "windows": schedule.windows,
+        }
+        self.write(name, entry)
+        index[name] = {"version": self.VERSION, "line": line, "recipes": dict(Counter(recipes)),
+                       "bytes": os.path.getsize(self.path(name))}
+        self.evict(index)
+        self.write("index.json", index)
+
+    def evict(self, index):
+        """
+        Removes the least recently used entries (oldest file modification) until the limits are met, called under the lock.
+        """
+        for name in [name for name in index if not os.path.exists(self.path(name))]:
+            del index[name]
+        order = sorted(index, key=lambda name: os.path.getmtime(self.path(name)))
+        total = sum(meta["bytes"] for meta in index.values())
+        while order and (len(index) > self.max_entries or total > self.max_bytes):
+            name = order.pop(0)
+            total -= index.pop(name)["bytes"]
+            os.remove(self.path(name))
+
+    def solve(self, scheduler, rolling=False, **options):
+        """
+        Returns the stored schedule of the work order, or solves it warm started from the closest stored one and stores it.
+        :param scheduler: CPScheduler of the work order
+        :param rolling: solve with CPScheduler.solve_rolling instead of CPScheduler.solve
+        :param options: passed to the solve method, e.g. time_limit
+        :return: CPSchedule, None if the solver found no schedule
+        """
+        schedule = self.get(scheduler, rolling, **options)
+        if schedule is not None:
+            self.hits += 1
+            return schedule
+        hints = self.hints(scheduler)
+        if hints:
+            self.near_hits += 1
+        else:
+            self.misses += 1
+        solve = scheduler.solve_rolling if rolling else scheduler.solve
+        schedule = solve(hints=hints, **options)
+        if schedule is not None:
+            self.put(scheduler, schedule, rolling, **options)
+        return schedule
+
+
+if __name__ == "__main__":
+    # Solves a mixed order, the same order again (cache hit) and an order with a few more carriers (near match)
+    names = sorted(RECIPE_TEMPLATES)
+    cache = ScheduleCache()
+    for count in (40, 40, 44):
+        templates = [RECIPE_TEMPLATES[names[index % len(names)]] for index in range(count)]
+        schedule = cache.solve(CPScheduler(bathData, manipData, templates), time_limit=20)
+        print(schedule, f"hits={cache.hits}, near hits={cache.near_hits}, misses={cache.misses}")
@@ -0,0 +1,356 @@
+import math
+import os
+import random
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from main import LineSimulation, Carrier, RailPlanner, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+from dispatch_search import lower_bound
+from takt_bound import TaktBound
+"""
+Search over the release order of a work order (the order of carrier_definition), minimising the total cycle time.
+Carriers following the same recipe are interchangeable, a candidate order is a sequence of recipe indexes and every
+distinct sequence is simulated at most once. The simulator is the fitness function, candidates are evaluated in batches
+spread over a process pool (like sweep.py), the search itself runs in the calling process:
+    - anneal: parallel simulated annealing, one chain per worker, every chain proposes a neighbour (a carrier swapped
+      with or moved in front of a carrier of another recipe) per round,
+    - evolve: genetic algorithm, order crossover of tournament selected parents plus a neighbour move as mutation,
+      the best population_size distinct orders of the parents and children survive.
+Evaluations are aborted as soon as the candidate can't be accepted any more. A simulation gets a cutoff (the acceptance
+threshold of its annealing chain, sampled before it is simulated, or the cycle time of the worst survivor of the population)
+and stops once its clock, or the lower bound of the carriers still in the line (see dispatch_search.lower_bound), reaches
+the cutoff. Candidates whose analytic bound (see TaktBound.cycle_time) already reaches the cutoff are not simulated at all.
+The search stops early when the best order reaches the bound valid for every release order of the work order.
+"""
+
+
+def simulate_order(recipes, sequence, bath_data, manip_data, cutoff=None, time_unit=1, safety_gap=None):
+    """
+    Simulates a release order, called within the worker processes.
+    :param recipes: distinct Recipes of the work order
+    :param sequence: release order given as indexes into recipes
+    :param cutoff: the simulation is aborted once the cycle time can't be lower than this many steps
+    :return: (total cycle time in steps, simulated steps), the cycle time is None if the simulation was aborted
+        and math.inf if the line didn't finish the work order (overflow control)
+    """
+    carriers = [Carrier(recipes[index]) for index in sequence]
+    line = LineSimulation(bath_data, manip_data, carriers, event_driven=True, log=EventLog(LogMode.SILENT),
+                          rail_planner=None if safety_gap is None else RailPlanner(safety_gap), time_unit=time_unit)
+    waiting = len(line.work_order)
+    while not line.step():
+        if cutoff is not None:
+            if line.step_counter >= cutoff:
+                return None, line.step_counter
+            # the bound only changes noticeably when a carrier enters the line
+            if len(line.work_order) != waiting:
+                waiting = len(line.work_order)
+                if lower_bound(line) >= cutoff:
+                    return None, line.step_counter
+        line.skip_idle_steps()
+    if line.finished_count < line.carriers_to_move:
+        return math.inf, line.step_counter
+    return line.step_counter, line.step_counter
+
+
+class SequenceResult:
+    def __init__(self, order, cycle_time, initial_cycle_time, bound):
+        self.order = order # carriers of the best release order found
+        self.cycle_time = cycle_time # total cycle time of the best order in steps, math.inf if no order finished
+        self.initial_cycle_time = initial_cycle_time # total cycle time of the given order
+        self.bound = bound # lower bound of the cycle time of every release order, None if unknown
+        self.evaluations = 0 # candidate orders evaluated, including the ones found in the cache
+        self.simulations = 0 # simulations run by the workers
+        self.aborted = 0 # simulations stopped by their cutoff
+        self.pruned = 0 # candidates left out because of their analytic bound
+        self.cache_hits = 0 # candidates simulated before
+        self.simulated_steps = 0 # steps simulated by all workers
+        self.wall_time = 0.0 # seconds spent by the search
+
+    @property
+    def recipe_names(self):
+        return [carrier.requiredProcedure.name for carrier in self.order]
+
+    def __repr__(self):
+        return (f"SequenceResult(cycle_time={self.cycle_time}, initial_cycle_time={self.initial_cycle_time}, bound={self.bound}, "
+                f"evaluations={self.evaluations}, simulations={self.simulations}, aborted={self.aborted}, "
+                f"pruned={self.pruned}, cache_hits={self.cache_hits}, wall_time={self.wall_time:.1f}s)")
+
+
+class SequenceSearch:
+    """
+    Parallel metaheuristic search over the release order of a work order, see the module description.
+    Timing constants are class level, the worker processes use the values of the calling process at the time the pool starts.
+    """
+    def __init__(self, bath_data=bathData, manip_data=manipData, workers=None, seed=None, time_unit=1, safety_gap=None):
+        """
+        :param bath_data: line definition, see bathData
+        :param manip_data: manipulator ranges and starting positions, see manipData
+        :param workers: number of worker processes (defaults to the number of cores), 1 simulates in the calling process
+        :param seed: seed of the random moves, the search is reproducible for a given number of workers
+        :param time_unit: see LineSimulation, cycle times are given in steps
+        :param safety_gap: simulates with a RailPlanner of this safety gap instead of the step by step collision handling
+        """
+        self.bath_data = bath_data
+        self.manip_data = manip_data
+        self.workers = workers or os.cpu_count()
+        self.random = random.Random(seed)
+        self.time_unit = time_unit
+        self.safety_gap = safety_gap
+        # the bounds count the line entry interval in steps, they are only used with steps of a second
+        self.takt_bound = TaktBound(bath_data, manip_data) if time_unit == 1 else None
+        self.recipes = [] # distinct Recipes of the searched work order
+        self.carriers = [] # searched work order in the given release order
+        self.best = () # best sequence found so far
+        self.cache = {} # sequence -> (cycle time, True) once simulated, (cutoff, False) while only known to reach the cutoff
+        self.executor = None # process pool of the running search, None when simulating in the calling process
+        self.result = None # SequenceResult of the running search
+        self.search_start = None
+
+    def order_bound(self, sequence):
+        """
+        :return: lower bound of the cycle time of the release order, see TaktBound.cycle_time, None if unknown
+        """
+        if self.takt_bound is None:
+            return None
+        return self.takt_bound.cycle_time([self.recipes[index] for index in sequence])
+
+    def work_order_bound(self, sequence):
+        """
+        :return: lower bound of the cycle time of every release order of the carriers, None if unknown
+        """
+        if self.takt_bound is None:
+            return None
+        templates = [self.recipes[index] for index in sequence]
+        bottleneck = self.takt_bound.bottleneck(templates)
+        if bottleneck is None:
+            return None
+        # the bound of TaktBound.cycle_time is the lowest with the longest flow times entering first
+        flow_times = sorted((self.takt_bound.recipe_load(template).flow_time for template in templates), reverse=True)
+        flow = max(TaktBound.ENTRY_INTERVAL * index + flow_time for index, flow_time in enumerate(flow_times))
+        return max(bottleneck[0], flow)
+
+    def evaluate(self, candidates):
+        """
+        Simulates a batch of candidates in parallel.
+        :param candidates: list of (sequence, cutoff), the cutoff may be None
+        :return: list of cycle times, None for the candidates which reach their cutoff
+        """
+        result = self.result
+        results = [None] * len(candidates)
+        pending = {}
+        for index, (sequence, cutoff) in enumerate(candidates):
+            result.evaluations += 1
+            cached = self.cache.get(sequence)
+            if cached is not None and (cached[1] or cutoff is not None and cutoff <= cached[0]):
+                result.cache_hits += 1
+                results[index] = cached[0] if cached[1] and (cutoff is None or cached[0] < cutoff) else None
+                continue
+            if cutoff is not None:
+                bound = self.order_bound(sequence)
+                if bound is not None and bound >= cutoff:
+                    result.pruned += 1
+                    self.cache[sequence] = cutoff, False
+                    continue
+            pending.setdefault((sequence, cutoff), []).append(index)
+
+        jobs = list(pending)
+        arguments = ([self.recipes] * len(jobs), [sequence for sequence, _ in jobs], [self.bath_data] * len(jobs),
+                     [self.manip_data] * len(jobs), [cutoff for _, cutoff in jobs], [self.time_unit] * len(jobs),
+                     [self.safety_gap] * len(jobs))
+        if self.executor is None:
+            outcomes = map(simulate_order, *arguments)
+        else:
+            outcomes = self.executor.map(simulate_order, *arguments)
+        for (sequence, cutoff), (cycle_time, steps) in zip(jobs, outcomes):
+            result.simulations += 1
+            result.simulated_steps += steps
+            if cycle_time is None:
+                result.aborted += 1
+                self.cache[sequence] = cutoff, False
+            else:
+                self.cache[sequence] = cycle_time, True
+            for index in pending[(sequence, cutoff)]:
+                results[index] = cycle_time
+            if cycle_time is not None and cycle_time < result.cycle_time:
+                result.cycle_time = cycle_time
+                self.best = sequence
+        return results
+
+    def neighbour(self, sequence):
+        """
+        :return: the sequence with a carrier swapped with (or moved in front of) a carrier of another recipe,
+            the sequence itself if all carriers follow the same recipe
+        """
+        positions = range(len(sequence))
+        pairs = [(first, second) for first in positions for second in positions
+                 if first < second and sequence[first] != sequence[second]]
+        if not pairs:
+            return sequence
+        first, second = self.random.choice(pairs)
+        moved = list(sequence)
+        if self.random.random() < 0.5:
+            moved[first], moved[second] = moved[second], moved[first]
+        else:
+            moved.insert(first, moved.pop(second))
+        return tuple(moved)
+
+    def crossover(self, first, second):
+        """
+        Order crossover: a slice of the first parent is kept in place, the remaining carriers follow in the order of the second.
+        """
+        start, end = sorted(self.random.sample(range(len(first) + 1), 2))
+        rest = list(second)
+        for index in first[start:end]:
+            rest.remove(index)
+        return tuple(rest[:start]) + first[start:end] + tuple(rest[start:])
+
+    def start(self, carriers):
+        """
+        Prepares the search of the given work order, see anneal and evolve.
+        :return: the given release order as a sequence
+        """
+        if not carriers:
+            raise ValueError("Empty work order")
+        self.recipes = []
+        sequence = []
+        for carrier in carriers:
+            if carrier.requiredProcedure not in self.recipes:
+                self.recipes.append(carrier.requiredProcedure)
+            sequence.append(self.recipes.index(carrier.requiredProcedure))
+        sequence = tuple(sequence)
+        self.carriers = list(carriers)
+        self.cache = {}
+        self.best = sequence
+        self.result = SequenceResult(None, math.inf, None, self.work_order_bound(sequence))
+        self.search_start = perf_counter()
+        self.result.initial_cycle_time = self.evaluate([(sequence, None)])[0]
+        return sequence
+
+    def is_optimal(self):
+        return self.result.bound is not None and self.result.cycle_time <= self.result.bound
+
+    def finish(self):
+        """
+        :return: SequenceResult with the carriers reordered to the best sequence found
+        """
+        result = self.result
+        # carriers following the same recipe keep their relative order
+        queues = {index: [carrier for carrier in self.carriers if carrier.requiredProcedure is recipe]
+                  for index, recipe in enumerate(self.recipes)}
+        result.order = [queues[index].pop(0) for index in self.best]
+        result.wall_time = perf_counter() - self.search_start
+        return result
+
+    def run(self, search, carriers, *arguments):
+        with ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else nullcontext() as executor:
+            self.executor = executor
+            try:
+                search(self.start(carriers), *arguments)
+            finally:
+                self.executor = None
+        return self.finish()
+
+    def cutoff(self, threshold):
+        """
+        :return: cutoff of a candidate accepted below the threshold, None while no order finished the work order.
+            Lines which lock up are only stopped by the overflow control after MAX_STEPS without progress,
+            so candidates are aborted at twice the best cycle time at the latest.
+        """
+        if self.result.cycle_time == math.inf:
+            return None
+        return min(threshold, self.result.cycle_time * 2)
+
+    def anneal(self, carriers, rounds=200, chains=None, start_temperature=None, cooling=0.98):
+        """
+        Parallel simulated annealing, every chain starts from the given order.
+        A worse neighbour is accepted with the probability exp(-increase / temperature), the threshold of the acceptance
+        is sampled before the neighbour is simulated and serves as its cutoff.
+        :param carriers: work order, list of Carriers in the release order to improve
+        :param rounds: number of proposals per chain
+        :param chains: number of chains, defaults to the number of workers
+        :param start_temperature: in steps, defaults to 1 % of the cycle time of the given order
+        :param cooling: temperature factor per round
+        :return: SequenceResult
+        """
+        return self.run(self.annealing, carriers, rounds, chains or self.workers, start_temperature, cooling)
+
+    def annealing(self, sequence, rounds, chains, start_temperature, cooling):
+        initial = self.result.cycle_time
+        if initial == math.inf:
+            initial = self.order_bound(sequence) or 1
+        temperature = start_temperature if start_temperature is not None else max(initial / 100, 1)
+        states = [(sequence, self.result.cycle_time)] * chains
+        for _ in range(rounds):
+            if self.is_optimal():
+                break
+            proposals = []
+            for current, cycle_time in states:
+                # accepted iff the new cycle time is below current + temperature * -ln(u), u uniform in (0, 1]
+                threshold = cycle_time - temperature * math.log(1.0 - self.random.random())
+                proposals.append((self.neighbour(current), self.cutoff(threshold)))
+            outcomes = self.evaluate(proposals)
+            for index, ((proposal, threshold), cycle_time) in enumerate(zip(proposals, outcomes)):
+                if cycle_time is not None and cycle_time < math.inf and (threshold is None or cycle_time < threshold):
+                    states[index] = proposal, cycle_time
+            temperature *= cooling
+
+    def evolve(self, carriers, generations=50, population_size=None, mutation_rate=0.3, tournament=3):
+        """
+        Genetic algorithm, the initial population holds the given order and random shuffles of it.
+        Children which can't displace the worst member of the population are aborted.
+        :param carriers: work order, list of Carriers in the release order to improve
+        :param generations: number of generations
+        :param population_size: defaults to 4 orders per worker, 16 at least
+        :param mutation_rate: probability of a neighbour move applied to a child
+        :param tournament: number of members drawn per parent selection
+        :return: SequenceResult
+        """
+        return self.run(self.evolution, carriers, generations, population_size or max(16, 4 * self.workers), mutation_rate, tournament)
+
+    def evolution(self, sequence, generations, population_size, mutation_rate, tournament):
+        population = {sequence: self.result.initial_cycle_time}
+        shuffles = set()
+        for _ in range(population_size * 4):
+            if len(shuffles) + 1 >= population_size:
+                break
+            shuffled = list(sequence)
+            self.random.shuffle(shuffled)
+            if tuple(shuffled) not in population:
+                shuffles.add(tuple(shuffled))
+        shuffles = sorted(shuffles)
+        population.update(zip(shuffles, self.evaluate([(shuffled, self.cutoff(math.inf)) for shuffled in shuffles])))
+        members = sorted((cycle_time if cycle_time is not None else math.inf, member) for member, cycle_time in population.items())
+
+        for _ in range(generations):
+            if self.is_optimal():
+                break
+            worst = members[-1][0] if len(members) >= population_size else math.inf
+            children = []
+            known = {member for _, member in members}
+            for _ in range(population_size * 4):
+                if len(children) >= population_size:
+                    break
+                first = min(self.random.sample(members, min(tournament, len(members))))[1]
+                second = min(self.random.sample(members, min(tournament, len(members))))[1]
+                child = self.crossover(first, second)
+                if self.random.random() < mutation_rate:
+                    child = self.neighbour(child)
+                if child not in known:
+                    known.add(child)
+                    children.append(child)
+            outcomes = self.evaluate([(child, self.cutoff(worst)) for child in children])
+            members += [(cycle_time, child) for child, cycle_time in zip(children, outcomes) if cycle_time is not None]
+            members = sorted(members)[:population_size]
+
+
+if __name__ == "__main__":
+    # Improves the release order of the example work order of main.py repeated four times,
+    # by simulated annealing and by the genetic algorithm
+    order = ["Test1", "Test4", "Test2", "Test3", "Test1"] * 4
+    carriers = [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in order]
+    for method in ("anneal", "evolve"):
+        search = SequenceSearch(seed=1)
+        result = search.anneal(carriers, rounds=100) if method == "anneal" else search.evolve(carriers, generations=20)
+        print(method, result)
+        print("  best order: " + " ".join(result.recipe_names))
@@ -0,0 +1,261 @@
+import itertools
+import json
+
+from main import (LineSimulation, WorkOrderStream, Carrier, CarrierState, ManipulatorState, RailMove, RailPlanner,
+                  EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData)
+"""
+Snapshots of a running line, for what-if branches continuing from the same point of a shift.
+LineSnapshot.capture(line) records everything the rest of the simulation depends on (baths and their carriers,
+position, rail move, state and timers of every manipulator, progress of every carrier, the remaining work order and
+the counters of the line) in plain lists and numbers. restore builds an independent LineSimulation continuing exactly
+where the captured one was, fork builds several of them, so the shared prefix of the branches is simulated only once.
+
+A snapshot is JSON serializable (as_dict / from_dict, save / load). Carriers refer to their recipe by name, restoring
+a loaded snapshot needs the recipe templates of the work order. The remaining records of a WorkOrderStream are kept
+lazily in process and only read into the snapshot when it is serialized.
+Timing constants (Manipulator.SPEED, RecipeStep.DRIP_TIME etc.) are class attributes and are not part of the snapshot,
+the time unit of the line is.
+"""
+
+
+def carrier_record(carrier):
+    return [carrier.carUUID, carrier.requiredProcedure.name, carrier.currentStepIndex, carrier.state.name, carrier.operation_timer]
+
+
+def carrier_id(carrier):
+    return None if carrier is None else carrier.carUUID
+
+
+class LineSnapshot:
+    """
+    State of a LineSimulation at the end of a step, see capture and restore.
+    """
+    VERSION = 1 # format of the serialized state
+
+    def __init__(self, state, recipes=None, records=None, templates=None):
+        """
+        :param state: dictionary of plain values, see capture
+        :param recipes: dictionary of recipe name -> Recipe shared with the captured line, rebuilt from templates if missing
+        :param records: remaining (recipe name, release time) records of a streamed work order
+        :param templates: dictionary of recipe name -> RecipeTemplate of a streamed work order
+        """
+        self.state = state
+        self.recipes = recipes
+        self.records = records
+        self.templates = templates
+
+    @staticmethod
+    def capture(line):
+        """
+        :param line: LineSimulation between two steps, its work order is a list of carriers or a WorkOrderStream
+        :return: LineSnapshot of the line, the line itself can keep running
+        """
+        stream = line.order_stream
+        if stream is not None and type(stream) is not WorkOrderStream:
+            raise ValueError(f"Lines fed by {type(stream).__name__} can't be captured")
+        inserted = [] if stream is None else [carrier for carrier, _ in stream.inserted]
+        carriers = {}
+        for carrier in itertools.chain(line.carrier_definition, line.work_order, line.finished_carriers, inserted,
+                                       (bath.containedCarrier for bath in line.baths),
+                                       (manipulator.heldCarrier for manipulator in line.manipulators)):
+            if carrier is not None:
+                carriers[carrier.carUUID] = carrier
+        manipulators = []
+        for manipulator in line.manipulators:
+            move = manipulator.rail_move
+            manipulators.append({
+                "reach": list(manipulator.operatingRange),
+                "position": manipulator.position,
+                "distance_rail": manipulator.distance_rail,
+                "state": manipulator.state.name,
+                "target_position": manipulator.target_position,
+                "evasion_target": manipulator.evasion_target,
+                "operation_timer": manipulator.operation_timer,
+                "held_carrier": carrier_id(manipulator.heldCarrier),
+                "lift_time": manipulator.liftTime,
+                "speed": manipulator.movementSpeed,
+                "rail_move": None if move is None else {name: getattr(move, name) for name in RailMove.__slots__},
+            })
+        state = {
+            "version": LineSnapshot.VERSION,
+            "baths": [[bath.name, bath.distanceToStart, bath.isSubmergable] for bath in line.baths],
+            "bath_carriers": [carrier_id(bath.containedCarrier) for bath in line.baths],
+            "manipulators": manipulators,
+            "carriers": [carrier_record(carrier) for carrier in carriers.values()],
+            "carrier_definition": [carrier.carUUID for carrier in line.carrier_definition],
+            "work_order": [carrier.carUUID for carrier in line.work_order],
+            "finished_carriers": [carrier.carUUID for carrier in line.finished_carriers],
+            "deque_times": list(line.deque_times),
+            "awaiting_load": sorted(line.awaiting_load),
+            "bathing_baths": sorted(line.bathing_baths),
+            "completed_baths": sorted(line.completed_baths),
+            "step_counter": line.step_counter,
+            "finished_count": line.finished_count,
+            "first_deque_time": line.first_deque_time,
+            "last_progress": line.last_progress,
+            "carriers_to_move": line.carriers_to_move,
+            "is_work_order_processed": line.is_work_order_processed,
+            "is_work_order_done": line.is_work_order_done,
+            "event_driven": line.event_driven,
+            "time_unit": line.time_unit,
+            "safety_gap": None if line.rail_planner is None else line.rail_planner.safety_gap,
+            "stream": None,
+        }
+        recipes = {carrier.requiredProcedure.name: carrier.requiredProcedure for carrier in carriers.values()}
+        records = templates = None
+        if stream is not None:
+            # the line keeps reading one copy of the remaining records, the snapshot the other one
+            stream.records, records = itertools.tee(stream.records)
+            next_record = None if stream.next_record is None else [stream.next_record[0].name, stream.next_record[1]]
+            state["stream"] = {"next_record": next_record, "released": stream.released,
+                               "inserted": [[carrier.carUUID, release_time] for carrier, release_time in stream.inserted]}
+            templates = stream.templates
+        return LineSnapshot(state, recipes, records, templates)
+
+    def restore(self, templates=None, event_driven=None, log=None, stats=None, rail_planner=None, dispatcher=None):
+        """
+        Builds a line continuing from the snapshot, independent of the captured line and of other restored ones.
+        :param templates: dictionary of recipe name -> RecipeTemplate, needed for loaded snapshots (RECIPE_TEMPLATES by default)
+        :param event_driven: defaults to the mode of the captured line
+        :param log: EventLog of the restored line, see LineSimulation
+        :param stats: SimulationStats of the restored line
+        :param rail_planner: defaults to a new RailPlanner with the safety gap of the captured one (if it had one)
+        :param dispatcher: Dispatcher of the restored line, the greedy tasking by default
+        :return: LineSimulation
+        """
+        state = self.state
+        if templates is None:
+            templates = self.templates if self.templates is not None else RECIPE_TEMPLATES
+        recipes = self.recipes
+        if recipes is None:
+            recipes = {template.name: template.create_instance() for template in templates.values()}
+
+        carriers = {}
+        for carrier_uuid, name, step_index, carrier_state, timer in state["carriers"]:
+            # bypasses the constructor, restored carriers keep their ids without advancing Carrier.next_id
+            carrier = Carrier.__new__(Carrier)
+            carrier.carUUID = carrier_uuid
+            carrier.requiredProcedure = recipes[name]
+            carrier.currentStepIndex = step_index
+            carrier.state = CarrierState[carrier_state]
+            carrier.operation_timer = timer
+            carriers[carrier_uuid] = carrier
+
+        if state["stream"] is not None:
+            if self.records is None:
+                raise ValueError("Snapshot of a streamed work order without its records")
+            self.records, records = itertools.tee(self.records)
+            next_record = state["stream"]["next_record"]
+            work_order = WorkOrderStream(itertools.chain([next_record] if next_record is not None else [], records), templates)
+            work_order.released = state["stream"]["released"]
+            work_order.inserted = [(carriers[carrier_uuid], release_time)
+                                   for carrier_uuid, release_time in state["stream"].get("inserted", [])]
+        else:
+            work_order = [carriers[carrier_uuid] for carrier_uuid in state["carrier_definition"]]
+        if rail_planner is None and state["safety_gap"] is not None:
+            rail_planner = RailPlanner(state["safety_gap"])
+        bath_data = [(name, distance * 1000, submergable) for name, distance, submergable in state["baths"]]
+        manip_data = [(manipulator["reach"], manipulator["position"]) for manipulator in state["manipulators"]]
+        line = LineSimulation(bath_data, manip_data, work_order,
+                              event_driven=state["event_driven"] if event_driven is None else event_driven,
+                              log=log, stats=stats, rail_planner=rail_planner, dispatcher=dispatcher,
+                              time_unit=state.get("time_unit", 1))
+
+        for bath, (_, distance, _), carrier_uuid in zip(line.baths, state["baths"], state["bath_carriers"]):
+            bath.distanceToStart = distance # exact value, the conversion from mm may round
+            bath.containedCarrier = None if carrier_uuid is None else carriers[carrier_uuid]
+        for manipulator, values in zip(line.manipulators, state["manipulators"]):
+            manipulator.distance_rail = values["distance_rail"]
+            manipulator.state = ManipulatorState[values["state"]]
+            manipulator.target_position = values["target_position"]
+            manipulator.evasion_target = values["evasion_target"]
+            manipulator.operation_timer = values["operation_timer"]
+            manipulator.heldCarrier = None if values["held_carrier"] is None else carriers[values["held_carrier"]]
+            manipulator.liftTime = values["lift_time"]
+            manipulator.movementSpeed = values["speed"]
+            manipulator.rail_move = None
+            if values["rail_move"] is not None:
+                manipulator.rail_move = RailMove.__new__(RailMove)
+                manipulator.rail_move.time_unit = line.time_unit # missing in snapshots made before it was configurable
+                for name, value in values["rail_move"].items():
+                    setattr(manipulator.rail_move, name, value)
+
+        line.work_order.clear()
+        line.work_order.extend(carriers[carrier_uuid] for carrier_uuid in state["work_order"])
+        line.finished_carriers.extend(carriers[carrier_uuid] for carrier_uuid in state["finished_carriers"])
+        line.deque_times.extend(state["deque_times"])
+        line.awaiting_load.update(state["awaiting_load"])
+        line.bathing_baths.update(state["bathing_baths"])
+        line.completed_baths.update(state["completed_baths"])
+        line.step_counter = state["step_counter"]
+        line.finished_count = state["finished_count"]
+        line.first_deque_time = state["first_deque_time"]
+        line.last_progress = state["last_progress"]
+        line.carriers_to_move = state["carriers_to_move"]
+        line.is_work_order_processed = state["is_work_order_processed"]
+        line.is_work_order_done = state["is_work_order_done"]
+        return line
+
+    def fork(self, count, **options):
+        """
+        :param count: number of branches
+        :param options: passed to restore
+        :return: list of independent lines continuing from the snapshot
+        """
+        return [self.restore(**options) for _ in range(count)]
+
+    def as_dict(self):
+        """
+        :return: JSON serializable state, the remaining records of a streamed work order are read into it
+        """
+        data = dict(self.state)
+        if data["stream"] is not None:
+            records = [[name, release_time] for name, release_time in self.records]
+            self.records = iter(records)
+            data["stream"] = dict(data["stream"], records=records)
+        return data
+
+    @staticmethod
+    def from_dict(data):
+        """
+        :param data: state returned by as_dict
+        :return: LineSnapshot, restore it with the recipe templates of its carriers
+        """
+        if data.get("version") != LineSnapshot.VERSION:
+            raise ValueError(f"Unsupported snapshot version {data.get('version')}, expected {LineSnapshot.VERSION}")
+        state = dict(data)
+        records = None
+        if state["stream"] is not None:
+            state["stream"] = dict(state["stream"])
+            records = iter([tuple(record) for record in state["stream"].pop("records")])
+        return LineSnapshot(state, records=records)
+
+    def save(self, path):
+        with open(path, "w") as file:
+            json.dump(self.as_dict(), file)
+
+    @staticmethod
+    def load(path):
+        with open(path) as file:
+            return LineSnapshot.from_dict(json.load(file))
+
+
+if __name__ == "__main__":
+    # Runs the example work order for 600 s, then continues three branches from that point:
+    # the plain continuation, one with the fast rail planner and one restored from the serialized snapshot
+    order = ["Test1", "Test4", "Test2", "Test3", "Test1"]
+    line = LineSimulation(bathData, manipData, [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in order],
+                          event_driven=True, log=EventLog(LogMode.SILENT))
+    while line.step_counter < 600 and not line.step():
+        pass
+    snapshot = LineSnapshot.capture(line)
+    print(f"Captured at {line.step_counter}s, {line.finished_count} carriers finished, {len(json.dumps(snapshot.as_dict()))} bytes as JSON")
+    branches = {
+        "continued": snapshot.restore(log=EventLog(LogMode.SILENT)),
+        "rail planner": snapshot.restore(log=EventLog(LogMode.SILENT), rail_planner=RailPlanner()),
+        "from JSON": LineSnapshot.from_dict(json.loads(json.dumps(snapshot.as_dict()))).restore(log=EventLog(LogMode.SILENT)),
+    }
+    line.run()
+    print(f"original: {line.step_counter}s")
+    for name, branch in branches.items():
+        print(f"{name}: {branch.run()}s")
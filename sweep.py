@@ -0,0 +1,172 @@
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from main import LineSimulation, Manipulator, RecipeStep, Carrier, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+from takt_bound import TaktBound
+from cyclic_schedule import timing_constants, timing_parameters
+"""
+Scenario sweep over line layouts and timing constants.
+Every combination of the parameter grid is simulated as an independent LineSimulation,
+the simulations are spread over a process pool and their results are collected into one table.
+"""
+
+"""
+Values used for parameters which are not a part of the grid.
+"""
+DEFAULT_PARAMETERS = {
+    "manip_data": manipData,  # manipulator ranges and starting positions
+    "speed": Manipulator.SPEED,
+    "lift_time": Manipulator.LIFT_TIME,
+    "drip_time": RecipeStep.DRIP_TIME,
+}
+
+TABLE_COLUMNS = ["variant", "manip_data", "speed", "lift_time", "drip_time", "status", "cycle_time", "avg_time_between", "lower_bound"]
+
+
+def expand_grid(grid):
+    """
+    :param grid: dictionary of parameter name -> list of values, see DEFAULT_PARAMETERS for the names
+    :return: list of parameter dictionaries, one for every combination of the grid values
+    """
+    unknown = set(grid) - set(DEFAULT_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters {sorted(unknown)}, expected some of {sorted(DEFAULT_PARAMETERS)}")
+
+    names = list(grid)
+    variants = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        variant = dict(DEFAULT_PARAMETERS)
+        variant.update(zip(names, values))
+        variants.append(variant)
+    return variants
+
+
+def simulate_variant(variant, recipe_names, bath_data=bathData):
+    """
+    Runs a single variant of the sweep, called within the worker processes.
+    Timing constants are class level, they are set for the time of the run and restored afterwards.
+    :param variant: parameter dictionary, see expand_grid
+    :param recipe_names: work order given as a list of recipe template names
+    :param bath_data: line definition shared by all variants
+    :return: row of the result table
+    """
+    parameters = timing_parameters(variant["lift_time"], variant["speed"], variant["drip_time"])
+    row = {name: variant[name] for name in DEFAULT_PARAMETERS}
+    with timing_constants(parameters):
+        carriers = [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in recipe_names]
+        line = LineSimulation(bath_data, variant["manip_data"], carriers, event_driven=True, log=EventLog(LogMode.SILENT))
+        if not line.validate():
+            row.update(status="invalid", cycle_time=None, avg_time_between=None)
+            return row
+        line.run()
+
+    status = "done" if len(line.finished_carriers) >= line.carriers_to_move else "overflow"
+    row.update(status=status, cycle_time=line.step_counter, avg_time_between=line.avg_time_between)
+    return row
+
+
+def variant_bound(variant, recipe_names, bath_data=bathData):
+    """
+    :return: lower bound of the cycle time of the variant (see TaktBound), None if some recipe can't be processed
+    """
+    bound = TaktBound(bath_data, variant["manip_data"], variant["lift_time"], variant["speed"], variant["drip_time"])
+    return bound.cycle_time([RECIPE_TEMPLATES[name] for name in recipe_names])
+
+
+def run_sweep(grid, recipe_names, bath_data=bathData, workers=None, prune=False):
+    """
+    Simulates every variant of the grid, using all cores unless specified otherwise.
+    :param grid: dictionary of parameter name -> list of values
+    :param recipe_names: work order given as a list of recipe template names
+    :param bath_data: line definition shared by all variants
+    :param workers: number of worker processes (defaults to the number of cores)
+    :param prune: only look for the shortest cycle time, variants are simulated in the order of their lower bounds
+        and the ones whose bound can't beat the best cycle time simulated so far are left out (status "pruned")
+    :return: list of result rows in the order of the grid expansion
+    """
+    variants = expand_grid(grid)
+    bounds = [variant_bound(variant, recipe_names, bath_data) for variant in variants]
+    workers = workers or os.cpu_count()
+    if prune:
+        rows = run_pruned(variants, bounds, recipe_names, bath_data, workers)
+    else:
+        chunk_size = max(1, len(variants) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = list(executor.map(simulate_variant, variants, itertools.repeat(recipe_names),
+                                     itertools.repeat(bath_data), chunksize=chunk_size))
+    for index, row in enumerate(rows):
+        row["variant"] = index
+        row["lower_bound"] = bounds[index]
+    return rows
+
+
+def run_pruned(variants, bounds, recipe_names, bath_data, workers):
+    """
+    Simulates the variants with the lowest bounds first, a few simulations per worker are in flight at a time
+    so the best cycle time is known before the later variants are submitted.
+    :return: list of result rows in the order of the variants
+    """
+    # variants the bound can't judge (recipes out of reach of the manipulators) are simulated first, they fail fast
+    order = sorted(range(len(variants)), key=lambda index: (bounds[index] is not None, bounds[index] or 0))
+    rows = [None] * len(variants)
+    best = None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        position = 0
+        while position < len(order) or running:
+            while position < len(order) and len(running) < workers * 2:
+                index = order[position]
+                position += 1
+                if best is not None and bounds[index] is not None and bounds[index] >= best:
+                    rows[index] = {name: variants[index][name] for name in DEFAULT_PARAMETERS}
+                    rows[index].update(status="pruned", cycle_time=None, avg_time_between=None)
+                    continue
+                running[executor.submit(simulate_variant, variants[index], recipe_names, bath_data)] = index
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                rows[index] = future.result()
+                if rows[index]["status"] == "done" and (best is None or rows[index]["cycle_time"] < best):
+                    best = rows[index]["cycle_time"]
+    return rows
+
+
+def print_table(rows):
+    for row in rows:
+        avg = "-" if row["avg_time_between"] is None else f"{row['avg_time_between']:.2f}s"
+        cycle = "-" if row["cycle_time"] is None else f"{row['cycle_time']}s"
+        bound = "-" if row["lower_bound"] is None else f"{row['lower_bound']}s"
+        print(f"{row['variant']:>5} | speed {row['speed']} | lift {row['lift_time']} | drip {row['drip_time']} | "
+              f"{row['status']:<8} | cycle {cycle:>7} | bound {bound:>7} | avg between {avg:>8} | {row['manip_data']}")
+
+
+def save_table(rows, path):
+    """
+    Stores the sweep results as a CSV table.
+    """
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=TABLE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    # Example sweep, shifting the starting positions of manipulators and varying the timing constants
+    grid = {
+        "manip_data": [
+            manipData,
+            [([0,1,2,3,4,5], 0), ([4,5,6,7,8,9,10], 4), ([8,9,10,11,12,13], 8), ([12,13,14,15,16,17], 12), ([17,18,19,20,21,22,23], 17)],
+        ],
+        "speed": [0.5, 0.6, 0.8],
+        "lift_time": [12, 16],
+        "drip_time": [15, 20],
+    }
+    work_order = ["Test1", "Test4", "Test2", "Test3", "Test1"]
+
+    results = run_sweep(grid, work_order)
+    print_table(results)
+    save_table(results, "sweep_results.csv")
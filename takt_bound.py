@@ -0,0 +1,147 @@
+import math
+from collections import Counter
+
+from main import Recipe, RECIPE_TEMPLATES, bathData, manipData
+from cyclic_schedule import LineTiming, move_duration, timing_parameters
+"""
+Analytic lower bounds of the takt (average time between carriers) and of the cycle time of a work order,
+the rigorous version of calculate_line_takt in experimental/Greedy_algorithm.py. Nothing is simulated, a bound costs
+a few dictionary lookups per recipe, so it can rule out line configurations before simulating them (see sweep.py).
+
+Three resources limit the line:
+    - manipulators: every move keeps its manipulator busy for at least its move duration (see cyclic_schedule.move_duration)
+      plus the step between tasking and acting. Moves between baths shared by neighbouring manipulators may be done
+      by either of them, so the work is bounded per group of neighbouring manipulators: the moves only the group can do
+      are shared by its members at best,
+    - baths: a bath holds one carrier from lowering it in, through the submersion, until it is lifted out,
+    - line entry: a carrier enters at most every second step.
+The cycle time of a work order is also bounded by the flow time of its carriers (submersions and moves of one carrier
+back to back) and by the work the whole order puts on each resource.
+"""
+
+
+class RecipeLoad:
+    """
+    Resource usage of a single carrier following a recipe, in simulation steps.
+    """
+    def __init__(self, group_work, bath_occupancy, flow_time):
+        self.group_work = group_work # (first manipulator id, last manipulator id) -> work of the moves only the group can do
+        self.bath_occupancy = bath_occupancy # bath id -> steps the carrier keeps the bath occupied
+        self.flow_time = flow_time # steps from the loading start until the end of the last move
+
+
+class TaktBound:
+    """
+    Lower bounds for a line (baths, manipulators, timing constants), see takt and cycle_time.
+    Loads of recipes are computed once per template and cached.
+    """
+    ENTRY_INTERVAL = 2 # minimal steps between two carriers entering the line
+
+    def __init__(self, bath_data, manip_data, lift_time=None, speed=None, drip_time=None, acceleration_time=None):
+        """
+        :param bath_data: list of (name, distance in mm, submergable flag) tuples, see bathData
+        :param manip_data: list of (operating range, starting position) tuples, see manipData
+        :param lift_time: defaults to Manipulator.LIFT_TIME, similarly for the other timing constants
+        """
+        self.parameters = timing_parameters(lift_time, speed, drip_time, acceleration_time)
+        self.timing = LineTiming(bath_data, manip_data, self.parameters)
+        count = len(manip_data)
+        self.groups = [(first, last) for first in range(1, count + 1) for last in range(first, count + 1)]
+        self.loads = {} # RecipeTemplate (or Recipe) -> RecipeLoad, None if some move can't be done by any manipulator
+
+    def recipe_load(self, template):
+        """
+        :param template: RecipeTemplate, or the Recipe of a carrier
+        :return: RecipeLoad of the template, None if the line can't process it
+        """
+        if template in self.loads:
+            return self.loads[template]
+        if isinstance(template, Recipe):
+            bath_ids = [step.bathID for step in template.executionList]
+            submersion_times = [step.submersionTime for step in template.executionList]
+        else:
+            bath_ids, submersion_times = template.bath_ids, template.submersion_times
+        # steps of a second, fractions are rounded up like LineSimulation.ticks does
+        submersion_times = [math.ceil(time) for time in submersion_times]
+        lift = self.timing.lift_time
+        group_work = dict.fromkeys(self.groups, 0)
+        bath_occupancy = Counter()
+        flow_time = 0
+        for k in range(len(bath_ids) - 1):
+            from_bath, to_bath = bath_ids[k], bath_ids[k + 1]
+            hoists = [index + 1 for index, reach in enumerate(self.timing.ranges) if from_bath in reach and to_bath in reach]
+            if not hoists:
+                self.loads[template] = None
+                return None
+            durations = [move_duration(self.timing, hoist, from_bath, to_bath, self.parameters["drip_time"], loading=k == 0)
+                         for hoist in hoists]
+            # a tasked manipulator acts one step later at the earliest, even when it already waits at the bath
+            work = min(duration + self.timing.latency(hoist, from_bath, from_bath) for hoist, duration in zip(hoists, durations))
+            for first, last in self.groups:
+                if first <= hoists[0] and hoists[-1] <= last:
+                    group_work[(first, last)] += work
+            flow_time += min(durations)
+            if k > 0:
+                # picked up at the earliest one step after the submersion ended, lowering and lifting keep the bath occupied too
+                flow_time += max(submersion_times[k], 1)
+                bath_occupancy[from_bath] += max(submersion_times[k], 1) + 2 * lift + 1
+        self.loads[template] = RecipeLoad(group_work, bath_occupancy, flow_time)
+        return self.loads[template]
+
+    def bottleneck(self, templates):
+        """
+        :param templates: RecipeTemplate (or Recipe) of every carrier of a work order (or of a representative mix)
+        :return: (total work of the busiest resource, its description), None if the line can't process some recipe
+        """
+        group_work = Counter()
+        bath_occupancy = Counter()
+        for template, count in Counter(templates).items():
+            load = self.recipe_load(template)
+            if load is None:
+                return None
+            for group, work in load.group_work.items():
+                group_work[group] += work * count
+            for bath_id, occupancy in load.bath_occupancy.items():
+                bath_occupancy[bath_id] += occupancy * count
+        best = self.ENTRY_INTERVAL * len(templates), "line entry"
+        for (first, last), work in group_work.items():
+            # rounded down, the bound has to stay below every integer schedule
+            share = work // (last - first + 1)
+            if share > best[0]:
+                best = share, f"manipulators {first}-{last}" if first != last else f"manipulator {first}"
+        for bath_id, occupancy in bath_occupancy.items():
+            if occupancy > best[0]:
+                best = occupancy, f"bath {bath_id}"
+        return best
+
+    def takt(self, mix):
+        """
+        :param mix: RecipeTemplates of a representative sequence of carriers, e.g. [template] for a single recipe
+        :return: lower bound of the long run average steps between carriers, None if the line can't process some recipe
+        """
+        bottleneck = self.bottleneck(mix)
+        return None if bottleneck is None else bottleneck[0] / len(mix)
+
+    def cycle_time(self, templates):
+        """
+        :param templates: RecipeTemplate of every carrier of the work order, in the order of entering the line
+        :return: lower bound of the simulated cycle time of the work order, None if the line can't process some recipe
+        """
+        if not templates:
+            return 0
+        bottleneck = self.bottleneck(templates)
+        if bottleneck is None:
+            return None
+        # carrier n enters the line 2n steps after the first one at the earliest and has to flow through it
+        flow = max(self.ENTRY_INTERVAL * index + self.recipe_load(template).flow_time for index, template in enumerate(templates))
+        return max(bottleneck[0], flow)
+
+
+if __name__ == "__main__":
+    # Takt bounds of the example recipes and the bound of the example work order of main.py
+    bound = TaktBound(bathData, manipData)
+    for name, template in sorted(RECIPE_TEMPLATES.items()):
+        work, resource = bound.bottleneck([template])
+        print(f"{name}: takt >= {work}s (bottleneck {resource}), flow time >= {bound.recipe_load(template).flow_time}s")
+    order = [RECIPE_TEMPLATES[name] for name in ("Test1", "Test4", "Test2", "Test3", "Test1")]
+    print(f"Example work order: cycle time >= {bound.cycle_time(order)}s")
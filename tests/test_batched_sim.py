@@ -0,0 +1,37 @@
+from main import (LineSimulation, Carrier, Recipe, RecipeStep, EventLog, LogMode, bathData, manipData,
+                  recipe_template1, recipe_template2, recipe_template3, recipe_template4)
+from batched_sim import BatchedLineSimulation, monte_carlo
+
+WORK_ORDER = [recipe_template1, recipe_template4, recipe_template2, recipe_template3, recipe_template1]
+
+
+def object_line(simulation, replica):
+    """
+    :return: finished LineSimulation with the submersion and drip times of the replica
+    """
+    carriers = []
+    for c, template in enumerate(WORK_ORDER):
+        steps = tuple(RecipeStep(bath_id, int(simulation.submersion_times[replica, c, s]), int(simulation.drip_times[replica, c, s]))
+                      for s, (bath_id, _) in enumerate(template.step_definitions))
+        carriers.append(Carrier(Recipe(template.name, steps)))
+    line = LineSimulation(bathData, manipData, carriers, event_driven=True, log=EventLog(LogMode.SILENT))
+    line.run()
+    return line
+
+
+def test_nominal_times_match_the_object_model():
+    simulation = BatchedLineSimulation(bathData, manipData, WORK_ORDER, replicas=2)
+    simulation.run()
+    line = object_line(simulation, 0)
+    for replica in range(2):
+        assert list(simulation.deque_times[replica]) == list(line.deque_times)
+        assert simulation.cycle_times[replica] == line.step_counter
+
+
+def test_jittered_replicas_match_the_object_model():
+    simulation = monte_carlo(bathData, manipData, WORK_ORDER, replicas=30, submersion_jitter=0.3, drip_jitter=0.5, seed=4)
+    assert simulation.completed.all()
+    for replica in range(simulation.replicas):
+        line = object_line(simulation, replica)
+        assert list(simulation.deque_times[replica]) == list(line.deque_times)
+        assert simulation.cycle_times[replica] == line.step_counter
@@ -0,0 +1,34 @@
+import pytest
+
+from main import LineSimulation, WorkOrderStream, CarrierState, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+
+NAMES = sorted(RECIPE_TEMPLATES)
+
+
+def streamed_line(event_driven):
+    records = [(NAMES[index * 7 % len(NAMES)], index * 120) for index in range(15)]
+    return LineSimulation(bathData, manipData, WorkOrderStream(records, RECIPE_TEMPLATES), event_driven=event_driven,
+                          log=EventLog(LogMode.SILENT))
+
+
+def test_servicing_manipulators_follow_the_ranges():
+    line = streamed_line(False)
+    for bath in line.baths:
+        expected = [manipulator for manipulator in line.manipulators if bath.bathUUID in manipulator.operating_range_set]
+        assert list(line.servicing_manipulators[bath.bathUUID]) == expected
+
+
+@pytest.mark.parametrize("event_driven", [False, True])
+def test_tracked_baths_cover_every_bath_needing_action(event_driven):
+    line = streamed_line(event_driven)
+    tracked = {CarrierState.UNSERVICED: line.awaiting_load, CarrierState.BATHING: line.bathing_baths,
+               CarrierState.BATH_COMPLETED: line.completed_baths}
+    while not line.step():
+        # stale entries are allowed, they are dropped by candidate_baths
+        for bath in line.baths:
+            carrier = bath.containedCarrier
+            if carrier is not None and carrier.state in tracked:
+                assert bath.bathUUID in tracked[carrier.state]
+        if event_driven:
+            line.skip_idle_steps()
+    assert line.finished_count == 15
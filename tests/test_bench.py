@@ -0,0 +1,29 @@
+import json
+
+from bench import SCENARIOS, build_line, compare_results, run_suite
+
+
+def test_scenarios_are_reproducible():
+    for scenario in SCENARIOS:
+        first, second = build_line(scenario, True), build_line(scenario, True)
+        assert first.validate()
+        if first.order_stream is not None:
+            assert list(first.order_stream.records) == list(second.order_stream.records)
+
+
+def test_report(capsys):
+    report = json.loads(json.dumps(run_suite(["example_5"])))
+    assert [result["engine"] for result in report["results"]] == ["step", "event"]
+    for result in report["results"]:
+        assert result["completed"] and result["simulated_seconds"] == 924
+        assert result["peak_memory_bytes"] > 0
+        # shares of the profiled time, the rest of the step isn't split into phases
+        assert 0 < sum(result["phase_shares"].values()) <= 1 + 1e-9
+    capsys.readouterr()
+
+    baseline = json.loads(json.dumps(report))
+    baseline["results"][0]["simulated_seconds"] += 1
+    compare_results(baseline, report)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 3
+    assert lines[1].endswith("(simulated time differs!)") and not lines[2].endswith("(simulated time differs!)")
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from main import RecipeTemplate, RECIPE_TEMPLATES, bathData, manipData
+from cp_scheduler import CPScheduler
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"]
+
+
+def scheduler(names):
+    return CPScheduler(bathData, manipData, [RECIPE_TEMPLATES[name] for name in names])
+
+
+def assert_manipulators_do_one_move_at_a_time(scheduler, schedule):
+    busy = {}
+    for carrier, (starts, hoists) in enumerate(zip(schedule.starts, schedule.hoists)):
+        for move, (start, hoist) in enumerate(zip(starts, hoists)):
+            busy.setdefault(hoist, []).append((start, scheduler.move_end(carrier, move, start, hoist)))
+    for intervals in busy.values():
+        intervals.sort()
+        assert all(end <= next_start for (_, end), (next_start, _) in zip(intervals, intervals[1:]))
+
+
+def test_example_order():
+    order = scheduler(ORDER)
+    schedule = order.solve(time_limit=30, workers=1)
+    assert schedule.status == "OPTIMAL" and schedule.bound == schedule.makespan and schedule.gap == 0
+    assert schedule.makespan <= schedule.greedy_cycle_time
+    assert [len(starts) for starts in schedule.starts] == [len(RECIPE_TEMPLATES[name].bath_ids) - 1 for name in ORDER]
+    assert_manipulators_do_one_move_at_a_time(order, schedule)
+    validation = schedule.validate()
+    assert validation["completed"] and validation["max_delay"] == 0
+    assert schedule.makespan <= validation["cycle_time"] < schedule.greedy_cycle_time
+
+
+def test_unreachable_recipe():
+    with pytest.raises(ValueError):
+        CPScheduler(bathData, manipData, [RecipeTemplate("Unreachable", [(0, 0), (6, 60), (1, 60), (23, 0)])])
+
+
+def test_rolling_horizon():
+    names = ORDER * 3
+    rolling = scheduler(names)
+    schedule = rolling.solve_rolling(window=6, overlap=2, time_limit=10, workers=1)
+    assert schedule.windows == 4 and schedule.status == "FEASIBLE" and schedule.bound is None
+    assert len(schedule.starts) == len(names)
+    assert_manipulators_do_one_move_at_a_time(rolling, schedule)
+    assert schedule.makespan >= scheduler(names).solve(time_limit=30, workers=1).bound
+    assert schedule.validate()["completed"]
+
+    single = scheduler(ORDER).solve_rolling(window=len(ORDER), overlap=0, time_limit=10, workers=1)
+    assert single.windows == 1 and single.makespan == scheduler(ORDER).solve(time_limit=30, workers=1).makespan
+
+
+@pytest.mark.parametrize("window, overlap", [(0, 0), (5, 5), (5, -1)])
+def test_rolling_horizon_windows(window, overlap):
+    with pytest.raises(ValueError):
+        scheduler(ORDER).solve_rolling(window=window, overlap=overlap)
+
+
+@pytest.mark.parametrize("seed, acceleration_time", [(0, 0), (1, 0), (2, 2), (3, 2)])
+def test_replay_matches_the_makespan(seed, acceleration_time):
+    names = sorted(RECIPE_TEMPLATES)
+    generator = random.Random(seed)
+    order = CPScheduler(bathData, manipData, [RECIPE_TEMPLATES[generator.choice(names)] for _ in range(10)],
+                        acceleration_time=acceleration_time)
+    # the off loader takes the last carrier 2 steps after the end of its last move
+    for schedule in (order.solve(time_limit=10, workers=1), order.solve_rolling(window=5, overlap=2, time_limit=5, workers=1)):
+        validation = schedule.validate()
+        assert validation["completed"] and validation["max_delay"] == 0
+        assert validation["cycle_time"] == schedule.makespan + 2
@@ -0,0 +1,44 @@
+import pytest
+
+from main import LineSimulation, RecipeTemplate, WorkOrderStream, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+from cyclic_schedule import CyclicDispatcher, TimetableDispatcher, solve_cyclic_schedule, timing_constants, validate_schedule
+
+
+@pytest.mark.parametrize("name, period", [("Test1", 107), ("Test2", 107), ("Test3", 107), ("Test4", 112)])
+def test_example_recipes(name, period):
+    schedule = solve_cyclic_schedule(bathData, manipData, RECIPE_TEMPLATES[name])
+    assert schedule.status == "OPTIMAL"
+    assert schedule.period == period
+    validation = validate_schedule(schedule)
+    assert validation["completed"]
+    assert validation["measured_period"] == period
+
+
+def test_recipe_visiting_every_bath():
+    template = RecipeTemplate("Full", [(0, 0)] + [(bath_id, 5 + 7 * bath_id % 30) for bath_id in range(1, 23)] + [(23, 0)])
+    schedule = solve_cyclic_schedule(bathData, manipData, template, time_limit=30)
+    assert schedule.status == "OPTIMAL"
+    validation = validate_schedule(schedule, carriers=20)
+    assert validation["completed"]
+    assert validation["measured_period"] == schedule.period
+
+
+def test_timetable_dispatcher_follows_explicit_timetable():
+    schedule = solve_cyclic_schedule(bathData, manipData, RECIPE_TEMPLATES["Test4"])
+    count = 10
+    starts = [[index * schedule.period + start for start in schedule.starts] for index in range(count)]
+    hoists = [schedule.hoists] * count
+    runs = []
+    for dispatcher_type in (CyclicDispatcher, TimetableDispatcher):
+        with timing_constants(schedule.parameters):
+            if dispatcher_type is CyclicDispatcher:
+                dispatcher = CyclicDispatcher(schedule)
+            else:
+                dispatcher = TimetableDispatcher(schedule.parameters, starts=starts, hoists=hoists)
+            name = schedule.template.name
+            records = [(name, time) for time in schedule.release_times(count)]
+            line = LineSimulation(bathData, manipData, WorkOrderStream(records, {name: schedule.template}), event_driven=True,
+                                  log=EventLog(LogMode.SILENT), dispatcher=dispatcher)
+            line.run()
+        runs.append((line.step_counter, list(line.deque_times), dispatcher.max_delay))
+    assert runs[0] == runs[1]
@@ -0,0 +1,36 @@
+import pytest
+
+from main import LineSimulation, Carrier, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+from dispatch_search import clone_line, lower_bound, state_key
+from takt_bound import TaktBound
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"] * 2
+
+
+def line_of(time_unit):
+    carriers = [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in ORDER]
+    return LineSimulation(bathData, manipData, carriers, event_driven=True, log=EventLog(LogMode.SILENT), time_unit=time_unit)
+
+
+@pytest.mark.parametrize("time_unit", [2, 1, 0.5, 0.1])
+def test_lower_bound_never_exceeds_the_cycle_time(time_unit):
+    line = line_of(time_unit)
+    takt_bound = TaktBound(bathData, manipData)
+    bounds = []
+    while not line.step():
+        bounds.append(lower_bound(line, takt_bound))
+        line.skip_idle_steps()
+    assert line.finished_count == len(ORDER)
+    assert max(bounds) <= line.step_counter
+
+
+def test_state_key_is_the_state_itself():
+    line = line_of(1)
+    for _ in range(300):
+        line.step()
+    key = state_key(line)
+    assert isinstance(key, tuple)
+    copy = clone_line(line)
+    assert state_key(copy) == key
+    copy.step()
+    assert state_key(copy) != key
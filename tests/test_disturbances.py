@@ -0,0 +1,95 @@
+import csv
+
+import pytest
+
+from main import LineSimulation, Carrier, WorkOrderStream, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+from dispatch_search import ScriptedDispatcher
+from disturbances import Disturbances
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"] * 3
+
+
+def scripted_line(choices, time_unit=1):
+    carriers = [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in ORDER]
+    return LineSimulation(bathData, manipData, carriers, event_driven=True, log=EventLog(LogMode.SILENT),
+                          dispatcher=ScriptedDispatcher(choices, max_alternatives=4), time_unit=time_unit)
+
+
+def run_until(line, time):
+    while line.step_counter < time and not line.step():
+        line.skip_idle_steps()
+
+
+def trajectory(line):
+    return line.step_counter, list(line.deque_times), line.dispatcher.assignments
+
+
+def test_replan_leaves_the_line_unchanged():
+    choices = [1, 0, 1, 1, 0, 1, 2, 1, 0, 1] * 5
+    lines = []
+    for replanned in (False, True):
+        line = scripted_line(choices)
+        run_until(line, 600)
+        disturbances = Disturbances(line)
+        disturbances.bath_outage(13, duration=300)
+        if replanned:
+            decisions = line.dispatcher.decisions
+            report = disturbances.replan()
+            assert line.dispatcher.decisions == decisions
+            assert report.cycle_time >= report.baseline_cycle_time
+        line.run()
+        lines.append(line)
+    assert lines[0].dispatcher.decisions > 0
+    assert trajectory(lines[1]) == trajectory(lines[0])
+
+
+def test_windows_are_given_in_seconds():
+    line = scripted_line([], time_unit=0.1)
+    run_until(line, 50)
+    disturbances = Disturbances(line)
+    disturbances.bath_outage(13, duration=60, start=400)
+    disturbances.stop_manipulator(3, duration=30)
+    assert disturbances.bath_outages == [(13, 4000, 4600)]
+    assert disturbances.manipulator_stops == [(3, line.step_counter, line.step_counter + 300)]
+
+
+def streamed_line(names, log=None):
+    records = [(name, 0) for name in names]
+    return LineSimulation(bathData, manipData, WorkOrderStream(records, RECIPE_TEMPLATES), event_driven=True,
+                          log=log or EventLog(LogMode.SILENT))
+
+
+def test_streamed_hot_order_keeps_its_carrier():
+    line = streamed_line(ORDER)
+    run_until(line, 300)
+    disturbances = Disturbances(line)
+    hot = Carrier(RECIPE_TEMPLATES["Test2"].create_instance())
+    disturbances.hot_order(hot)
+    assert disturbances.hot_orders == [hot.carUUID]
+    assert hot.carUUID in disturbances.replan().exits
+    line.run()
+    assert hot in line.finished_carriers and line.finished_count == len(ORDER) + 1
+
+
+def test_hot_order_of_unknown_recipe():
+    line = LineSimulation(bathData, manipData, WorkOrderStream([("Test1", 0)] * 3, {"Test1": RECIPE_TEMPLATES["Test1"]}),
+                          log=EventLog(LogMode.SILENT))
+    line.step()
+    with pytest.raises(ValueError):
+        Disturbances(line).hot_order(Carrier(RECIPE_TEMPLATES["Test2"].create_instance()))
+
+
+@pytest.mark.parametrize("event_driven", [False, True])
+def test_stopped_manipulator_stays_still(tmp_path, event_driven):
+    path = tmp_path / "events.csv"
+    line = streamed_line(ORDER[:5], EventLog(LogMode.EVENTS, str(path)))
+    line.event_driven = event_driven
+    disturbances = Disturbances(line)
+    disturbances.stop_manipulator(1, duration=2000)
+    line.run()
+    assert line.finished_count == 5
+    with open(path, newline="") as file:
+        events = list(csv.DictReader(file))
+    assert not [event for event in events if event["manipulator"] == "1" and int(event["time"]) < 2000]
+    # nobody else reaches the line entry, the first carrier is loaded once the manipulator is back
+    assert min(int(event["time"]) for event in events if event["event"] == "load") >= 2000
@@ -0,0 +1,52 @@
+import pytest
+
+from main import (LineSimulation, WorkOrderStream, Carrier, RailPlanner, EventLog, LogMode, RECIPE_TEMPLATES,
+                  bathData, manipData)
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"] * 2
+
+
+def finished_line(event_driven, time_unit=1, rail_planner=None, released=False):
+    if released:
+        # carriers released in intervals, so the line idles in between
+        work_order = WorkOrderStream([(name, index * 400) for index, name in enumerate(ORDER)], RECIPE_TEMPLATES)
+    else:
+        work_order = [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in ORDER]
+    line = LineSimulation(bathData, manipData, work_order, event_driven=event_driven, log=EventLog(LogMode.SILENT),
+                          rail_planner=rail_planner, time_unit=time_unit)
+    line.run()
+    return line
+
+
+def result(line):
+    return (line.step_counter, line.finished_count, list(line.deque_times),
+            [carrier.requiredProcedure.name for carrier in line.finished_carriers])
+
+
+@pytest.mark.parametrize("time_unit", [1, 0.5, 0.1])
+@pytest.mark.parametrize("released", [False, True])
+def test_event_driven_run_matches_the_step_by_step_run(time_unit, released):
+    tick = finished_line(False, time_unit, released=released)
+    event = finished_line(True, time_unit, released=released)
+    assert tick.finished_count == len(ORDER)
+    assert result(event) == result(tick)
+
+
+def test_event_driven_run_matches_with_a_rail_planner():
+    tick = finished_line(False, rail_planner=RailPlanner(0.5))
+    event = finished_line(True, rail_planner=RailPlanner(0.5))
+    assert result(event) == result(tick)
+
+
+def test_event_driven_run_simulates_fewer_steps():
+    steps = {}
+    for event_driven in (False, True):
+        work_order = WorkOrderStream([(name, index * 400) for index, name in enumerate(ORDER)], RECIPE_TEMPLATES)
+        line = LineSimulation(bathData, manipData, work_order, event_driven=event_driven, log=EventLog(LogMode.SILENT))
+        count = 1
+        while not line.step():
+            count += 1
+            if event_driven:
+                line.skip_idle_steps()
+        steps[event_driven] = count
+    assert steps[True] * 5 < steps[False]
@@ -0,0 +1,61 @@
+import csv
+
+import pytest
+
+from main import LineSimulation, Carrier, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"]
+
+
+def run(log, event_driven=False):
+    line = LineSimulation(bathData, manipData, [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in ORDER],
+                          event_driven=event_driven, log=log)
+    return line.run()
+
+
+def read_events(path):
+    with open(path, newline="") as file:
+        return list(csv.reader(file))
+
+
+def test_modes_print_accordingly(capsys, tmp_path):
+    assert run(EventLog(LogMode.SILENT)) == 924
+    assert capsys.readouterr().out == ""
+    assert run(EventLog(LogMode.SUMMARY)) == 924
+    assert capsys.readouterr().out.splitlines() == [
+        "Workorder processed successfully!",
+        "Whole cycle completed in 924s, average time between carrier dequeing is 144.25s",
+    ]
+    assert run(EventLog(LogMode.EVENTS, tmp_path / "events.csv")) == 924
+    assert len(capsys.readouterr().out.splitlines()) == 2
+    assert run(EventLog(LogMode.VERBOSE)) == 924
+    assert len(capsys.readouterr().out.splitlines()) > 924
+
+
+def test_events_are_written_in_bulk(tmp_path, monkeypatch):
+    run(EventLog(LogMode.EVENTS, tmp_path / "whole.csv"))
+    monkeypatch.setattr(EventLog, "BUFFER_SIZE", 7)
+    run(EventLog(LogMode.EVENTS, tmp_path / "chunks.csv"))
+    events = read_events(tmp_path / "whole.csv")
+    assert events[0] == ["time", "manipulator", "carrier", "event"]
+    # carrier ids differ between the runs
+    assert [(time, manipulator, kind) for time, manipulator, _, kind in events] == \
+           [(time, manipulator, kind) for time, manipulator, _, kind in read_events(tmp_path / "chunks.csv")]
+    times = [int(time) for time, _, _, _ in events[1:]]
+    assert times == sorted(times)
+    assert [event for _, _, _, event in events].count("load") == len(ORDER)
+
+
+def test_event_driven_run_records_the_same_actions(tmp_path):
+    run(EventLog(LogMode.EVENTS, tmp_path / "tick.csv"))
+    run(EventLog(LogMode.EVENTS, tmp_path / "event.csv"), event_driven=True)
+    # steps in which a manipulator is held or pushed aside are skipped in closed form (see advance_idle_ticks),
+    # their repeated evade/hold events are only recorded by the step by step run
+    tick, event = ([(time, manipulator, kind) for time, manipulator, _, kind in read_events(tmp_path / name)
+                    if not kind.startswith(("evade", "hold"))] for name in ("tick.csv", "event.csv"))
+    assert event == tick
+
+
+def test_events_mode_needs_a_path():
+    with pytest.raises(ValueError):
+        EventLog(LogMode.EVENTS)
@@ -0,0 +1,37 @@
+from main import (LineSimulation, Carrier, RecipeTemplate, EventLog, LogMode, bathData, manipData,
+                  recipe_template1, recipe_template2, recipe_template3, recipe_template4)
+
+EXAMPLE = [recipe_template1, recipe_template4, recipe_template2, recipe_template3, recipe_template1]
+
+
+def example_line(templates=EXAMPLE, manip_data=manipData):
+    return LineSimulation(bathData, manip_data, [Carrier(template.create_instance()) for template in templates],
+                          log=EventLog(LogMode.SILENT))
+
+
+def test_example_work_order():
+    line = example_line()
+    assert line.validate()
+    assert line.run() == 924
+    assert line.finished_count == 5 and line.avg_time_between == 144.25
+    assert [carrier.requiredProcedure.name for carrier in line.finished_carriers] == [template.name for template in EXAMPLE]
+
+
+def test_lines_are_independent():
+    alone = example_line()
+    alone.run()
+    first, second = example_line(), example_line(EXAMPLE[::-1])
+    while not (first.is_work_order_done and second.is_work_order_done):
+        for line in (first, second):
+            if not line.is_work_order_done:
+                line.step()
+    assert first.step_counter == alone.step_counter
+    assert list(first.deque_times) == list(alone.deque_times)
+    assert second.finished_count == 5
+
+
+def test_validate_rejects_unreachable_recipes():
+    # bath 6 is only reached by the second manipulator, bath 1 only by the first one, no manipulator moves between them
+    unreachable = RecipeTemplate("Unreachable", [(0, 0), (6, 60), (1, 60), (23, 0)])
+    assert example_line([unreachable]).validate() is False
+    assert example_line().validate() is True
@@ -0,0 +1,89 @@
+import pytest
+
+from main import LineSimulation, WorkOrderStream, RecipeTemplate, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+from plant import Plant, SharedStation, least_loaded, first_free
+
+RECORDS = [("Test1", 0), ("Test4", 12.25), ("Test2", 130.5), ("Test3", 131), ("Test1", 400.75)]
+
+
+@pytest.mark.parametrize("time_unit", [1, 0.1])
+def test_single_line_plant_matches_line(time_unit):
+    line = LineSimulation(bathData, manipData, WorkOrderStream(RECORDS, RECIPE_TEMPLATES), event_driven=True,
+                          log=EventLog(LogMode.SILENT), time_unit=time_unit)
+    line.run()
+    plant = Plant([(bathData, manipData)], RECORDS, RECIPE_TEMPLATES, time_unit=time_unit)
+    plant.run()
+    assert plant.lines[0].step_counter == line.step_counter
+    assert list(plant.lines[0].deque_times) == list(line.deque_times)
+
+
+def test_overflow_control_counts_seconds():
+    # the second carrier is released after a pause longer than MAX_STEPS steps of 0.1 s but shorter than MAX_STEPS seconds
+    pause = LineSimulation.MAX_STEPS / 2
+    plant = Plant([(bathData, manipData)], [("Test1", 0), ("Test1", pause)], RECIPE_TEMPLATES, time_unit=0.1)
+    plant.run()
+    assert plant.finished_count == 2
+    assert plant.lines[0].deque_times[-1] > plant.ticks(pause)
+
+
+TRANSFER = RecipeTemplate("Transfer", [(0, 0), (5, 4), (10, 3), (12, 5), (17, 3), (18, 10), (19, 30), (23, 0)])
+TEMPLATES = dict(RECIPE_TEMPLATES, Transfer=TRANSFER)
+NAMES = sorted(TEMPLATES)
+SHARED = [(NAMES[index % len(NAMES)], index * 60) for index in range(20)]
+LAYOUTS = [(bathData, manipData), (bathData, manipData)]
+
+
+def cart():
+    return SharedStation("Převážecí vozík předúprava", [(0, 18), (1, 18)])
+
+
+def recipe_names(line):
+    return [carrier.requiredProcedure.name for carrier in line.finished_carriers]
+
+
+@pytest.mark.parametrize("routing", [least_loaded, first_free])
+def test_lines_share_the_work_order(routing):
+    plant = Plant(LAYOUTS, SHARED, TEMPLATES, routing=routing)
+    plant.run()
+    assert plant.finished_count == len(SHARED) and sum(plant.routed) == len(SHARED)
+    assert all(routed > 0 for routed in plant.routed)
+    assert sorted(recipe_names(plant.lines[0]) + recipe_names(plant.lines[1])) == sorted(name for name, _ in SHARED)
+    assert plant.cycle_time < LineSimulation.MAX_STEPS
+
+
+def test_carriers_go_to_capable_lines():
+    # most of the work order is left to the first line, released slower so it doesn't lock up (see LineSimulation.MAX_STEPS)
+    records = [(name, release_time * 2) for name, release_time in SHARED]
+    plant = Plant(LAYOUTS, records, [TEMPLATES, {"Test1": TEMPLATES["Test1"]}])
+    plant.run()
+    assert plant.finished_count == len(records)
+    assert set(recipe_names(plant.lines[1])) == {"Test1"}
+    assert plant.routed == [len(records) - len(plant.lines[1].finished_carriers), len(plant.lines[1].finished_carriers)]
+    with pytest.raises(ValueError):
+        Plant(LAYOUTS, [("Transfer", 0)], [RECIPE_TEMPLATES, RECIPE_TEMPLATES])
+
+
+def test_station_holds_one_carrier():
+    station = cart()
+    plant = Plant(LAYOUTS, SHARED, TEMPLATES, [station])
+    holders = set()
+    while not plant.step():
+        taken = [line_index for line_index, bath_id in station.members
+                 if station.is_taken(plant.lines[line_index], bath_id)]
+        assert len(taken) <= 1
+        holders.update(taken)
+    assert plant.finished_count == len(SHARED)
+    # only the transfer recipe uses the cart
+    assert holders == {0, 1} and station.holds == sum(name == "Transfer" for name, _ in SHARED)
+
+
+@pytest.mark.parametrize("stations", [(), (cart(),)])
+def test_event_driven_plant_matches_stepped(stations):
+    results = []
+    for event_driven in (False, True):
+        plant = Plant(LAYOUTS, SHARED, TEMPLATES, [SharedStation(station.name, station.members) for station in stations],
+                      event_driven=event_driven)
+        plant.run()
+        results.append((plant.cycle_time, plant.routed, [list(line.deque_times) for line in plant.lines],
+                        [recipe_names(line) for line in plant.lines]))
+    assert results[0] == results[1]
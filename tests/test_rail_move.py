@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+from main import LineSimulation, Carrier, Manipulator, RailMove, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData, to_ticks
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"] * 2
+
+
+@pytest.mark.parametrize("start, target", [(0.0, 7.3), (12.5, 1.0), (3.0, 3.6)])
+def test_constant_speed(start, target):
+    move = RailMove(10, start, target, 0.6)
+    assert move.duration == math.ceil(abs(target - start) / 0.6 - RailMove.EPSILON)
+    assert move.arrival_time == 10 + move.duration - 1
+    direction = 1 if target > start else -1
+    for elapsed in range(move.duration):
+        assert move.position(elapsed) == pytest.approx(start + direction * elapsed * 0.6)
+    assert move.position(move.duration) == target and move.position(move.duration + 5) == target
+
+
+@pytest.mark.parametrize("length", [0.5, 2.0, 12.0])
+def test_accelerated_profile(length):
+    move = RailMove(0, 1.0, 1.0 + length, 0.6, acceleration_time=2)
+    # symmetric, continuous and monotone, the whole length at the end of the profile
+    assert move.travelled(move.total_time) == length
+    assert move.travelled(move.total_time / 2) == pytest.approx(length / 2)
+    for boundary in (move.ramp_time, move.ramp_time + move.cruise_time):
+        assert move.travelled(boundary - 1e-9) == pytest.approx(move.travelled(boundary + 1e-9), abs=1e-6)
+    positions = [move.position(elapsed) for elapsed in range(move.duration + 1)]
+    assert positions == sorted(positions) and positions[-1] == 1.0 + length
+    assert move.total_time >= length / 0.6
+
+
+def test_wait_and_time_unit():
+    move = RailMove(0, 2.0, 8.0, 0.6, wait=3, time_unit=0.1)
+    assert move.duration == 3 + 100
+    assert [move.position(elapsed) for elapsed in range(4)] == [2.0] * 4
+    assert move.position(53) == pytest.approx(2.0 + 5 * 0.6)
+
+
+def test_to_ticks():
+    assert to_ticks(12) == 12 and to_ticks(12.5) == 13
+    assert to_ticks(1.2, 0.1) == 12 and to_ticks(1.25, 0.1) == 13
+    assert to_ticks(math.inf, 0.1) == math.inf
+
+
+def test_accelerated_moves_in_both_engines(monkeypatch):
+    monkeypatch.setattr(Manipulator, "ACCELERATION_TIME", 2)
+    results = []
+    for event_driven in (False, True):
+        line = LineSimulation(bathData, manipData, [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in ORDER],
+                              event_driven=event_driven, log=EventLog(LogMode.SILENT))
+        line.run()
+        results.append((line.step_counter, list(line.deque_times)))
+    assert results[0] == results[1]
+    assert results[0][0] > 0 and len(results[0][1]) == len(ORDER)
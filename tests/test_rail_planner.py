@@ -0,0 +1,24 @@
+import pytest
+
+from main import (LineSimulation, WorkOrderStream, RailMove, RailPlanner, EventLog, LogMode, RECIPE_TEMPLATES,
+                  bathData, manipData)
+
+NAMES = sorted(RECIPE_TEMPLATES)
+
+
+@pytest.mark.parametrize("safety_gap", [0.5, 1.0, 2.0])
+@pytest.mark.parametrize("event_driven", [False, True])
+def test_neighbours_keep_the_safety_gap(safety_gap, event_driven):
+    planner = RailPlanner(safety_gap)
+    records = [(NAMES[index * 3 % len(NAMES)], index * 100) for index in range(12)]
+    line = LineSimulation(bathData, manipData, WorkOrderStream(records, RECIPE_TEMPLATES), event_driven=event_driven,
+                          log=EventLog(LogMode.SILENT), rail_planner=planner)
+    while not line.step():
+        distances = [manipulator.distance_rail for manipulator in line.manipulators]
+        assert all(right - left >= safety_gap - RailMove.EPSILON for left, right in zip(distances, distances[1:]))
+        # the planned trajectories stay apart until every planned move finished
+        assert planner.find_conflicts(line.step_counter, line.step_counter + 200) == []
+        if event_driven:
+            line.skip_idle_steps()
+    assert line.finished_count == len(records)
+    assert planner.planned_moves > 0 and planner.evasions > 0
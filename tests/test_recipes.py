@@ -0,0 +1,38 @@
+import tracemalloc
+
+from main import Carrier, RecipeStep, RECIPE_TEMPLATES, recipe_template1
+
+
+def test_carriers_share_the_recipe_of_their_template():
+    first, second = Carrier(recipe_template1.create_instance()), Carrier(recipe_template1.create_instance())
+    assert first.requiredProcedure is second.requiredProcedure
+    assert [(step.bathID, step.submersionTime) for step in first.requiredProcedure.executionList] == \
+           [tuple(definition) for definition in recipe_template1.step_definitions]
+    first.currentStepIndex += 1
+    assert second.currentStepIndex == 0
+
+
+def test_recipe_is_rebuilt_with_a_new_drip_time(monkeypatch):
+    recipe = recipe_template1.create_instance()
+    monkeypatch.setattr(RecipeStep, "DRIP_TIME", RecipeStep.DRIP_TIME + 5)
+    rebuilt = recipe_template1.create_instance()
+    assert rebuilt is not recipe
+    assert all(step.dripTime == RecipeStep.DRIP_TIME for step in rebuilt.executionList)
+    assert recipe_template1.create_instance() is rebuilt
+
+
+def test_carriers_are_small():
+    assert not hasattr(Carrier(recipe_template1.create_instance()), "__dict__")
+    assert not hasattr(RecipeStep(1, 10), "__dict__")
+    assert RecipeStep(1, 10, drip_time=3).dripTime == 3
+    templates = list(RECIPE_TEMPLATES.values())
+    for template in templates:
+        template.create_instance()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        carriers = [Carrier(templates[index % len(templates)].create_instance()) for index in range(20000)]
+        per_carrier = (tracemalloc.get_traced_memory()[0] - before) / len(carriers)
+    finally:
+        tracemalloc.stop()
+    assert per_carrier < 200
@@ -0,0 +1,116 @@
+import json
+import os
+from multiprocessing import Pool
+
+from main import RecipeTemplate, RECIPE_TEMPLATES, bathData, manipData
+from cp_scheduler import CPScheduler, CPSchedule
+from schedule_cache import ScheduleCache, recipe_signature
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"]
+
+
+def scheduler(names, **timing):
+    return CPScheduler(bathData, manipData, [RECIPE_TEMPLATES[name] for name in names], **timing)
+
+
+def unsolvable(*args, **kwargs):
+    raise AssertionError("the cached schedule should have been used")
+
+
+def test_same_order_is_not_solved_again(tmp_path):
+    cache = ScheduleCache(str(tmp_path))
+    first = cache.solve(scheduler(ORDER), time_limit=30, workers=1)
+    repeated = scheduler(ORDER)
+    repeated.solve = unsolvable
+    second = cache.solve(repeated)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert (second.starts, second.hoists, second.makespan, second.status) == \
+           (first.starts, first.hoists, first.makespan, first.status)
+
+
+def test_near_matches_hint_the_solver(tmp_path):
+    cache = ScheduleCache(str(tmp_path))
+    cache.solve(scheduler(ORDER), time_limit=30, workers=1)
+    # the same recipes entering in another order, and an order with one more carrier
+    for names in (ORDER[::-1], ORDER + ["Test2"]):
+        order = scheduler(names)
+        assert cache.get(order) is None and cache.hints(order)
+        assert cache.solve(order, time_limit=30, workers=1) is not None
+    assert (cache.hits, cache.near_hits, cache.misses) == (0, 2, 1)
+    # another line never matches
+    assert cache.hints(scheduler(ORDER, speed=0.5)) == {}
+
+
+def test_recipes_are_keyed_by_their_steps():
+    copy = RecipeTemplate("Copy", RECIPE_TEMPLATES["Test1"].step_definitions)
+    assert recipe_signature(copy) == recipe_signature(RECIPE_TEMPLATES["Test1"])
+    assert recipe_signature(RECIPE_TEMPLATES["Test2"]) != recipe_signature(RECIPE_TEMPLATES["Test1"])
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ScheduleCache(str(tmp_path), max_entries=2)
+    for names in (ORDER, ORDER[:3], ORDER[:2]):
+        cache.solve(scheduler(names), time_limit=30, workers=1)
+        # modification times of quickly written files may tie
+        for index, name in enumerate(sorted(cache.load_index(), key=lambda name: os.path.getmtime(cache.path(name)))):
+            os.utime(cache.path(name), (index, index))
+    assert len(cache.load_index()) == 2
+    assert cache.get(scheduler(ORDER)) is None
+    assert cache.get(scheduler(ORDER[:3])) is not None and cache.get(scheduler(ORDER[:2])) is not None
+
+
+def stored(order, status):
+    # a schedule as reported by the solver, its moves don't matter to the cache
+    return CPSchedule(order.templates, [[0]] * len(order.templates), [[1]] * len(order.templates), 100, status, None,
+                      order.parameters)
+
+
+def test_weaker_schedules_are_not_hits(tmp_path):
+    cache = ScheduleCache(str(tmp_path))
+    order = scheduler(ORDER)
+    cache.put(order, stored(order, "FEASIBLE"), time_limit=5)
+    assert cache.get(order, time_limit=5) is not None and cache.get(order, time_limit=2) is not None
+    # a longer search, or a full solve after a rolling horizon one, may find a better schedule
+    assert cache.get(order, time_limit=30) is None
+    assert cache.get(order, rolling=True, time_limit=5) is None
+    cache.put(order, stored(order, "FEASIBLE"), rolling=True, window=3, overlap=1, time_limit=5)
+    assert cache.get(order, rolling=True, window=3, overlap=1, time_limit=5) is not None
+    assert cache.get(order, rolling=True, window=4, overlap=1, time_limit=5) is None
+    assert cache.get(order, time_limit=5) is None
+    # which still hints the solver of the stronger request
+    solved = cache.solve(order, time_limit=30, workers=1)
+    assert solved.status == "OPTIMAL" and (cache.hits, cache.near_hits) == (0, 1)
+    # an optimal schedule serves every request
+    assert cache.get(order, time_limit=1) is not None
+    assert cache.get(order, rolling=True, window=3, overlap=1, time_limit=100) is not None
+
+
+def test_entries_of_other_versions_are_ignored(tmp_path):
+    cache = ScheduleCache(str(tmp_path))
+    order = scheduler(ORDER)
+    cache.put(order, stored(order, "OPTIMAL"))
+    name = cache.keys(order)[2]
+    with open(cache.path(name)) as file:
+        entry = json.load(file)
+    entry["version"] = cache.VERSION - 1
+    with open(cache.path(name), "w") as file:
+        json.dump(entry, file)
+    assert cache.get(order) is None
+
+
+def put_orders(directory, recipe):
+    cache = ScheduleCache(directory)
+    for length in range(1, 11):
+        order = scheduler([recipe] * length)
+        cache.put(order, stored(order, "OPTIMAL"))
+
+
+def test_concurrent_puts_keep_every_entry(tmp_path):
+    recipes = ["Test1", "Test2", "Test3", "Test4"]
+    with Pool(len(recipes)) as pool:
+        pool.starmap(put_orders, [(str(tmp_path), recipe) for recipe in recipes])
+    cache = ScheduleCache(str(tmp_path))
+    index = cache.load_index()
+    assert len(index) == 10 * len(recipes)
+    assert sorted(os.listdir(tmp_path)) == sorted(list(index) + ["index.json", "index.lock"])
+    assert all(cache.get(scheduler([recipe] * length)) is not None for recipe in recipes for length in range(1, 11))
@@ -0,0 +1,55 @@
+import math
+from collections import Counter
+
+import pytest
+
+from main import Carrier, RECIPE_TEMPLATES, bathData, manipData
+from sequence_search import SequenceSearch, simulate_order
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"]
+RECIPES = [RECIPE_TEMPLATES[name].create_instance() for name in ("Test1", "Test4", "Test2", "Test3")]
+SEQUENCE = (0, 1, 2, 3, 0)
+
+
+def work_order(names):
+    return [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in names]
+
+
+@pytest.mark.parametrize("time_unit", [1, 0.5])
+def test_cutoff_only_aborts_slower_orders(time_unit):
+    cycle_time, steps = simulate_order(RECIPES, SEQUENCE, bathData, manipData, time_unit=time_unit)
+    assert cycle_time == steps and 0 < cycle_time < math.inf
+    assert simulate_order(RECIPES, SEQUENCE, bathData, manipData, cutoff=cycle_time + 1, time_unit=time_unit)[0] == cycle_time
+    # an order finishing on its cutoff step may still report its cycle time, it isn't accepted either way
+    assert simulate_order(RECIPES, SEQUENCE, bathData, manipData, cutoff=cycle_time, time_unit=time_unit)[0] in (None, cycle_time)
+    aborted, simulated = simulate_order(RECIPES, SEQUENCE, bathData, manipData, cutoff=cycle_time // 2, time_unit=time_unit)
+    # skipped idle steps may carry the clock past the cutoff, the run still stops early
+    assert aborted is None and simulated < cycle_time
+
+
+@pytest.mark.parametrize("method", ["anneal", "evolve"])
+def test_search_keeps_the_work_order(method):
+    carriers = work_order(ORDER * 2)
+    search = SequenceSearch(workers=1, seed=3)
+    if method == "anneal":
+        result = search.anneal(carriers, rounds=15, chains=2)
+    else:
+        result = search.evolve(carriers, generations=3, population_size=6)
+    assert result.cycle_time <= result.initial_cycle_time < math.inf
+    assert result.bound is not None and result.bound <= result.cycle_time
+    # the same carriers, reordered
+    assert sorted(map(id, result.order)) == sorted(map(id, carriers))
+    assert Counter(result.recipe_names) == Counter(ORDER * 2)
+    assert result.simulations + result.cache_hits + result.pruned == result.evaluations
+    cycle_time, _ = simulate_order(search.recipes, search.best, bathData, manipData)
+    assert cycle_time == result.cycle_time
+
+
+def test_search_is_reproducible():
+    results = [SequenceSearch(workers=1, seed=5).anneal(work_order(ORDER * 2), rounds=10, chains=2) for _ in range(2)]
+    assert results[0].recipe_names == results[1].recipe_names and results[0].cycle_time == results[1].cycle_time
+
+
+def test_empty_work_order():
+    with pytest.raises(ValueError):
+        SequenceSearch(workers=1).anneal([])
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from main import LineSimulation, Carrier, SimulationStats, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"]
+
+
+def example_line(event_driven, stats=None):
+    return LineSimulation(bathData, manipData, [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in ORDER],
+                          event_driven=event_driven, log=EventLog(LogMode.SILENT), stats=stats)
+
+
+@pytest.mark.parametrize("event_driven", [False, True])
+def test_profiled_run_is_unchanged(event_driven):
+    plain = example_line(event_driven)
+    plain.run()
+    stats = SimulationStats()
+    profiled = example_line(event_driven, stats)
+    assert profiled.run() == plain.step_counter
+    assert list(profiled.deque_times) == list(plain.deque_times)
+
+    # every step is either simulated or skipped
+    assert stats.steps + stats.skipped_steps == plain.step_counter
+    assert stats.calls["step"] == stats.steps and stats.calls["check_baths"] == stats.steps
+    assert 0 < stats.idle_steps < stats.steps
+    assert (stats.skipped_steps > 0) == event_driven
+    assert stats.calls["load_into_line"] == len(ORDER)
+    report = json.loads(json.dumps(stats.as_dict()))
+    assert report["steps"] == stats.steps and set(report["times"]) == set(stats.calls)
+
+
+def test_lines_without_stats_are_not_wrapped():
+    stats = SimulationStats()
+    profiled, plain = example_line(False, stats), example_line(False)
+    assert "step" in vars(profiled) and "step" not in vars(plain)
+    assert all("update_movement" not in vars(manipulator) for manipulator in plain.manipulators)
+
+
+def test_print_report(capsys):
+    stats = SimulationStats()
+    example_line(True, stats).run()
+    stats.print_report()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith(f"{stats.steps} steps ({stats.idle_steps} idle), {stats.skipped_steps} skipped steps")
+    assert len(lines) == 1 + len(stats.times)
@@ -0,0 +1,53 @@
+import csv
+
+import pytest
+
+from main import manipData
+from cyclic_schedule import timing_parameters
+from sweep import TABLE_COLUMNS, expand_grid, run_sweep, save_table, simulate_variant
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"]
+SHIFTED = [([0, 1, 2, 3, 4, 5], 0), ([4, 5, 6, 7, 8, 9, 10], 4), ([8, 9, 10, 11, 12, 13], 8), ([12, 13, 14, 15, 16, 17], 12),
+           ([17, 18, 19, 20, 21, 22, 23], 17)]
+GRID = {"manip_data": [manipData, SHIFTED, manipData[:2]], "speed": [0.5, 0.8], "drip_time": [15, 20]}
+
+
+def test_expand_grid():
+    variants = expand_grid(GRID)
+    assert len(variants) == 12
+    assert all(variant["lift_time"] == timing_parameters()["lift_time"] for variant in variants)
+    with pytest.raises(ValueError):
+        expand_grid({"sped": [1]})
+
+
+def test_sweep_matches_single_runs(tmp_path):
+    rows = run_sweep(GRID, ORDER, workers=2)
+    expected = [simulate_variant(variant, ORDER) for variant in expand_grid(GRID)]
+    assert [row["variant"] for row in rows] == list(range(12))
+    assert [{name: row[name] for name in expected[0]} for row in rows] == expected
+    # two manipulators can't reach the end of the line
+    assert [row["status"] for row in rows].count("invalid") == 4
+
+    path = tmp_path / "sweep.csv"
+    save_table(rows, path)
+    with open(path, newline="") as file:
+        table = list(csv.DictReader(file))
+    assert list(table[0]) == TABLE_COLUMNS and len(table) == 12
+
+
+def test_single_runs_restore_the_timing_constants():
+    before = timing_parameters()
+    for variant in expand_grid(GRID):
+        simulate_variant(variant, ORDER)
+        assert timing_parameters() == before
+
+
+def test_pruned_sweep_finds_the_best_cycle_time():
+    # the slowest variants are bounded above the best cycle time, a single worker keeps two variants in flight
+    grid = {"speed": [0.8, 0.05, 0.04, 0.03]}
+    full = run_sweep(grid, ORDER, workers=1)
+    pruned = run_sweep(grid, ORDER, workers=1, prune=True)
+    best = min(row["cycle_time"] for row in full)
+    assert min(row["cycle_time"] for row in pruned if row["status"] == "done") == best
+    assert [row["status"] for row in pruned] == ["done", "done", "pruned", "pruned"]
+    assert all(row["lower_bound"] >= best for row in pruned if row["status"] == "pruned")
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+from main import LineSimulation, Carrier, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+from cyclic_schedule import solve_cyclic_schedule, timing_constants, timing_parameters
+from takt_bound import TaktBound
+
+NAMES = sorted(RECIPE_TEMPLATES)
+
+
+def simulated_cycle_time(names):
+    carriers = [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in names]
+    line = LineSimulation(bathData, manipData, carriers, event_driven=True, log=EventLog(LogMode.SILENT))
+    line.run()
+    return line.step_counter
+
+
+@pytest.mark.parametrize("scale", [
+    {},
+    {"speed": 2.0},
+    {"speed": 0.5, "lift_time": 2.0},
+    {"drip_time": 0.25},
+    {"lift_time": 0.5, "drip_time": 3.0},
+])
+def test_cycle_time_bound_stays_below_the_simulation(scale):
+    defaults = timing_parameters()
+    parameters = dict(defaults, **{name: type(defaults[name])(defaults[name] * factor) for name, factor in scale.items()})
+    generator = random.Random(len(scale))
+    with timing_constants(parameters):
+        bound = TaktBound(bathData, manipData)
+        for count in (1, 2, 5, 12):
+            names = [generator.choice(NAMES) for _ in range(count)]
+            assert bound.cycle_time([RECIPE_TEMPLATES[name] for name in names]) <= simulated_cycle_time(names)
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_takt_stays_below_the_optimal_cyclic_period(name):
+    template = RECIPE_TEMPLATES[name]
+    assert TaktBound(bathData, manipData).takt([template]) <= solve_cyclic_schedule(bathData, manipData, template).period
+
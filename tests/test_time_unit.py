@@ -0,0 +1,24 @@
+from main import LineSimulation, RecipeTemplate, Carrier, EventLog, LogMode, bathData, manipData
+
+
+def cycle_time(template, time_unit, count=1):
+    carriers = [Carrier(template.create_instance()) for _ in range(count)]
+    line = LineSimulation(bathData, manipData, carriers, event_driven=True, log=EventLog(LogMode.SILENT), time_unit=time_unit)
+    line.run()
+    assert line.finished_count == count
+    return line.step_counter
+
+
+def recipe(submersion_time):
+    return RecipeTemplate("Fraction", [(0, 0), (5, submersion_time), (10, 3), (12, 5), (17, 3), (23, 0)])
+
+
+def test_fractional_submersion_time():
+    template = recipe(12.5)
+    assert template.submersion_times.typecode == "d"
+    assert recipe(12).submersion_times.typecode == "l"
+    # a single carrier isn't obstructed, half a second longer in the bath is 5 more steps of 0.1 s
+    assert cycle_time(template, 0.1) == cycle_time(recipe(12), 0.1) + 5
+    # with steps of a second the submersion is rounded up to whole steps
+    assert cycle_time(template, 1) == cycle_time(recipe(13), 1)
+    assert cycle_time(template, 0.1, count=3) > 0
@@ -0,0 +1,78 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import twin
+from main import LineSimulation, WorkOrderStream, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+from twin import DigitalTwin, TwinService, plc_events
+
+
+def replayed_twin(steps):
+    """
+    :return: twin fed by the first steps of a simulated line
+    """
+    names = sorted(RECIPE_TEMPLATES)
+    line = LineSimulation(bathData, manipData, WorkOrderStream([(names[index % len(names)], index * 150) for index in range(6)],
+                                                               RECIPE_TEMPLATES), log=EventLog(LogMode.SILENT))
+    mirror = DigitalTwin(bathData, manipData)
+    for step, step_events in zip(range(steps), plc_events(line)):
+        for event in step_events:
+            mirror.apply(event)
+    return mirror
+
+
+@pytest.mark.parametrize("event", [
+    {"time": 5000, "event": "move", "manipulator": 1, "bath": 99},
+    {"time": 5000, "event": "move", "manipulator": 1, "bath": -1},
+    {"time": 5000, "event": "move", "manipulator": 1, "bath": "3"},
+    {"time": 5000, "event": "arrive", "manipulator": 0, "bath": 3},
+    {"time": 5000, "event": "arrive", "manipulator": 9, "bath": 3},
+    {"time": 5000, "event": "shift", "manipulator": 1},
+    {"time": 5000, "event": "exit", "carrier": 12345},
+    {"time": 5000, "event": "teleport"},
+    {"event": "clock"},
+    [5000, "clock"],
+])
+def test_invalid_events_leave_the_twin_unchanged(event):
+    mirror = replayed_twin(400)
+    before = mirror.snapshot(), mirror.version
+    with pytest.raises(ValueError):
+        mirror.apply(event)
+    assert (mirror.snapshot(), mirror.version) == before
+
+
+def test_feed_counts_rejected_events():
+    service = TwinService(DigitalTwin(bathData, manipData), executor=ThreadPoolExecutor(max_workers=1))
+    service.feed(json.dumps({"time": 10, "event": "move", "manipulator": 1, "bath": 99}))
+    service.feed("not json")
+    service.feed(json.dumps({"time": 10, "event": "clock"}))
+    assert service.rejected == 2
+    assert service.twin.version == 1 and service.twin.line.step_counter == 11
+
+
+def test_predictions_continue_after_a_failure(monkeypatch):
+    calls = []
+
+    def predict_exits(state, templates):
+        calls.append(state["step_counter"])
+        if len(calls) == 1:
+            raise RuntimeError("worker died")
+        return {}
+
+    monkeypatch.setattr(twin, "predict_exits", predict_exits)
+
+    async def run():
+        service = TwinService(replayed_twin(400), executor=ThreadPoolExecutor(max_workers=1), min_interval=0)
+        task = asyncio.create_task(service.predict_forever())
+        for time in (500, 600):
+            service.feed(json.dumps({"time": time, "event": "clock"}))
+            while len(calls) < (time - 400) // 100 or service.prediction_count + service.prediction_errors < len(calls):
+                await asyncio.sleep(0.01)
+        task.cancel()
+        return service
+
+    service = asyncio.run(asyncio.wait_for(run(), 10))
+    assert service.prediction_errors == 1 and service.last_error == "RuntimeError: worker died"
+    assert service.prediction_count == 1 and service.predicted_at == 601
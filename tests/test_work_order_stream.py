@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from main import (LineSimulation, WorkOrderStream, Carrier, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData,
+                  read_order_file)
+
+ORDER = ["Test1", "Test4", "Test2", "Test3", "Test1"] * 3
+
+
+def run(work_order):
+    line = LineSimulation(bathData, manipData, work_order, event_driven=True, log=EventLog(LogMode.SILENT))
+    line.run()
+    return line
+
+
+def test_order_files(tmp_path):
+    csv_path, jsonl_path = tmp_path / "orders.csv", tmp_path / "orders.jsonl"
+    csv_path.write_text("recipe,release_time\n" + "".join(f"{name},{index * 50}\n" for index, name in enumerate(ORDER)))
+    jsonl_path.write_text("".join(json.dumps({"recipe": name, "release_time": index * 50}) + "\n\n"
+                                  for index, name in enumerate(ORDER)))
+    records = [(name, float(release_time)) for name, release_time in read_order_file(str(csv_path))]
+    assert records == [(name, float(release_time)) for name, release_time in read_order_file(str(jsonl_path))]
+    assert records == [(name, index * 50.0) for index, name in enumerate(ORDER)]
+
+
+def test_stream_matches_the_carrier_list():
+    listed = run([Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in ORDER])
+    streamed = run(WorkOrderStream(((name, 0) for name in ORDER), RECIPE_TEMPLATES))
+    assert streamed.step_counter == listed.step_counter
+    assert list(streamed.deque_times) == list(listed.deque_times)
+    assert streamed.carriers_to_move == streamed.finished_count == len(ORDER)
+
+
+def test_records_are_read_when_carriers_enter():
+    read = []
+    line = LineSimulation(bathData, manipData, WorkOrderStream((read.append(index) or (name, index * 300)
+                                                                for index, name in enumerate(ORDER)), RECIPE_TEMPLATES),
+                          event_driven=True, log=EventLog(LogMode.SILENT))
+    while not line.step():
+        # one record is read ahead of the released carriers
+        assert len(read) == min(line.order_stream.released + 1, len(ORDER))
+        assert line.order_stream.released <= line.step_counter // 300 + 1
+        line.skip_idle_steps()
+    assert line.finished_count == len(ORDER)
+
+
+def test_history_is_limited(monkeypatch):
+    listed = run([Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in ORDER])
+    monkeypatch.setattr(LineSimulation, "STREAM_HISTORY", 4)
+    streamed = run(WorkOrderStream(((name, 0) for name in ORDER), RECIPE_TEMPLATES))
+    assert len(streamed.finished_carriers) == len(streamed.deque_times) == 4
+    assert list(streamed.deque_times) == list(listed.deque_times)[-4:]
+    assert streamed.avg_time_between == listed.avg_time_between
+
+
+def test_unknown_recipe():
+    with pytest.raises(ValueError):
+        WorkOrderStream([("Test1", 0), ("Nothing", 10)], RECIPE_TEMPLATES).pop()
@@ -0,0 +1,67 @@
+import itertools
+import random
+
+import pytest
+
+from main import RecipeTemplate, RECIPE_TEMPLATES, bathData, manipData
+from zone_partition import ZonePartitioner
+
+
+def random_mix(seed):
+    generator = random.Random(seed)
+    mix = []
+    for index in range(generator.randint(1, 4)):
+        baths = [0] + sorted(generator.sample(range(1, len(bathData) - 1), generator.randint(2, 8))) + [len(bathData) - 1]
+        template = RecipeTemplate(f"Random{index}", [(bath_id, generator.randint(30, 300)) for bath_id in baths])
+        mix += [template] * generator.randint(1, 3)
+    return mix
+
+
+def brute_force(partitioner, manipulators):
+    """
+    :return: smallest largest zone work over every choice of zone boundaries, None if there are too few boundaries
+        or some bath is shared by three zones for all of them
+    """
+    cuts, prefix = partitioner.cuts, partitioner.prefix
+    best = None
+    for inner in itertools.combinations(range(1, len(cuts) - 1), manipulators - 1):
+        bounds = (0,) + inner + (len(cuts) - 1,)
+        zones = [partitioner.moves[cuts[first]:cuts[end]] for first, end in zip(bounds, bounds[1:])]
+        ranges = [(zone[0][0], max(high for _, high in zone)) for zone in zones]
+        if any(ranges[z][1] >= ranges[z + 2][0] for z in range(len(ranges) - 2)):
+            continue
+        value = max(prefix[cuts[end]] - prefix[cuts[first]] for first, end in zip(bounds, bounds[1:]))
+        if best is None or value < best:
+            best = value
+    return best
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_partition_matches_brute_force(seed):
+    mix = list(RECIPE_TEMPLATES.values()) if seed == 0 else random_mix(seed)
+    partitioner = ZonePartitioner(bathData, mix)
+    for manipulators, partition in enumerate(partitioner.partition(6), start=1):
+        expected = brute_force(partitioner, manipulators)
+        assert (partition is None) == (expected is None)
+        if partition is None:
+            continue
+        assert partition.max_workload == expected
+        assert sum(partition.workloads) == partitioner.prefix[-1]
+        # every move stays within a single zone, and zones start at different baths
+        assert all(any(first <= low and high <= last for first, last in partition.boundaries) for low, high in partitioner.moves)
+        starts = [first for first, _ in partition.boundaries]
+        assert starts == sorted(set(starts))
+        # no bath is shared by more than two zones
+        assert all(sum(first <= bath <= last for first, last in partition.boundaries) <= 2 for bath in range(len(bathData)))
+
+
+def test_a_single_path_is_handed_over_at_one_bath():
+    for name in ("Test1", "Test4"):
+        for partition in ZonePartitioner(bathData, [RECIPE_TEMPLATES[name]]).partition(5):
+            assert all(last == first for (_, last), (first, _) in zip(partition.boundaries, partition.boundaries[1:]))
+
+
+def test_crossing_paths_overlap_like_manip_data():
+    # Test4 and the other recipes hand over at different baths, the ranges have to cover both
+    partition = ZonePartitioner(bathData, list(RECIPE_TEMPLATES.values())).partition(5)[4]
+    assert [bath_ids for bath_ids, _ in partition.manip_data()] == [bath_ids for bath_ids, _ in manipData]
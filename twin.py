@@ -0,0 +1,624 @@
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from main import (LineSimulation, WorkOrderStream, Carrier, CarrierState, ManipulatorState, EventLog, LogMode,
+                  RECIPE_TEMPLATES, bathData, manipData)
+from snapshot import LineSnapshot
+"""
+Digital twin of a running line, an asyncio service fed by line events (a local stand-in for the PLC feed).
+The twin keeps a mirror LineSimulation in sync with the events: the baths, manipulators and carriers are set as the
+events report them, in between events only the timers and rail positions advance (see LineSimulation.advance_idle_ticks),
+the mirror never makes decisions of its own. The predicted exit time of every carrier in flight is obtained by
+continuing a fork of the mirror with the greedy tasking (see snapshot.py) in a worker process.
+
+Events are JSON objects, one per line: {"time": step, "event": type, ...} with the types
+    enter {carrier, recipe} - carrier placed on the line entry
+    load {manipulator, carrier} - manipulator took the carrier from the entry
+    move {manipulator, bath} - manipulator started moving to the bath (to pick up the carrier in it or with its carrier)
+    arrive {manipulator, bath} - manipulator stopped above the bath
+    shift {manipulator, distance} - manipulator pushed aside (or stopped) on the rail by a neighbour
+    submerge_start / submerge_end {manipulator, bath} - lowering of the held carrier into the bath
+    lift_start / lift_end {manipulator, bath} - lifting of the carrier out of the bath, dripping follows
+    exit {carrier} - carrier taken from the line exit
+    clock {} - heartbeat of the feed, only advances the mirror (in steps without other events)
+following the event names of EventLog. Events of a manipulator may report its rail distance in m (required for shift),
+the mirror continues from the reported distance. plc_events produces the events from a simulated line.
+
+TwinService reads events from TCP or UNIX socket connections (any number of feeds) or by following a file, and
+answers queries of any number of clients on another socket, one command per line:
+    predictions - {"time", "predicted_at", "pending_events", "exits": {carrier id: predicted exit step}}
+    status - counters of the service
+Events are applied in the event loop (microseconds each, yielding regularly), predictions are computed in the
+background whenever the state changed and queries are answered from the last prediction, so neither the event rate
+nor the prediction time blocks the clients.
+"""
+
+
+def predict_exits(state, templates):
+    """
+    Runs in a worker process of the prediction pool.
+    :param state: LineSnapshot.as_dict of the mirror
+    :param templates: dictionary of recipe name -> RecipeTemplate
+    :return: carrier id -> predicted exit step of every carrier in flight
+    """
+    finished = set(state["finished_carriers"])
+    line = LineSnapshot.from_dict(state).restore(templates, event_driven=True, log=EventLog(LogMode.SILENT))
+    line.run()
+    return {carrier.carUUID: exit_time for carrier, exit_time in zip(line.finished_carriers, line.deque_times)
+            if carrier.carUUID not in finished}
+
+
+class DigitalTwin:
+    """
+    Mirror of a line driven by events, see apply.
+    """
+    FIELDS = { # fields required by every event type next to the time, see the module description
+        "clock": (),
+        "enter": ("carrier", "recipe"),
+        "exit": ("carrier",),
+        "load": ("manipulator", "carrier"),
+        "move": ("manipulator", "bath"),
+        "arrive": ("manipulator", "bath"),
+        "shift": ("manipulator", "distance"),
+        "submerge_start": ("manipulator", "bath"),
+        "submerge_end": ("manipulator", "bath"),
+        "lift_start": ("manipulator", "bath"),
+        "lift_end": ("manipulator", "bath"),
+    }
+
+    def __init__(self, bath_data, manip_data, templates=RECIPE_TEMPLATES):
+        """
+        :param bath_data: list of (name, distance in mm, submergable flag) tuples, see bathData
+        :param manip_data: list of (operating range, starting position) tuples, see manipData
+        :param templates: dictionary of recipe name -> RecipeTemplate of the carriers entering the line
+        """
+        self.templates = templates
+        # carriers are placed on the entry by the events only, the mirror's own work order is empty
+        self.line = LineSimulation(bath_data, manip_data, WorkOrderStream(iter(()), templates), event_driven=True,
+                                   log=EventLog(LogMode.SILENT))
+        self.carriers = {} # carrier id -> Carrier in flight
+        self.version = 0 # number of applied events
+
+    def advance(self, time):
+        """
+        Advances the timers and rail moves of the mirror to the end of the given step.
+        Late events (older than the mirror) are applied at the current step.
+        """
+        line = self.line
+        if time + 1 > line.step_counter:
+            line.advance_idle_ticks(time + 1 - line.step_counter)
+            line.step_counter = time + 1
+            # submersions which ended meanwhile, see Carrier.update_bathe_timer
+            for bath_id in line.candidate_baths(line.bathing_baths, CarrierState.BATHING):
+                carrier = line.baths[bath_id].containedCarrier
+                if carrier.operation_timer >= line.ticks(carrier.get_current_step().submersionTime):
+                    carrier.state = CarrierState.BATH_COMPLETED
+                    carrier.operation_timer = 0
+                    line.bathing_baths.discard(bath_id)
+                    line.completed_baths.add(bath_id)
+
+    def carrier(self, carrier_uuid):
+        if carrier_uuid not in self.carriers:
+            raise ValueError(f"Unknown carrier {carrier_uuid}")
+        return self.carriers[carrier_uuid]
+
+    def manipulator(self, event):
+        manipulator_id = event["manipulator"]
+        if type(manipulator_id) is not int or not 1 <= manipulator_id <= len(self.line.manipulators):
+            raise ValueError(f"Unknown manipulator {manipulator_id!r}")
+        return self.line.manipulators[manipulator_id - 1]
+
+    def check(self, event):
+        """
+        Validates an event against the mirror, nothing is changed.
+        :raise ValueError: if the event is malformed or doesn't match the state of the mirror
+        """
+        if not isinstance(event, dict):
+            raise ValueError(f"Event has to be a JSON object, got {event!r}")
+        kind = event.get("event")
+        if kind not in self.FIELDS:
+            raise ValueError(f"Unknown event type {kind!r}")
+        missing = [field for field in ("time",) + self.FIELDS[kind] if field not in event]
+        if missing:
+            raise ValueError(f"Event {kind} is missing {missing}")
+        try:
+            int(event["time"])
+            if event.get("distance") is not None:
+                float(event["distance"])
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid time or distance in {event!r}")
+        if "manipulator" in event:
+            manipulator = self.manipulator(event)
+        baths = self.line.baths
+        bath_id = event.get("bath")
+        if "bath" in self.FIELDS[kind] and (type(bath_id) is not int or not 0 <= bath_id < len(baths)):
+            raise ValueError(f"Unknown bath {bath_id!r}")
+
+        if kind == "enter":
+            if baths[0].containedCarrier is not None:
+                raise ValueError(f"Carrier {event['carrier']} entered an occupied entry")
+            if event["recipe"] not in self.templates:
+                raise ValueError(f"Unknown recipe {event['recipe']!r}")
+            if event["carrier"] in self.carriers:
+                raise ValueError(f"Carrier {event['carrier']} is already in the line")
+        elif kind in ("exit", "load"):
+            carrier = self.carrier(event["carrier"])
+            if kind == "load" and baths[0].containedCarrier is not carrier:
+                raise ValueError(f"Carrier {carrier.carUUID} is not on the entry")
+        elif kind in ("submerge_start", "submerge_end"):
+            if manipulator.heldCarrier is None:
+                raise ValueError(f"Manipulator {manipulator.ManipUUID} holds no carrier to submerge")
+        elif kind in ("lift_start", "lift_end"):
+            if baths[bath_id].containedCarrier is None:
+                raise ValueError(f"Nothing to lift in bath {bath_id}")
+
+    def apply(self, event):
+        """
+        Updates the mirror with a line event, an event rejected by check leaves the mirror unchanged.
+        :param event: dictionary, see the module description
+        """
+        self.check(event)
+        line = self.line
+        baths = line.baths
+        kind = event["event"]
+        time = int(event["time"])
+        self.advance(time)
+
+        if kind == "clock":
+            pass
+
+        elif kind == "enter":
+            carrier = Carrier(self.templates[event["recipe"]].create_instance())
+            carrier.carUUID = event["carrier"]
+            self.carriers[carrier.carUUID] = carrier
+            baths[0].containedCarrier = carrier
+            line.awaiting_load.add(0)
+            line.carriers_to_move += 1
+            line.last_progress = time
+
+        elif kind == "exit":
+            carrier = self.carriers.pop(event["carrier"])
+            for bath in baths:
+                if bath.containedCarrier is carrier:
+                    bath.containedCarrier = None
+            for manipulator in line.manipulators:
+                if manipulator.heldCarrier is carrier:
+                    manipulator.heldCarrier = None
+            line.finished_carriers.append(carrier)
+            line.deque_times.append(time)
+            if line.first_deque_time is None:
+                line.first_deque_time = time
+            line.finished_count += 1
+            line.last_progress = time
+
+        elif kind == "load":
+            manipulator = self.manipulator(event)
+            carrier = self.carrier(event["carrier"])
+            baths[0].containedCarrier = None
+            carrier.currentStepIndex += 1
+            carrier.state = CarrierState.SERVICED
+            manipulator.heldCarrier = carrier
+            manipulator.position = 0
+            manipulator.distance_rail = baths[0].distanceToStart
+
+        elif kind == "move":
+            manipulator = self.manipulator(event)
+            bath_id = event["bath"]
+            if manipulator.heldCarrier is None:
+                carrier = baths[bath_id].containedCarrier
+                if carrier is not None and carrier.state == CarrierState.UNSERVICED:
+                    carrier.state = CarrierState.TO_BE_LOADED
+                    line.awaiting_load.discard(bath_id)
+                elif carrier is not None and carrier.state in (CarrierState.BATHING, CarrierState.BATH_COMPLETED):
+                    # the submersion may end a step earlier in the line than in the mirror
+                    carrier.state = CarrierState.BATH_SERVICED
+                    carrier.operation_timer = 0
+                    line.bathing_baths.discard(bath_id)
+                    line.completed_baths.discard(bath_id)
+            else:
+                manipulator.heldCarrier.state = CarrierState.SERVICED
+            manipulator.state = ManipulatorState.MOVING
+            manipulator.target_position = bath_id
+            manipulator.evasion_target = None
+            manipulator.rail_move = None
+            # the first movement step is part of the step the move started in, see Manipulator.move_to
+            if manipulator.distance_rail != baths[bath_id].distanceToStart:
+                manipulator.advance_movement(1)
+                manipulator.rail_move.start_time = time
+            # the position is updated by the arrive event
+
+        elif kind == "arrive":
+            manipulator = self.manipulator(event)
+            manipulator.position = event["bath"]
+            manipulator.distance_rail = baths[event["bath"]].distanceToStart
+            manipulator.rail_move = None
+            manipulator.operation_timer = 0
+
+        elif kind == "shift":
+            pass # the reported distance is applied below
+
+        elif kind == "submerge_start":
+            manipulator = self.manipulator(event)
+            manipulator.position = manipulator.target_position = event["bath"]
+            manipulator.state = ManipulatorState.SUBMERGING
+            manipulator.operation_timer = 0
+
+        elif kind == "submerge_end":
+            manipulator = self.manipulator(event)
+            carrier = manipulator.heldCarrier
+            bath_id = event["bath"]
+            baths[bath_id].containedCarrier = carrier
+            carrier.state = CarrierState.BATHING
+            carrier.operation_timer = 0
+            line.bathing_baths.add(bath_id)
+            manipulator.heldCarrier = None
+            manipulator.target_position = None
+            manipulator.state = ManipulatorState.IDLE
+            # the bathing timers are updated in the same step, see check_baths
+            carrier.update_bathe_timer()
+            if carrier.state == CarrierState.BATH_COMPLETED:
+                line.bathing_baths.discard(bath_id)
+                line.completed_baths.add(bath_id)
+
+        elif kind == "lift_start":
+            manipulator = self.manipulator(event)
+            carrier = baths[event["bath"]].containedCarrier
+            line.bathing_baths.discard(event["bath"])
+            line.completed_baths.discard(event["bath"])
+            carrier.state = CarrierState.DRIPPING
+            carrier.operation_timer = 0 # the bathing timer is reset once the submersion is over
+            manipulator.position = manipulator.target_position = event["bath"]
+            manipulator.state = ManipulatorState.LIFTING
+            manipulator.operation_timer = 0
+
+        elif kind == "lift_end":
+            manipulator = self.manipulator(event)
+            carrier = baths[event["bath"]].containedCarrier
+            baths[event["bath"]].containedCarrier = None
+            carrier.currentStepIndex += 1
+            carrier.state = CarrierState.DRIPPING
+            manipulator.heldCarrier = carrier
+            manipulator.state = ManipulatorState.DRIPPING
+            manipulator.operation_timer = 0
+
+        if "manipulator" in event and event.get("distance") is not None:
+            manipulator = self.manipulator(event)
+            distance = float(event["distance"])
+            if manipulator.distance_rail != distance:
+                manipulator.distance_rail = distance
+                manipulator.rail_move = None # a move in progress continues from the reported distance
+        self.version += 1
+
+    def snapshot(self):
+        """
+        :return: JSON serializable state of the mirror, see predict_exits
+        """
+        return LineSnapshot.capture(self.line).as_dict()
+
+    def predict(self):
+        """
+        :return: carrier id -> predicted exit step, computed in the calling thread
+        """
+        return predict_exits(self.snapshot(), self.templates)
+
+
+def plc_events(line):
+    """
+    Runs the line step by step and reports its state changes as twin events, a stand-in for the PLC of a real line.
+    :param line: LineSimulation (not event driven, every step is needed)
+    :return: generator of lists of the events of every step
+    """
+    def observe(manipulator):
+        return (manipulator.state, manipulator.position, manipulator.target_position, manipulator.heldCarrier,
+                manipulator.distance_rail, manipulator.rail_move)
+
+    def arrived(position, target, distance):
+        # the line registers the arrival by updating the position, a step late for the last manipulator
+        return target is not None and position == target and distance == line.baths[target].distanceToStart
+
+    seen = set()
+    while not line.is_work_order_done:
+        time = line.step_counter
+        before = [observe(manipulator) for manipulator in line.manipulators]
+        finished = line.finished_count
+        line.step()
+        events = []
+        for carrier in list(line.finished_carriers)[len(line.finished_carriers) - (line.finished_count - finished):]:
+            events.append({"time": time, "event": "exit", "carrier": carrier.carUUID})
+        for carrier in [line.baths[0].containedCarrier] + [manipulator.heldCarrier for manipulator in line.manipulators]:
+            if carrier is not None and carrier.carUUID not in seen:
+                seen.add(carrier.carUUID)
+                events.append({"time": time, "event": "enter", "carrier": carrier.carUUID, "recipe": carrier.requiredProcedure.name})
+        for manipulator, (state, position, target, held, distance, rail_move) in zip(line.manipulators, before):
+            common = {"time": time, "manipulator": manipulator.ManipUUID, "distance": manipulator.distance_rail}
+            if state == ManipulatorState.SUBMERGING and manipulator.state != ManipulatorState.SUBMERGING:
+                events.append(dict(common, event="submerge_end", bath=target))
+            if state == ManipulatorState.LIFTING and manipulator.state != ManipulatorState.LIFTING:
+                events.append(dict(common, event="lift_end", bath=target))
+            elif manipulator.heldCarrier is not None and manipulator.heldCarrier is not held:
+                events.append(dict(common, event="load", carrier=manipulator.heldCarrier.carUUID))
+            new_target = manipulator.target_position != target
+            if manipulator.target_position is not None and new_target:
+                events.append(dict(common, event="move", bath=manipulator.target_position))
+            if manipulator.state == ManipulatorState.MOVING and not new_target:
+                # a move pushed to another distance or held in place (reported in every step it is held),
+                # see Manipulator.shift_rail and hold_position
+                pushed = manipulator.rail_move is None or rail_move is not None and manipulator.rail_move is not rail_move
+            else:
+                pushed = manipulator.state != ManipulatorState.MOVING and manipulator.distance_rail != distance
+            if pushed and not arrived(manipulator.position, manipulator.target_position, manipulator.distance_rail):
+                events.append(dict(common, event="shift"))
+            if arrived(manipulator.position, manipulator.target_position, manipulator.distance_rail) and \
+                    (new_target or not arrived(position, target, distance)):
+                events.append(dict(common, event="arrive", bath=manipulator.target_position))
+            if manipulator.state == ManipulatorState.SUBMERGING and state != ManipulatorState.SUBMERGING:
+                events.append(dict(common, event="submerge_start", bath=manipulator.target_position))
+            if manipulator.state == ManipulatorState.LIFTING and state != ManipulatorState.LIFTING:
+                events.append(dict(common, event="lift_start", bath=manipulator.target_position))
+        if not events:
+            events.append({"time": time, "event": "clock"})
+        yield events
+
+
+async def start_server(address, handler):
+    """
+    :param address: "host:port" for TCP, "unix:path" for a UNIX socket
+    """
+    if address.startswith("unix:"):
+        return await asyncio.start_unix_server(handler, path=address[len("unix:"):])
+    host, port = address.rsplit(":", 1)
+    return await asyncio.start_server(handler, host, int(port))
+
+
+async def open_connection(address):
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[len("unix:"):])
+    host, port = address.rsplit(":", 1)
+    return await asyncio.open_connection(host, int(port))
+
+
+class TwinService:
+    """
+    Asyncio service around a DigitalTwin, see the module description.
+    """
+    YIELD_EVERY = 256 # events applied before giving the other tasks a chance to run
+
+    def __init__(self, twin, executor=None, min_interval=0.05):
+        """
+        :param twin: DigitalTwin
+        :param executor: executor computing the predictions, a single worker process by default
+        :param min_interval: minimal wall time in s between two predictions
+        """
+        self.twin = twin
+        self.executor = executor if executor is not None else ProcessPoolExecutor(max_workers=1)
+        self.min_interval = min_interval
+        self.changed = asyncio.Event()
+        self.predictions = {} # carrier id -> predicted exit step
+        self.predicted_version = 0 # twin version the predictions were computed for
+        self.predicted_at = 0 # mirror step the predictions were computed for
+        self.prediction_count = 0
+        self.prediction_time = 0.0 # wall time of the last prediction
+        self.prediction_errors = 0 # predictions which failed, the previous predictions are kept meanwhile
+        self.last_error = None # description of the last failed prediction
+        self.rejected = 0 # events inconsistent with the mirror
+        self.queries = 0
+        self.servers = []
+        self.tasks = []
+        self.connections = {} # connection handler task -> its writer, closed by stop
+
+    def feed(self, line):
+        """
+        Applies a single line of the event feed.
+        """
+        if not line.strip():
+            return
+        try:
+            self.twin.apply(json.loads(line))
+        except (ValueError, KeyError, TypeError):
+            self.rejected += 1
+            return
+        self.changed.set()
+
+    async def handle_feed(self, reader, writer):
+        """
+        Connection of an event feed, one JSON event per line.
+        """
+        self.connections[asyncio.current_task()] = writer
+        count = 0
+        try:
+            while line := await reader.readline():
+                self.feed(line)
+                count += 1
+                if count % self.YIELD_EVERY == 0:
+                    await asyncio.sleep(0) # readline doesn't suspend while the buffer is full
+        finally:
+            self.connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def tail(self, path, poll_interval=0.1):
+        """
+        Follows a file of JSON events like tail -f, starting from its beginning.
+        """
+        with open(path) as file:
+            pending = ""
+            count = 0
+            while True:
+                line = file.readline()
+                if not line:
+                    await asyncio.sleep(poll_interval)
+                    continue
+                pending += line
+                if not pending.endswith("\n"):
+                    continue # the writer hasn't finished the line yet
+                self.feed(pending)
+                pending = ""
+                count += 1
+                if count % self.YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+
+    def answer(self, command):
+        """
+        :return: JSON serializable answer to a client command
+        """
+        self.queries += 1
+        if command == "predictions":
+            return {"time": self.twin.line.step_counter - 1, "predicted_at": self.predicted_at - 1,
+                    "pending_events": self.twin.version - self.predicted_version,
+                    "exits": {str(carrier_uuid): exit_time for carrier_uuid, exit_time in self.predictions.items()}}
+        if command == "status":
+            return {"time": self.twin.line.step_counter - 1, "events": self.twin.version, "rejected": self.rejected,
+                    "in_flight": len(self.twin.carriers), "finished": self.twin.line.finished_count,
+                    "predictions": self.prediction_count, "prediction_time": self.prediction_time,
+                    "prediction_errors": self.prediction_errors, "last_error": self.last_error, "queries": self.queries}
+        return {"error": f"unknown command {command!r}, expected predictions or status"}
+
+    async def handle_client(self, reader, writer):
+        """
+        Connection of a query client, one command per line, one JSON answer per line.
+        """
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while line := await reader.readline():
+                writer.write(json.dumps(self.answer(line.decode().strip())).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def predict_forever(self):
+        """
+        Recomputes the predictions in the executor whenever events arrived since the last ones.
+        A failed prediction is reported and counted, the next events are predicted again.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.changed.wait()
+            self.changed.clear()
+            version, time = self.twin.version, self.twin.line.step_counter
+            start = perf_counter()
+            try:
+                predictions = await loop.run_in_executor(self.executor, predict_exits, self.twin.snapshot(), self.twin.templates)
+            except Exception as error:
+                # e.g. a mirror state the simulation can't continue from, or a broken worker process
+                self.prediction_errors += 1
+                self.last_error = f"{type(error).__name__}: {error}"
+                print(f"Prediction of step {time - 1} failed, {self.last_error}", file=sys.stderr)
+            else:
+                self.predictions = predictions
+                self.prediction_time = perf_counter() - start
+                self.predicted_version, self.predicted_at = version, time
+                self.prediction_count += 1
+            await asyncio.sleep(self.min_interval)
+
+    async def start(self, feed_address=None, query_address=None, tail_path=None):
+        """
+        Starts the servers and background tasks.
+        :param feed_address: address of the event feed server, see start_server
+        :param query_address: address of the query server
+        :param tail_path: file of events to follow
+        """
+        self.tasks.append(asyncio.create_task(self.predict_forever()))
+        if feed_address is not None:
+            self.servers.append(await start_server(feed_address, self.handle_feed))
+        if query_address is not None:
+            self.servers.append(await start_server(query_address, self.handle_client))
+        if tail_path is not None:
+            self.tasks.append(asyncio.create_task(self.tail(tail_path)))
+
+    async def stop(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        # closing the writers ends the open connections at their next read
+        handlers = list(self.connections)
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown()
+
+
+async def demo(carriers=200, clients=8, address="127.0.0.1"):
+    """
+    Replays a simulated line into the twin as fast as possible while clients keep querying the predictions.
+    The simulated line runs in the same event loop, the query latency includes its share.
+    """
+    service = TwinService(DigitalTwin(bathData, manipData))
+    await service.start(f"{address}:0", f"{address}:0")
+    feed_port = service.servers[0].sockets[0].getsockname()[1]
+    query_port = service.servers[1].sockets[0].getsockname()[1]
+
+    names = sorted(RECIPE_TEMPLATES)
+    line = LineSimulation(bathData, manipData, WorkOrderStream([(names[index % len(names)], index * 150) for index in range(carriers)],
+                                                               RECIPE_TEMPLATES), log=EventLog(LogMode.SILENT))
+    latencies = []
+    snapshots = [] # (step, predictions) seen by the clients
+
+    async def client():
+        reader, writer = await open_connection(f"{address}:{query_port}")
+        while not line.is_work_order_done:
+            start = perf_counter()
+            writer.write(b"predictions\n")
+            await writer.drain()
+            answer = json.loads(await reader.readline())
+            latencies.append(perf_counter() - start)
+            snapshots.append((answer["predicted_at"], answer["exits"]))
+            await asyncio.sleep(0.01)
+        writer.close()
+
+    tasks = [asyncio.create_task(client()) for _ in range(clients)]
+    reader, writer = await open_connection(f"{address}:{feed_port}")
+    start = perf_counter()
+    events = 0
+    for step_events in plc_events(line):
+        for event in step_events:
+            writer.write(json.dumps(event).encode() + b"\n")
+            events += 1
+        if events % 128 < len(step_events):
+            await writer.drain()
+            await asyncio.sleep(0) # drain returns at once while the buffer has room, let the clients in
+    writer.write_eof()
+    await writer.drain()
+    feed_time = perf_counter() - start
+    await asyncio.gather(*tasks)
+    while service.twin.line.finished_count < line.finished_count:
+        await asyncio.sleep(0.01)
+    writer.close()
+    await service.stop()
+
+    actual = {carrier.carUUID: exit_time for carrier, exit_time in zip(line.finished_carriers, line.deque_times)}
+    errors = [abs(exit_time - actual[int(carrier_uuid)]) for _, exits in snapshots for carrier_uuid, exit_time in exits.items()]
+    latencies.sort()
+    print(f"{events} events of {carriers} carriers ({line.step_counter} s of the line) fed in {feed_time:.2f} s"
+          f" ({events / feed_time:.0f} events/s), {service.rejected} rejected, {service.prediction_count} predictions")
+    print(f"{len(latencies)} queries of {clients} clients, latency median {latencies[len(latencies) // 2] * 1000:.2f} ms,"
+          f" max {latencies[-1] * 1000:.2f} ms")
+    if errors:
+        print(f"{len(errors)} predicted exits, {sum(error == 0 for error in errors) / len(errors):.1%} exact,"
+              f" mean error {sum(errors) / len(errors):.1f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Digital twin of the line fed by line events")
+    parser.add_argument("--feed", help="address of the event feed, host:port or unix:path")
+    parser.add_argument("--query", help="address of the query server, host:port or unix:path")
+    parser.add_argument("--tail", help="file of JSON events to follow")
+    args = parser.parse_args()
+
+    if args.feed is None and args.tail is None:
+        # no feed given, replay a simulated line
+        asyncio.run(demo())
+    else:
+        async def serve():
+            service = TwinService(DigitalTwin(bathData, manipData))
+            await service.start(args.feed, args.query, args.tail)
+            await asyncio.Event().wait()
+        asyncio.run(serve())
@@ -0,0 +1,143 @@
+from collections import Counter
+
+import numpy as np
+
+from main import LineSimulation, Carrier, EventLog, LogMode, RECIPE_TEMPLATES, bathData, manipData
+from cyclic_schedule import LineTiming, move_duration, timing_parameters
+"""
+Partitioning of the line into manipulator zones, the exact replacement of greedy_allocation in
+experimental/Greedy_algorithm.py.
+Every move of a recipe has to be done by a single manipulator, so zones are built from moves: the moves (distinct pairs
+of baths of all recipes) are ordered along the line by their first bath, a zone is a contiguous run of them and its range
+covers all baths the run touches. Neighbouring zones overlap where a move needs it, at the handover baths where one
+manipulator leaves carriers for the next one at least. Where all recipes pass a zone boundary through a common bath
+that is the only shared bath. Recipes taking different paths need a handover bath each and the baths their moves pass
+over in between, so the overlap is wider: in the example mix Test4 hands over at bath 8 and the other recipes at 10, and
+the ranges [4..10] and [8..13] of manipData share 8 to 10. Splitting a move instead would cost an extra handover.
+No bath is shared by more than two zones though, a zone has to end before the zone after the next one starts.
+
+The work of a move is its duration (see cyclic_schedule.move_duration) plus the step between tasking and acting,
+weighted by the number of carriers of its recipe. With P(m) the work of the first m moves, the work of the zone of the
+moves l..r-1 is P(r) - P(l), and the zones minimizing the largest work for k manipulators follow from the dynamic program
+    best(k, r) = min over boundaries l < r of max(best(k - 1, l), P(r) - P(l))
+which gives the optimal partition for every number of manipulators 1..N at once, in O(N M^2) for M moves. The table of
+zone works P(r) - P(l) is built once (infinite for zones which would share a bath with two others) and every k is a
+single NumPy reduction over it, so interactive what-if tools get all partitions of a line in milliseconds.
+Zones only start at different baths, so no two manipulators start at the same bath.
+
+Requires numpy, which is (unlike the rest of the simulation) not a part of the standard library.
+"""
+
+
+class ZonePartition:
+    def __init__(self, boundaries, workloads):
+        self.boundaries = boundaries # first and last bath of every zone
+        self.workloads = workloads # work of every zone in steps (for the whole mix)
+
+    @property
+    def max_workload(self):
+        return max(self.workloads)
+
+    def manip_data(self):
+        """
+        :return: zones in the format of manipData, every manipulator starts at the first bath of its zone
+        """
+        return [(list(range(first, last + 1)), first) for first, last in self.boundaries]
+
+    def __repr__(self):
+        zones = ", ".join(f"{first}-{last}: {work}s" for (first, last), work in zip(self.boundaries, self.workloads))
+        return f"ZonePartition(manipulators={len(self.boundaries)}, max workload={self.max_workload}s, zones=[{zones}])"
+
+
+class ZonePartitioner:
+    """
+    Optimal zones for a line and a recipe mix, see partition.
+    """
+    def __init__(self, bath_data, templates, lift_time=None, speed=None, drip_time=None, acceleration_time=None):
+        """
+        :param bath_data: list of (name, distance in mm, submergable flag) tuples, see bathData
+        :param templates: RecipeTemplate of every carrier of a representative mix (or of a whole work order)
+        :param lift_time: defaults to Manipulator.LIFT_TIME, similarly for the other timing constants
+        """
+        self.parameters = timing_parameters(lift_time, speed, drip_time, acceleration_time)
+        # no manipulators yet, travel times don't depend on the zone (except for the late arrival of the last one)
+        timing = LineTiming(bath_data, [], self.parameters)
+        work = Counter() # (lower bath, higher bath) -> work of all moves between the two baths
+        for template, carriers in Counter(templates).items():
+            bath_ids = template.bath_ids
+            for k in range(len(bath_ids) - 1):
+                duration = move_duration(timing, 0, bath_ids[k], bath_ids[k + 1], self.parameters["drip_time"], loading=k == 0)
+                work[tuple(sorted((bath_ids[k], bath_ids[k + 1])))] += (duration + timing.latency(0, bath_ids[k], bath_ids[k])) * carriers
+        self.moves = sorted(work) # pairs of baths in the order along the line
+        self.prefix = [0] # P(m), work of the first m moves
+        for move in self.moves:
+            self.prefix.append(self.prefix[-1] + work[move])
+        # possible zone boundaries (index of the first move of a zone), zones have to start at different baths
+        self.cuts = [0] + [m for m in range(1, len(self.moves)) if self.moves[m][0] > self.moves[m - 1][0]] + [len(self.moves)]
+
+    def zone_work(self):
+        """
+        :return: table of the work of the zone from cuts[i] to cuts[j] (NumPy array indexed [i, j]), infinite unless i < j
+            and the zones before cuts[i] end before the zone starting at cuts[j]
+        """
+        cuts = self.cuts
+        at_cuts = np.array([self.prefix[cut] for cut in cuts], dtype=float)
+        work = at_cuts[np.newaxis, :] - at_cuts[:, np.newaxis]
+        work[np.tril_indices(len(cuts))] = np.inf
+        # last bath of the moves before every cut, and the first bath of the zone starting there (past the line at the end)
+        reach = np.array([max((high for _, high in self.moves[:cut]), default=-1) for cut in cuts])
+        first = np.array([self.moves[cut][0] if cut < len(self.moves) else np.inf for cut in cuts])
+        work[reach[:, np.newaxis] >= first[np.newaxis, :]] = np.inf
+        return work
+
+    def partition(self, max_manipulators):
+        """
+        :param max_manipulators: largest number of manipulators
+        :return: list of the optimal ZonePartition for 1..max_manipulators manipulators,
+            None where the line can't be split into that many zones
+        """
+        cuts, prefix = self.cuts, self.prefix
+        last = len(cuts) - 1
+        work = self.zone_work()
+        # best[j] is the smallest largest work of zones covering the moves before cuts[j] (infinite if they can't be
+        # split into that many zones), parent[j] the previous boundary
+        best = np.full(len(cuts), np.inf)
+        best[0] = 0
+        parents = []
+        partitions = []
+        for manipulators in range(1, max_manipulators + 1):
+            candidates = np.maximum(best[:, np.newaxis], work)
+            parent = candidates.argmin(axis=0) # the first of equal boundaries, like a scan in line order
+            best = candidates[parent, np.arange(len(cuts))]
+            parents.append(parent)
+            if np.isinf(best[last]):
+                partitions.append(None)
+                continue
+            # walk the parents back from the end of the line
+            indexes = [last]
+            for parent in reversed(parents):
+                indexes.append(int(parent[indexes[-1]]))
+            indexes.reverse()
+            boundaries, workloads = [], []
+            for z in range(manipulators):
+                first, end = cuts[indexes[z]], cuts[indexes[z + 1]]
+                boundaries.append((self.moves[first][0], max(high for _, high in self.moves[first:end])))
+                workloads.append(prefix[end] - prefix[first])
+            partitions.append(ZonePartition(boundaries, workloads))
+        return partitions
+
+
+if __name__ == "__main__":
+    # Optimal zones of the example recipe mix for 1 to 6 manipulators, the example work order simulated on each of them
+    mix = list(RECIPE_TEMPLATES.values())
+    order = ["Test1", "Test4", "Test2", "Test3", "Test1"]
+    print(f"Current manipData: {len(manipData)} manipulators")
+    for partition in ZonePartitioner(bathData, mix).partition(6):
+        if partition is None:
+            continue
+        line = LineSimulation(bathData, partition.manip_data(), [Carrier(RECIPE_TEMPLATES[name].create_instance()) for name in order],
+                              event_driven=True, log=EventLog(LogMode.SILENT))
+        if line.validate():
+            line.run()
+        simulated = f"{line.step_counter}s" if line.finished_count == len(order) else "stuck (greedy dispatching)"
+        print(f"{partition}, example work order {simulated}")